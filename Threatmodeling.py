@@ -1,277 +1,149 @@
-def user_interface():
-    st.header("🎯 Threat Modeling Interface")
-    
-    # Add custom CSS for better styling
-    st.markdown("""
-    <style>
-    .main-diagram {
-        background: linear-gradient(45deg, #f0f0f0 25%, transparent 25%), 
-                   linear-gradient(-45deg, #f0f0f0 25%, transparent 25%), 
-                   linear-gradient(45deg, transparent 75%, #f0f0f0 75%), 
-                   linear-gradient(-45deg, transparent 75%, #f0f0f0 75%);
-        background-size: 20px 20px;
-        background-position: 0 0, 0 10px, 10px -10px, -10px 0px;
-        border: 2px solid #ddd;
-        border-radius: 10px;
-        padding: 20px;
-        margin: 10px 0;
-    }
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 2px;
-    }
-    .stTabs [data-baseweb="tab"] {
-        padding: 12px 24px;
-        background-color: #f8f9fa;
-        border-radius: 8px 8px 0 0;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-    
-    # Load iteration selector
-    iterations = get_all_iterations()
-    if iterations:
-        col1, col2, col3 = st.columns([2, 1, 1])
-        
-        with col1:
-            selected_iteration = st.selectbox(
-                "🔄 Load Iteration",
-                ["New Iteration"] + [iter[0] for iter in iterations],
-                key="iteration_selector"
-            )
-        
-        with col2:
-            if st.button("📥 Load Selected", type="primary") and selected_iteration != "New Iteration":
-                data = load_iteration(selected_iteration)
-                if data:
-                    st.session_state.domains = data.get('domains', STATIC_DOMAINS.copy())
-                    st.session_state.interactions = data.get('interactions', STATIC_INTERACTIONS.copy())
-                    st.session_state.selected_threats = data.get('selected_threats', {})
-                    st.session_state.selected_mitigations = data.get('selected_mitigations', {})
-                    st.session_state.current_iteration = selected_iteration
-                    st.success(f"✅ Loaded iteration: {selected_iteration}")
-                    st.rerun()
-        
-        with col3:
-            if st.button("🔄 Reset to Default"):
-                st.session_state.domains = STATIC_DOMAINS.copy()
-                st.session_state.interactions = STATIC_INTERACTIONS.copy()
-                st.session_state.selected_threats = {}
-                st.session_state.selected_mitigations = {}
-                st.session_state.current_iteration = None
-                st.success("✅ Reset to default architecture")
-                st.rerun()
-    
-    # Display current iteration info
-    if st.session_state.current_iteration:
-        st.info(f"📋 Current Iteration: **{st.session_state.current_iteration}**")
-    
-    # Main interface tabs
-    tab1, tab2, tab3 = st.tabs(["🏗️ Architecture View", "⚠️ Threat Selection", "📊 Analysis"])
-    
-    with tab1:
-        st.markdown('<div class="main-diagram">', unsafe_allow_html=True)
-        
-        # Controls row
-        col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
-        with col1:
-            zoom_level = st.slider("🔍 Zoom", 0.5, 2.0, 1.0, 0.1, key="zoom")
-        with col2:
-            show_labels = st.checkbox("🏷️ Show Labels", value=True)
-        with col3:
-            show_components = st.checkbox("📋 Show Components", value=True)
-        with col4:
-            if st.button("💾 Save Current View"):
-                st.success("View saved!")
-        
-        # Display the interactive diagram
-        fig = render_architecture_diagram()
-        
-        # Apply zoom
-        if zoom_level != 1.0:
-            fig.update_layout(
-                width=int(1200 * zoom_level),
-                height=int(700 * zoom_level)
-            )
-        
-        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Domain Information Panel
-        st.subheader("🏢 Domain Details")
-        selected_domain = st.selectbox(
-            "Select a domain to view details:",
-            list(st.session_state.domains.keys())
-        )
-        
-        if selected_domain:
-            domain_info = st.session_state.domains[selected_domain]
-            
-            col1, col2 = st.columns([2, 1])
-            
-            with col1:
-                st.write(f"**Domain**: {selected_domain}")
-                st.write(f"**Position**: X={domain_info['position']['x']:.2f}, Y={domain_info['position']['y']:.2f}")
-                if domain_info.get('components'):
-                    st.write(f"**Components**: {', '.join(domain_info['components'])}")
-                
-                # Show threats in this domain
-                domain_threats = [t for t in get_all_threats() if t[4] == selected_domain]
-                if domain_threats:
-                    st.write("**🚨 Threats in this domain:**")
-                    for threat in domain_threats:
-                        threat_id, name, desc, severity, _, _ = threat
-                        severity_color = {"Low": "🟢", "Medium": "🟡", "High": "🟠", "Critical": "🔴"}
-                        st.write(f"  {severity_color.get(severity, '⚪')} {threat_id}: {name}")
-            
-            with col2:
-                st.markdown(f"""
-                <div style="
-                    background-color: {domain_info['color']};
-                    padding: 20px;
-                    border-radius: 10px;
-                    border: 2px solid #333;
-                    text-align: center;
-                    min-height: 100px;
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                ">
-                    <strong>{selected_domain}</strong>
-                </div>
-                """, unsafe_allow_html=True)
-        
-        # Interaction management
-        st.subheader("🔗 Manage Interactions")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("**Current Interactions**")
-            if st.session_state.interactions:
-                for i, interaction in enumerate(st.session_state.interactions):
-                    col_a, col_b, col_c = st.columns([2, 1, 0.5])
-                    with col_a:
-                        color_indicator = "🟢" if interaction.get("color") == "#2E8B57" else "🔵" if interaction.get("color") == "#4169E1" else "🟤"
-                        curve_indicator = "↗️" if interaction.get("curve") else "➡️"
-                        st.write(f"{color_indicator} {curve_indicator} {interaction['from']} → {interaction['to']}")
-                    with col_b:
-                        st.write(f"`{interaction['relationship']}`")
-                    with col_c:
-                        if st.button("❌", key=f"del_int_{i}", help="Delete interaction"):
-                            st.session_state.interactions.pop(i)
-                            st.rerun()
-        
-        with col2:
-            st.write("**Add New Interaction**")
-            with st.form("add_interaction"):
-                from_domain = st.selectbox("From Domain", list(st.session_state.domains.keys()))
-                to_domain = st.selectbox("To Domain", list(st.session_state.domains.keys()))
-                relationship = st.text_input("Relationship (e.g., uses, creates, hosts)")
-                
-                col_form1, col_form2 = st.columns(2)
-                with col_form1:
-                    line_color = st.selectbox("Line Color", ["#2E8B57", "#4169E1", "#8B4513", "gray"])
-                with col_form2:
-                    is_curved = st.checkbox("Curved Line")
-                
-                if st.form_submit_button("➕ Add Interaction", type="primary"):
-                    if from_domain != to_domain and relationship:
-                        new_interaction = {
-                            "from": from_domain,
-                            "to": to_domain,
-                            "relationship": relationship,
-                            "color": line_color,
-                            "curve": is_curved
-                        }
-                        st.session_state.interactions.append(new_interaction)
-                        st.success(f"✅ Added interaction: {from_domain} → {to_domain}")
-                        st.rerun()
-    
-    with tab2:
-        st.subheader("⚠️ Select Threats and Mitigations")
-        
-        threats = get_all_threats()
-        if not threats:
-            st.warning("⚠️ No threats available. Please create threats in the Admin Panel first.")
-            return
-        
-        # Filter controls
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            severity_filter = st.multiselect(
-                "Filter by Severity",
-                ["Low", "Medium", "High", "Critical"],
-                default=["Low", "Medium", "High", "Critical"]
-            )
-        with col2:
-            domain_filter = st.multiselect(
-                "Filter by Domain",
-                list(set(t[4] for t in threats)),
-                default=list(set(t[4] for t in threats))
-            )
-        with col3:
-            search_term = st.text_input("🔍 Search threats", placeholder="Type to search...")
-        
-        # Filter threats
-        filtered_threats = [
-            t for t in threats 
-            if t[3] in severity_filter 
-            and t[4] in domain_filter
-            and (not search_term or search_term.lower() in t[1].lower() or search_term.lower() in t[0].lower())
-        ]
-        
-        col1, col2 = st.columns([1, 1])
-        
-        with col1:
-            st.write(f"**🎯 Available Threats ({len(filtered_threats)})**")
-            
-            for threat in filtered_threats:
-                threat_id, name, desc, severity, domain, created = threat
-                
-                # Severity styling
-                severity_colors = {
-                    "Low": {"color": "🟢", "bg": "#d4edda"},
-                    "Medium": {"color": "🟡", "bg": "#fff3cd"},
-                    "High": {"color": "🟠", "bg": "#f8d7da"},
-                    "Critical": {"color": "🔴", "bg": "#f5c6cb"}
-                }
-                
-                is_selected = st.checkbox(
-                    f"{severity_colors[severity]['color']} **{threat_id}**: {name}",
-                    key=f"threat_{threat_id}",
-                    value=threat_id in st.session_state.selected_threats
-                )
-                
-                if is_selected and threat_id not in st.session_state.selected_threats:
-                    st.session_state.selected_threats[threat_id] = threat
-                elif not is_selected and threat_id in st.session_state.selected_threats:
-                    del st.session_state.selected_threats[threat_id]
-                    # Also remove associated mitigations
-                    st.session_state.selected_mitigations = {
-                        k: v for k, v in st.session_state.selected_mitigations.items()
-                        if v[1] != threat_id
-                    }
-                
-                if is_selected:
-                    st.markdown(f"""
-                    <div style="background-color: {severity_colors[severity]['bg']}; padding: 10px; margin: 5px 0; border-radius: 5px; border-left: 4px solid {severity_colors[severity]['color'].replace('🟢', '#28a745').replace('🟡', '#ffc107').replace('🟠', '#fd7e14').replace('🔴', '#dc3545')};">
-                        📊 <strong>Severity:</strong> {severity} | 🏢 <strong>Domain:</strong> {domain}<br>
-                        📝 <strong>Description:</strong> {descimport streamlit as st
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import json
 import sqlite3
 from datetime import datetime
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import uuid
+import os
+
+from analysis import (
+    build_architecture_figure, threat_overview, mitigation_table, coverage_matrix,
+    severity_chart, threat_domain_chart, mitigation_status_chart, mitigation_domain_chart,
+    iteration_severity_chart, severity_domain_heatmap
+)
+from analytics import get_analytics_store
+from coverage_optimizer import recommend_mitigations
+from reports import get_report_service, report_dir_for
+from retention import (
+    CONVERT_MAX_BYTES, RetentionPolicy, get_maintenance_job, init_retention, list_archives, pin_iterations,
+    plan_retention, read_archive, restore_iterations, storage_stats, unpin_iterations
+)
+from selection import SelectionState
+from architecture import ArchitectureModel, get_base_architecture, thaw
+from changelog import (
+    CATALOG_STREAM, CHECKPOINT_EVERY, SESSION_PREFIX, SessionHistory, init_changelog, record, write_checkpoint,
+    prune_session_stream, get_event, get_recent_events, apply_session_event, invert_session_event, invert_changes,
+    session_snapshot, snapshot_delta, session_state_as_of, catalog_as_of
+)
+from changefeed import CatalogCache, get_change_feed, notify
+from dedup import find_clusters
+from importers import ImportResult, map_graph, read_graph
+from suggestions import SuggestionIndex, component_patterns, infer_components, get_suggestion_index
+from workspaces import DEFAULT_WORKSPACE, federated_query, get_connection, list_workspaces, workspace_path
+from schema import ensure_schema
+import instrumentation
+from instrumentation import timed, rerun_scope, trace_connection
+
+# Catalog tables with foreign keys; shared by create_schema and migrate_foreign_keys
+TABLE_DEFINITIONS = {
+    'threats': '''(
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        severity TEXT,
+        domain TEXT,
+        created_date TEXT,
+        subdomain_id TEXT,
+        updated_at TEXT,
+        version INTEGER NOT NULL DEFAULT 1,
+        FOREIGN KEY (subdomain_id) REFERENCES subdomains (id) ON DELETE SET NULL
+    )''',
+    'mitigations': '''(
+        id TEXT PRIMARY KEY,
+        threat_id TEXT,
+        name TEXT NOT NULL,
+        description TEXT,
+        status TEXT,
+        domain TEXT,
+        created_date TEXT,
+        cost REAL DEFAULT 0,
+        effort REAL DEFAULT 0,
+        subdomain_id TEXT,
+        updated_at TEXT,
+        version INTEGER NOT NULL DEFAULT 1,
+        FOREIGN KEY (threat_id) REFERENCES threats (id) ON DELETE CASCADE,
+        FOREIGN KEY (subdomain_id) REFERENCES subdomains (id) ON DELETE SET NULL
+    )''',
+    'subdomains': '''(
+        id TEXT PRIMARY KEY,
+        parent_domain TEXT,
+        name TEXT NOT NULL,
+        description TEXT,
+        created_date TEXT,
+        parent_id TEXT,
+        updated_at TEXT,
+        version INTEGER NOT NULL DEFAULT 1,
+        FOREIGN KEY (parent_id) REFERENCES subdomains (id) ON DELETE CASCADE
+    )''',
+    'subdomain_closure': '''(
+        ancestor TEXT NOT NULL,
+        descendant TEXT NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (ancestor, descendant),
+        FOREIGN KEY (ancestor) REFERENCES subdomains (id) ON DELETE CASCADE,
+        FOREIGN KEY (descendant) REFERENCES subdomains (id) ON DELETE CASCADE
+    ) WITHOUT ROWID''',
+    'threat_components': '''(
+        threat_id TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        component TEXT NOT NULL,
+        PRIMARY KEY (threat_id, domain, component),
+        FOREIGN KEY (threat_id) REFERENCES threats (id) ON DELETE CASCADE
+    ) WITHOUT ROWID''',
+}
+
+# Row versions. Every write stamps the row with a version above every
+# committed change-log seq and every version already in its table, so
+# versions and seqs form one clock: `WHERE version > ?` finds the rows
+# written since a cache was loaded at that seq, and a writer holding a row's
+# version can tell whether anyone else wrote it since (optimistic locking).
+# Computed inside the writing statement, under the write lock.
+VERSIONED_TABLES = ('threats', 'mitigations', 'subdomains', 'iterations')
+UPDATED_AT = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+def next_version(table: str) -> str:
+    return f'''MAX(
+        (SELECT COALESCE(MAX(version), 0) + 1 FROM {table}),
+        (SELECT COALESCE(MAX(seq), 0) + 1 FROM sqlite_sequence WHERE name = 'change_log')
+    )'''
+
+def stamp(table: str) -> str:
+    # SET clause for an UPDATE on a versioned table
+    return f"version = {next_version(table)}, updated_at = {UPDATED_AT}"
+
+def check_version(c, table: str, row_id, expected_version: Optional[int], key: str = 'id'):
+    # expected_version: None skips the check, 0 means the row must not exist
+    # yet, anything else must still be the row's version. Call it inside the
+    # writing transaction (BEGIN IMMEDIATE) so nobody writes in between.
+    if expected_version is None:
+        return
+    row = c.execute(f'SELECT version, updated_at FROM {table} WHERE {key} = ?', (row_id,)).fetchone()
+    if row is None and expected_version:
+        raise ValueError(f"{row_id} was deleted after you loaded it (version {expected_version})")
+    if row is not None and row[0] != expected_version:
+        updated = f", updated {row[1]}" if row[1] else ""
+        if not expected_version:
+            raise ValueError(f"{row_id} already exists (version {row[0]}{updated})")
+        raise ValueError(f"{row_id} was changed after you loaded it: version {expected_version}, "
+                         f"now {row[0]}{updated}")
 
-# Initialize database
-def init_db():
-    conn = sqlite3.connect('threat_model.db', check_same_thread=False)
+# Initialize database. init_db runs on every rerun, so the schema setup and
+# migrations behind it only run once per database file per process.
+@timed()
+def init_db(db_path: str = None):
+    db_path = db_path or current_db_path()
+    ensure_schema(db_path, lambda: create_schema(db_path))
+
+def create_schema(db_path: str = None):
+    conn = get_db_connection(db_path)
     c = conn.cursor()
     
+    # Takes effect on a new file; existing files are converted once by the
+    # maintenance job
+    c.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    
     # Create tables
     c.execute('''
         CREATE TABLE IF NOT EXISTS iterations (
@@ -279,168 +151,1117 @@ def init_db():
             name TEXT UNIQUE NOT NULL,
             description TEXT,
             created_date TEXT,
-            data TEXT
+            data TEXT,
+            updated_at TEXT,
+            version INTEGER NOT NULL DEFAULT 1
         )
     ''')
     
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS threats (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            description TEXT,
-            severity TEXT,
-            domain TEXT,
-            created_date TEXT
-        )
-    ''')
+    c.execute(f'CREATE TABLE IF NOT EXISTS threats {TABLE_DEFINITIONS["threats"]}')
+    c.execute(f'CREATE TABLE IF NOT EXISTS mitigations {TABLE_DEFINITIONS["mitigations"]}')
+    c.execute(f'CREATE TABLE IF NOT EXISTS subdomains {TABLE_DEFINITIONS["subdomains"]}')
+    
+    # Older databases predate these columns
+    versioning = {'updated_at': 'TEXT', 'version': 'INTEGER NOT NULL DEFAULT 1'}
+    add_missing_columns(c, 'iterations', versioning)
+    add_missing_columns(c, 'threats', {'subdomain_id': 'TEXT', **versioning})
+    add_missing_columns(c, 'mitigations', {'cost': 'REAL DEFAULT 0', 'effort': 'REAL DEFAULT 0', 'subdomain_id': 'TEXT',
+                                           **versioning})
+    add_missing_columns(c, 'subdomains', {'parent_id': 'TEXT', **versioning})
+    for table in VERSIONED_TABLES:
+        c.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_version ON {table} (version)')
+    
+    # Closure table for nested subdomains: one row per (ancestor, descendant)
+    # pair including (id, id, 0), so ancestor/descendant/subtree queries are
+    # single index lookups
+    closure_exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subdomain_closure'"
+    ).fetchone()
+    c.execute(f'CREATE TABLE IF NOT EXISTS subdomain_closure {TABLE_DEFINITIONS["subdomain_closure"]}')
+    if not closure_exists:
+        c.execute('INSERT OR IGNORE INTO subdomain_closure SELECT id, id, 0 FROM subdomains')
+    
+    c.execute('CREATE INDEX IF NOT EXISTS idx_subdomain_closure_descendant ON subdomain_closure (descendant, depth)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_subdomains_parent_domain ON subdomains (parent_domain, name)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_threats_subdomain ON threats (subdomain_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_mitigations_subdomain ON mitigations (subdomain_id)')
+    # Foreign-key children need an index for cascades to be lookups, not scans
+    c.execute('CREATE INDEX IF NOT EXISTS idx_mitigations_threat ON mitigations (threat_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_subdomains_parent ON subdomains (parent_id)')
+    
+    # Threat -> component mapping, the source of the suggestion index.
+    # Existing catalogs get mappings inferred from the threat text once.
+    components_exist = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'threat_components'"
+    ).fetchone()
+    c.execute(f'CREATE TABLE IF NOT EXISTS threat_components {TABLE_DEFINITIONS["threat_components"]}')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_threat_components_component ON threat_components (domain, component)')
+    if not components_exist:
+        patterns = component_patterns(STATIC_DOMAINS)
+        c.execute('SELECT id, name, description FROM threats')
+        c.executemany('INSERT OR IGNORE INTO threat_components (threat_id, domain, component) VALUES (?, ?, ?)', [
+            (threat_id, domain, component)
+            for threat_id, name, description in c.fetchall()
+            for domain, component in infer_components(f"{name} {description or ''}", patterns)
+        ])
     
+    init_changelog(c)
+    init_retention(c)
+    
+    conn.commit()
+    migrate_foreign_keys(conn)
+    conn.close()
+
+def add_missing_columns(c, table: str, columns: Dict[str, str]):
+    existing = {row[1] for row in c.execute(f'PRAGMA table_info({table})')}
+    for column, declaration in columns.items():
+        if column not in existing:
+            c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def migrate_foreign_keys(conn):
+    # Databases from before ON DELETE actions get those tables rebuilt once
+    # (SQLite cannot alter a constraint), with orphans left behind by the old
+    # hand-written cascades cleaned up first so every key checks out
+    stale = [
+        name for name, sql in conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'table' "
+            f"AND name IN ({','.join('?' * len(TABLE_DEFINITIONS))})", list(TABLE_DEFINITIONS))
+        if 'ON DELETE' not in sql.upper()
+    ]
+    if not stale:
+        return
+    # Off, or dropping an old parent table would cascade into its children
+    conn.execute('PRAGMA foreign_keys = OFF')
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN')
+        c.execute('DELETE FROM mitigations WHERE threat_id IS NOT NULL AND threat_id NOT IN (SELECT id FROM threats)')
+        c.execute('DELETE FROM threat_components WHERE threat_id NOT IN (SELECT id FROM threats)')
+        c.execute('''
+            DELETE FROM subdomain_closure
+            WHERE ancestor NOT IN (SELECT id FROM subdomains) OR descendant NOT IN (SELECT id FROM subdomains)
+        ''')
+        for table, column in (('threats', 'subdomain_id'), ('mitigations', 'subdomain_id'), ('subdomains', 'parent_id')):
+            c.execute(f'UPDATE {table} SET {column} = NULL WHERE {column} NOT IN (SELECT id FROM subdomains)')
+        for table in stale:
+            indexes = [row[0] for row in c.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+            columns = ", ".join(row[1] for row in c.execute(f'PRAGMA table_info({table})'))
+            c.execute(f'CREATE TABLE {table}_new {TABLE_DEFINITIONS[table]}')
+            c.execute(f'INSERT INTO {table}_new ({columns}) SELECT {columns} FROM {table}')
+            c.execute(f'DROP TABLE {table}')
+            c.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+            for sql in indexes:
+                c.execute(sql)
+        problems = c.execute('PRAGMA foreign_key_check').fetchall()
+        if problems:
+            raise sqlite3.IntegrityError(f"Foreign key violations after migration: {problems[:5]}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('PRAGMA foreign_keys = ON')
+
+# Database operations. DB_PATH is the default workspace's database, and the
+# one scripts and tests point the helpers at. A session's runs use the
+# workspace it picked (select_workspace keeps the path in session state), so
+# sessions on different workspaces never share a module global. The other
+# workspaces live in WORKSPACE_DIR.
+DB_PATH = os.environ.get('THREAT_MODEL_DB', os.path.join('data', 'threat_model.db'))
+DEFAULT_DB_PATH = DB_PATH
+WORKSPACE_DIR = os.environ.get('THREAT_MODEL_WORKSPACES',
+                               os.path.join(os.path.dirname(DB_PATH) or '.', 'workspaces'))
+
+# Iteration retention tiers, e.g. "30d,12w,12m", and seconds between
+# scheduled maintenance runs (0 turns the schedule off)
+RETENTION_POLICY = RetentionPolicy.parse(os.environ.get('THREAT_MODEL_RETENTION', '30d,12w,12m'))
+MAINTENANCE_INTERVAL = float(os.environ.get('THREAT_MODEL_MAINTENANCE_INTERVAL', 6 * 3600))
+
+def current_db_path() -> str:
+    # The running session's workspace database; DB_PATH outside a session
+    # (scripts, tests, threads without a script run context)
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return DB_PATH
+    return st.session_state.get('db_path', DB_PATH)
+
+def get_db_connection(db_path: str = None):
+    # Pooled per workspace (close() hands it back) with foreign keys on; that
+    # setup runs before tracing starts, so it is not counted as a query
+    return trace_connection(get_connection(db_path or current_db_path()))
+
+# Full-row images recorded in the change log for admin CRUD
+CATALOG_COLUMNS = {
+    'threats': ('id', 'name', 'description', 'severity', 'domain', 'created_date', 'subdomain_id'),
+    'mitigations': ('id', 'threat_id', 'name', 'description', 'status', 'domain', 'created_date',
+                    'cost', 'effort', 'subdomain_id'),
+    'subdomains': ('id', 'parent_domain', 'name', 'description', 'created_date', 'parent_id'),
+    'iterations': ('id', 'name', 'description', 'created_date', 'data'),
+}
+
+def catalog_rows(c, table: str, where: str, params) -> List[Dict]:
+    columns = CATALOG_COLUMNS[table]
+    c.execute(f'SELECT {", ".join(columns)} FROM {table} WHERE {where}', params)
+    return [dict(zip(columns, row)) for row in c.fetchall()]
+
+def catalog_row(c, table: str, row_id: str):
+    if table == 'threat_components':
+        # A threat's whole mapping is logged as one pseudo-row
+        c.execute('SELECT domain, component FROM threat_components WHERE threat_id = ? ORDER BY domain, component',
+                  (row_id,))
+        components = [list(row) for row in c.fetchall()]
+        return {'threat_id': row_id, 'components': components} if components else None
+    rows = catalog_rows(c, table, 'id = ?', (row_id,))
+    return rows[0] if rows else None
+
+def write_catalog_row(c, table: str, row: Dict):
+    if table == 'threat_components':
+        c.execute('DELETE FROM threat_components WHERE threat_id = ?', (row['threat_id'],))
+        c.executemany('INSERT INTO threat_components (threat_id, domain, component) VALUES (?, ?, ?)',
+                      [(row['threat_id'], domain, component) for domain, component in row['components']])
+        return
+    # An upsert, not INSERT OR REPLACE: a replace deletes the old row first,
+    # which would fire ON DELETE CASCADE on its children, rewrite every index
+    # and hand iterations a new id. The images carry no version; every write
+    # gets a fresh one.
+    columns = CATALOG_COLUMNS[table]
+    c.execute(f'''
+        INSERT INTO {table} ({", ".join(columns)}, version, updated_at)
+        VALUES ({", ".join("?" * len(columns))}, {next_version(table)}, {UPDATED_AT})
+        ON CONFLICT (id) DO UPDATE SET {", ".join(f"{column} = excluded.{column}" for column in columns[1:])},
+            version = excluded.version, updated_at = excluded.updated_at
+    ''', [row.get(column) for column in columns])
+
+@timed()
+def save_iteration(name: str, description: str, data: Dict, expected_version: Optional[int] = None):
+    # Saving under an existing name updates that iteration in place, keeping
+    # its id and created_date. Returns the new version, or False on error.
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        check_version(c, 'iterations', name, expected_version, key='name')
+        c.execute(f'''
+            INSERT INTO iterations (name, description, created_date, data, version, updated_at)
+            VALUES (?, ?, ?, ?, {next_version('iterations')}, {UPDATED_AT})
+            ON CONFLICT (name) DO UPDATE SET description = excluded.description, data = excluded.data,
+                version = excluded.version, updated_at = excluded.updated_at
+        ''', (name, description, datetime.now().isoformat(), json.dumps(data)))
+        version = c.execute('SELECT version FROM iterations WHERE name = ?', (name,)).fetchone()[0]
+        conn.commit()
+        return version
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Error saving iteration: {e}")
+        return False
+    finally:
+        conn.close()
+
+@timed()
+def load_iteration(name: str):
+    result = load_iteration_for_edit(name)
+    return result[0] if result else None
+
+@timed()
+def load_iteration_for_edit(name: str):
+    # (data, version); pass the version back to save_iteration to detect
+    # a concurrent save of the same iteration
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('SELECT data, version FROM iterations WHERE name = ?', (name,))
+    result = c.fetchone()
+    conn.close()
+    if result:
+        return json.loads(result[0]), result[1]
+    return None
+
+@timed()
+def get_all_iterations():
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('SELECT name, description, created_date FROM iterations ORDER BY created_date DESC')
+    results = c.fetchall()
+    conn.close()
+    return results
+
+@timed()
+def get_mitigation_status_counts():
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('SELECT status, COUNT(*) FROM mitigations GROUP BY status ORDER BY COUNT(*) DESC')
+    results = c.fetchall()
+    conn.close()
+    return results
+
+@timed()
+def get_retention_status():
+    # Storage stats, the iterations the policy would archive now, the latest
+    # maintenance runs and the pinned iteration names
+    conn = get_db_connection()
+    c = conn.cursor()
+    stats = storage_stats(c)
+    pinned = {row[0] for row in c.execute('SELECT name FROM pinned_iterations')}
+    rows = c.execute('SELECT id, name, COALESCE(updated_at, created_date) FROM iterations').fetchall()
+    due = set(plan_retention(rows, RETENTION_POLICY, pinned=pinned))
     c.execute('''
-        CREATE TABLE IF NOT EXISTS mitigations (
-            id TEXT PRIMARY KEY,
-            threat_id TEXT,
-            name TEXT NOT NULL,
-            description TEXT,
-            status TEXT,
-            domain TEXT,
-            created_date TEXT,
-            FOREIGN KEY (threat_id) REFERENCES threats (id)
-        )
+        SELECT run_date, archived, archive, freed_pages, seconds FROM maintenance_log
+        ORDER BY run_date DESC LIMIT 10
     ''')
-    
+    runs = c.fetchall()
+    conn.close()
+    due_rows = [(name, created) for iteration_id, name, created in rows if iteration_id in due]
+    return stats, due_rows, runs, sorted(pinned)
+
+@timed()
+def set_iterations_pinned(names: List[str], pinned: bool):
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        (pin_iterations if pinned else unpin_iterations)(c, names)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+@timed()
+def run_maintenance_now(convert: bool = False):
+    return get_maintenance_job(current_db_path(), RETENTION_POLICY, MAINTENANCE_INTERVAL).run_now(convert)
+
+@timed()
+def restore_archived_iterations(path: str, names: List[str]):
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        restored = restore_iterations(c, path, names)
+        if restored:
+            c.execute(f'UPDATE iterations SET {stamp("iterations")} WHERE name IN (SELECT value FROM json_each(?))',
+                      (json.dumps(restored),))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return restored
+
+@timed()
+def get_workspace_report():
+    # Totals and breakdowns for every workspace, read in one pass per batch
+    # of files ATTACHed read-only to a scratch connection
+    workspaces = list_workspaces(WORKSPACE_DIR, DEFAULT_DB_PATH)
+    totals = pd.DataFrame(federated_query(workspaces, '''
+        SELECT (SELECT COUNT(*) FROM {db}.threats) AS threats,
+               (SELECT COUNT(*) FROM {db}.mitigations) AS mitigations,
+               (SELECT COUNT(DISTINCT threat_id) FROM {db}.mitigations
+                WHERE status IN ('Implemented', 'Verified')) AS covered,
+               (SELECT COUNT(*) FROM {db}.iterations) AS iterations,
+               (SELECT MAX(created_date) FROM {db}.change_log) AS last_change
+    '''), columns=['Workspace', 'Threats', 'Mitigations', 'Covered', 'Iterations', 'Last Change'])
+    totals['Size (MB)'] = [round(os.path.getsize(workspaces[name]) / 1e6, 2) for name in totals['Workspace']]
+    severity = pd.DataFrame(federated_query(workspaces, 'SELECT severity, COUNT(*) FROM {db}.threats GROUP BY severity'),
+                            columns=['Workspace', 'Severity', 'Count'])
+    status = pd.DataFrame(federated_query(workspaces, 'SELECT status, COUNT(*) FROM {db}.mitigations GROUP BY status'),
+                          columns=['Workspace', 'Status', 'Count'])
+    return totals, severity, status
+
+@timed()
+def save_threat(threat_id: str, name: str, description: str, severity: str, domain: str,
+                subdomain_id: str = None, components: List = None, expected_version: Optional[int] = None):
+    # components: [(domain, component), ...]. None keeps an existing threat's
+    # mappings (they may have been set by hand) and infers a new threat's from
+    # its text. expected_version: see check_version; a mismatch raises ValueError.
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        check_version(c, 'threats', threat_id, expected_version)
+        before = catalog_row(c, 'threats', threat_id)
+        if components is None and before is None:
+            components = infer_components(f"{name} {description or ''}", component_patterns(STATIC_DOMAINS))
+        c.execute(f'''
+            INSERT INTO threats (id, name, description, severity, domain, created_date, subdomain_id, version, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, {next_version('threats')}, {UPDATED_AT})
+            ON CONFLICT (id) DO UPDATE SET name = excluded.name, description = excluded.description,
+                severity = excluded.severity, domain = excluded.domain, subdomain_id = excluded.subdomain_id,
+                version = excluded.version, updated_at = excluded.updated_at
+        ''', (threat_id, name, description, severity, domain, datetime.now().isoformat(), subdomain_id))
+        changes = [['threats', threat_id, before, catalog_row(c, 'threats', threat_id)]]
+        if components is not None:
+            before_components = catalog_row(c, 'threat_components', threat_id)
+            write_catalog_row(c, 'threat_components',
+                              {'threat_id': threat_id, 'components': sorted(set(map(tuple, components)))})
+            changes.append(['threat_components', threat_id, before_components,
+                            catalog_row(c, 'threat_components', threat_id)])
+        record(c, CATALOG_STREAM, 'save_threat', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+
+@timed()
+def save_mitigation(mit_id: str, threat_id: str, name: str, description: str, status: str, domain: str,
+                    cost: float = 0.0, effort: float = 0.0, subdomain_id: str = None,
+                    expected_version: Optional[int] = None):
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        check_version(c, 'mitigations', mit_id, expected_version)
+        before = catalog_row(c, 'mitigations', mit_id)
+        c.execute(f'''
+            INSERT INTO mitigations (id, threat_id, name, description, status, domain, created_date,
+                                     cost, effort, subdomain_id, version, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {next_version('mitigations')}, {UPDATED_AT})
+            ON CONFLICT (id) DO UPDATE SET threat_id = excluded.threat_id, name = excluded.name,
+                description = excluded.description, status = excluded.status, domain = excluded.domain,
+                cost = excluded.cost, effort = excluded.effort, subdomain_id = excluded.subdomain_id,
+                version = excluded.version, updated_at = excluded.updated_at
+        ''', (mit_id, threat_id, name, description, status, domain, datetime.now().isoformat(), cost, effort,
+              subdomain_id))
+        record(c, CATALOG_STREAM, 'save_mitigation',
+               {'changes': [['mitigations', mit_id, before, catalog_row(c, 'mitigations', mit_id)]]})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+
+@timed()
+def get_all_threats():
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('SELECT id, name, description, severity, domain, created_date FROM threats ORDER BY id')
+    results = c.fetchall()
+    conn.close()
+    return results
+
+@timed()
+def get_mitigations_for_threat(threat_id: str):
+    conn = get_db_connection()
+    c = conn.cursor()
     c.execute('''
-        CREATE TABLE IF NOT EXISTS subdomains (
-            id TEXT PRIMARY KEY,
-            parent_domain TEXT,
-            name TEXT NOT NULL,
-            description TEXT,
-            created_date TEXT
-        )
+        SELECT id, threat_id, name, description, status, domain, created_date
+        FROM mitigations WHERE threat_id = ? ORDER BY id
+    ''', (threat_id,))
+    results = c.fetchall()
+    conn.close()
+    return results
+
+@timed()
+def get_all_mitigations():
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT m.id, m.threat_id, m.name, m.description, m.status, m.domain, m.created_date,
+               t.name as threat_name
+        FROM mitigations m 
+        LEFT JOIN threats t ON m.threat_id = t.id 
+        ORDER BY m.id
     ''')
-    
-    conn.commit()
+    results = c.fetchall()
+    conn.close()
+    return results
+
+@timed()
+def get_mitigation_costs(threat_ids: List[str]):
+    conn = get_db_connection()
+    c = conn.cursor()
+    results = []
+    # Chunked to stay under SQLite's bound-parameter limit
+    for i in range(0, len(threat_ids), 500):
+        chunk = threat_ids[i:i + 500]
+        c.execute(f'''
+            SELECT id, threat_id, status, cost, effort FROM mitigations
+            WHERE threat_id IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+        results.extend(c.fetchall())
+    conn.close()
+    return results
+
+@timed()
+def get_threats_by_ids(threat_ids: List[str]):
+    conn = get_db_connection()
+    c = conn.cursor()
+    results = []
+    for i in range(0, len(threat_ids), 500):
+        chunk = threat_ids[i:i + 500]
+        c.execute(f'''
+            SELECT id, name, description, severity, domain, created_date
+            FROM threats WHERE id IN ({",".join("?" * len(chunk))})
+        ''', chunk)
+        results.extend(c.fetchall())
+    conn.close()
+    return results
+
+@timed()
+def get_mitigations_by_ids(mit_ids: List[str]):
+    conn = get_db_connection()
+    c = conn.cursor()
+    results = []
+    for i in range(0, len(mit_ids), 500):
+        chunk = mit_ids[i:i + 500]
+        c.execute(f'''
+            SELECT id, threat_id, name, description, status, domain, created_date
+            FROM mitigations WHERE id IN ({",".join("?" * len(chunk))})
+        ''', chunk)
+        results.extend(c.fetchall())
+    conn.close()
+    return results
+
+# Set-based bulk operations: the IDs are staged once per transaction in a
+# temp table (one JSON array parameter, so no variable limit) and every
+# statement filters on it. Binding the array to the DELETE itself would have
+# the query tracer re-expand it for each cascaded row.
+ID_SET = 'IN temp.bulk_ids'
+
+def stage_ids(c, ids: List[str]):
+    c.execute('CREATE TEMP TABLE IF NOT EXISTS bulk_ids (id TEXT PRIMARY KEY)')
+    c.execute('DELETE FROM temp.bulk_ids')
+    c.execute('INSERT OR IGNORE INTO temp.bulk_ids SELECT value FROM json_each(?)', (json.dumps(list(ids)),))
+
+# Columns a bulk update may set, per table
+BULK_FIELDS = {'threats': ('severity', 'domain'), 'mitigations': ('status', 'domain')}
+
+def staged_components(c) -> Dict[str, Dict]:
+    # threat_components pseudo-rows (see catalog_row) of the staged threats
+    # that have any mappings
+    components = {}
+    c.execute(f'''
+        SELECT threat_id, domain, component FROM threat_components WHERE threat_id {ID_SET}
+        ORDER BY threat_id, domain, component
+    ''', ())
+    for threat_id, domain, component in c.fetchall():
+        components.setdefault(threat_id, []).append([domain, component])
+    return {threat_id: {'threat_id': threat_id, 'components': rows} for threat_id, rows in components.items()}
+
+@timed()
+def delete_threats(threat_ids: List[str]):
+    # One DELETE; mitigations and component mappings go by ON DELETE CASCADE.
+    # Children are logged before their threats so an undo restores parents first.
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        stage_ids(c, threat_ids)
+        changes = [['mitigations', row['id'], row, None]
+                   for row in catalog_rows(c, 'mitigations', f'threat_id {ID_SET}', ())]
+        changes.extend(['threat_components', threat_id, row, None]
+                       for threat_id, row in staged_components(c).items())
+        changes.extend(['threats', row['id'], row, None] for row in catalog_rows(c, 'threats', f'id {ID_SET}', ()))
+        c.execute(f'DELETE FROM threats WHERE id {ID_SET}')
+        if changes:
+            record(c, CATALOG_STREAM, 'delete_threats', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+    return sum(1 for change in changes if change[0] == 'threats')
+
+@timed()
+def delete_mitigations(mit_ids: List[str]):
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        stage_ids(c, mit_ids)
+        changes = [['mitigations', row['id'], row, None]
+                   for row in catalog_rows(c, 'mitigations', f'id {ID_SET}', ())]
+        c.execute(f'DELETE FROM mitigations WHERE id {ID_SET}')
+        if changes:
+            record(c, CATALOG_STREAM, 'delete_mitigations', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+    return len(changes)
+
+def delete_threat(threat_id: str):
+    delete_threats([threat_id])
+
+def delete_mitigation(mit_id: str):
+    delete_mitigations([mit_id])
+
+@timed()
+def bulk_update(table: str, row_ids: List[str], values: Dict[str, str]):
+    # One UPDATE setting e.g. {'severity': 'High'} on every listed row. A new
+    # domain drops subdomain assignments that belong to another domain, and
+    # moved threats' component mappings are re-derived for it.
+    unknown = set(values) - set(BULK_FIELDS.get(table, ()))
+    if unknown or not values:
+        raise ValueError(f"Cannot bulk update {', '.join(sorted(unknown)) or 'nothing'} on {table}")
+    assignments = [f"{column} = :{column}" for column in values]
+    if 'domain' in values:
+        assignments.append('''subdomain_id = CASE WHEN subdomain_id IN (
+            SELECT id FROM subdomains WHERE parent_domain = :domain) THEN subdomain_id END''')
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        stage_ids(c, row_ids)
+        before = {row['id']: row for row in catalog_rows(c, table, f'id {ID_SET}', ())}
+        c.execute(f'UPDATE {table} SET {", ".join(assignments)}, {stamp(table)} WHERE id {ID_SET}', values)
+        changes = [[table, row['id'], before[row['id']], row]
+                   for row in catalog_rows(c, table, f'id {ID_SET}', ()) if row != before[row['id']]]
+        moved = [row for row in before.values()
+                 if table == 'threats' and 'domain' in values and row['domain'] != values['domain']]
+        if moved:
+            changes.extend(rederive_components(c, moved, values['domain']))
+        if changes:
+            record(c, CATALOG_STREAM, f'update_{table}', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+    return len(changes)
+
+def rederive_components(c, threats: List[Dict], domain: str) -> List:
+    # Threats moved to `domain` keep their mappings in it, lose those in other
+    # domains and gain the new domain's components their text mentions.
+    # Returns the change-log entries.
+    stage_ids(c, [row['id'] for row in threats])
+    before = staged_components(c)
+    c.execute(f'DELETE FROM threat_components WHERE threat_id {ID_SET} AND domain != ?', (domain,))
+    patterns = component_patterns({domain: STATIC_DOMAINS.get(domain, {})})
+    c.executemany('INSERT OR IGNORE INTO threat_components (threat_id, domain, component) VALUES (?, ?, ?)', [
+        (row['id'], domain, component)
+        for row in threats
+        for _, component in infer_components(f"{row['name']} {row['description'] or ''}", patterns)
+    ])
+    after = staged_components(c)
+    return [['threat_components', row['id'], before.get(row['id']), after.get(row['id'])]
+            for row in threats if before.get(row['id']) != after.get(row['id'])]
+
+@timed()
+def find_duplicate_clusters(table: str, threshold: float = 0.8):
+    # Near-duplicate threats or mitigations (mitigations only within one
+    # threat), as clusters of (id, name, similarity to the first entry)
+    conn = get_db_connection()
+    c = conn.cursor()
+    if table == 'threats':
+        c.execute('SELECT id, name, description, NULL FROM threats ORDER BY id')
+    else:
+        c.execute('SELECT id, name, description, threat_id FROM mitigations ORDER BY id')
+    rows = c.fetchall()
     conn.close()
+    clusters = find_clusters(
+        [row[0] for row in rows], [f"{row[1]} {row[2] or ''}" for row in rows], threshold,
+        groups=[row[3] for row in rows] if table == 'mitigations' else None
+    )
+    names = {row[0]: row[1] for row in rows}
+    return [[(entry_id, names[entry_id], similarity) for entry_id, similarity in cluster] for cluster in clusters]
+
+def repoint_iterations(c, threat_map: Dict[str, str], mitigation_map: Dict[str, str]) -> List:
+    # Rewrites saved iterations that reference merged-away IDs so they load
+    # the survivors instead; returns the change-log entries
+    merged = list(threat_map) + list(mitigation_map)
+    rows = {}
+    for i in range(0, len(merged), 500):
+        chunk = merged[i:i + 500]
+        for row in catalog_rows(c, 'iterations', " OR ".join(["instr(data, ?) > 0"] * len(chunk)),
+                                [json.dumps(entry_id) for entry_id in chunk]):
+            rows[row['id']] = row
+    if not rows:
+        return []
+    survivors = list(set(threat_map.values()))
+    c.execute(f'''
+        SELECT id, name, description, severity, domain, created_date
+        FROM threats WHERE id IN ({",".join("?" * len(survivors))})
+    ''', survivors)
+    threat_rows = {row[0]: list(row) for row in c.fetchall()}
+    survivors = list(set(mitigation_map.values()))
+    c.execute(f'''
+        SELECT id, threat_id, name, description, status, domain, created_date
+        FROM mitigations WHERE id IN ({",".join("?" * len(survivors))})
+    ''', survivors)
+    mitigation_rows = {row[0]: list(row) for row in c.fetchall()}
+
+    changes = []
+    for row in rows.values():
+        data = json.loads(row['data'])
+        saved_threats = data.get('selected_threats', {})
+        if isinstance(saved_threats, dict):
+            threats = {}
+            for threat_id, threat in saved_threats.items():
+                new_id = threat_map.get(threat_id, threat_id)
+                if new_id not in threats:
+                    threats[new_id] = threat if new_id == threat_id else threat_rows.get(new_id)
+        else:
+            # Older iterations saved a plain list of threat IDs
+            threats = list(dict.fromkeys(threat_map.get(threat_id, threat_id) for threat_id in saved_threats))
+        data['selected_threats'] = threats
+        mitigations = {}
+        for mit_id, mit in data.get('selected_mitigations', {}).items():
+            new_id = mitigation_map.get(mit_id, mit_id)
+            if new_id in mitigations:
+                continue
+            mit = list(mitigation_rows.get(new_id, mit) if new_id != mit_id else mit)
+            mit[1] = threat_map.get(mit[1], mit[1])
+            mitigations[new_id] = mit
+        data['selected_mitigations'] = mitigations
+        after = dict(row, data=json.dumps(data))
+        if after != row:
+            write_catalog_row(c, 'iterations', after)
+            changes.append(['iterations', row['id'], row, after])
+    return changes
+
+@timed()
+def merge_threats(survivor_id: str, duplicate_ids: List[str]):
+    # Folds duplicates into the survivor: their mitigations, component
+    # mappings and saved-iteration references move over, then they go
+    duplicate_ids = [threat_id for threat_id in duplicate_ids if threat_id != survivor_id]
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        if catalog_row(c, 'threats', survivor_id) is None:
+            raise ValueError(f"Threat {survivor_id} no longer exists")
+        placeholders = ",".join("?" * len(duplicate_ids))
+        moved = catalog_rows(c, 'mitigations', f'threat_id IN ({placeholders})', duplicate_ids)
+        c.execute(f'UPDATE mitigations SET threat_id = ?, {stamp("mitigations")} WHERE threat_id IN ({placeholders})',
+                  [survivor_id, *duplicate_ids])
+        changes = [['mitigations', row['id'], row, catalog_row(c, 'mitigations', row['id'])] for row in moved]
 
-# Database operations
-def get_db_connection():
-    os.makedirs('data', exist_ok=True)
-    return sqlite3.connect('data/threat_model.db', check_same_thread=False)
+        survivor_components = catalog_row(c, 'threat_components', survivor_id)
+        components = {tuple(key) for key in (survivor_components or {}).get('components', ())}
+        for threat_id in duplicate_ids:
+            before = catalog_row(c, 'threat_components', threat_id)
+            if before:
+                components.update(map(tuple, before['components']))
+                changes.append(['threat_components', threat_id, before, None])
+        c.execute(f'DELETE FROM threat_components WHERE threat_id IN ({placeholders})', duplicate_ids)
+        write_catalog_row(c, 'threat_components', {'threat_id': survivor_id, 'components': sorted(components)})
+        changes.append(['threat_components', survivor_id, survivor_components,
+                        catalog_row(c, 'threat_components', survivor_id)])
+
+        changes.extend(['threats', row['id'], row, None]
+                       for row in catalog_rows(c, 'threats', f'id IN ({placeholders})', duplicate_ids))
+        c.execute(f'DELETE FROM threats WHERE id IN ({placeholders})', duplicate_ids)
+        changes.extend(repoint_iterations(c, {threat_id: survivor_id for threat_id in duplicate_ids}, {}))
+        record(c, CATALOG_STREAM, 'merge_threats', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
 
-def save_iteration(name: str, description: str, data: Dict):
+@timed()
+def merge_mitigations(survivor_id: str, duplicate_ids: List[str]):
+    duplicate_ids = [mit_id for mit_id in duplicate_ids if mit_id != survivor_id]
     conn = get_db_connection()
     c = conn.cursor()
     try:
+        survivor = catalog_row(c, 'mitigations', survivor_id)
+        if survivor is None:
+            raise ValueError(f"Mitigation {survivor_id} no longer exists")
+        placeholders = ",".join("?" * len(duplicate_ids))
+        duplicates = catalog_rows(c, 'mitigations', f'id IN ({placeholders})', duplicate_ids)
+        if any(row['threat_id'] != survivor['threat_id'] for row in duplicates):
+            raise ValueError("Only mitigations of the same threat can be merged")
+        changes = [['mitigations', row['id'], row, None] for row in duplicates]
+        c.execute(f'DELETE FROM mitigations WHERE id IN ({placeholders})', duplicate_ids)
+        changes.extend(repoint_iterations(c, {}, {mit_id: survivor_id for mit_id in duplicate_ids}))
+        record(c, CATALOG_STREAM, 'merge_mitigations', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+
+def link_subdomain(c, subdomain_id: str, parent_domain: str, parent_id: str = None):
+    # (Re)attach the subtree rooted here: drop paths from its old ancestors,
+    # then link every new ancestor to every node in the subtree
+    c.execute('INSERT OR IGNORE INTO subdomain_closure (ancestor, descendant, depth) VALUES (?, ?, 0)',
+              (subdomain_id, subdomain_id))
+    c.execute('''
+        DELETE FROM subdomain_closure
+        WHERE descendant IN (SELECT descendant FROM subdomain_closure WHERE ancestor = :id)
+          AND ancestor NOT IN (SELECT descendant FROM subdomain_closure WHERE ancestor = :id)
+    ''', {'id': subdomain_id})
+    if parent_id:
         c.execute('''
-            INSERT OR REPLACE INTO iterations (name, description, created_date, data)
-            VALUES (?, ?, ?, ?)
-        ''', (name, description, datetime.now().isoformat(), json.dumps(data)))
+            INSERT INTO subdomain_closure (ancestor, descendant, depth)
+            SELECT up.ancestor, down.descendant, up.depth + down.depth + 1
+            FROM subdomain_closure up, subdomain_closure down
+            WHERE up.descendant = ? AND down.ancestor = ?
+        ''', (parent_id, subdomain_id))
+    # A subtree moved to another logical domain takes its threats and mitigations along
+    for table, column in (('subdomains', 'id'), ('threats', 'subdomain_id'), ('mitigations', 'subdomain_id')):
+        domain_column = 'parent_domain' if table == 'subdomains' else 'domain'
+        c.execute(f'''
+            UPDATE {table} SET {domain_column} = ?, {stamp(table)}
+            WHERE {column} IN (SELECT descendant FROM subdomain_closure WHERE ancestor = ?)
+              AND {domain_column} IS NOT ?
+        ''', (parent_domain, subdomain_id, parent_domain))
+
+@timed()
+def save_subdomain(subdomain_id: str, parent_domain: str, name: str, description: str, parent_id: str = None,
+                   expected_version: Optional[int] = None):
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        check_version(c, 'subdomains', subdomain_id, expected_version)
+        if parent_id:
+            if c.execute('SELECT 1 FROM subdomain_closure WHERE ancestor = ? AND descendant = ?',
+                         (subdomain_id, parent_id)).fetchone():
+                raise ValueError(f"{parent_id} is inside {subdomain_id}; a subdomain cannot be its own ancestor")
+            parent = c.execute('SELECT parent_domain FROM subdomains WHERE id = ?', (parent_id,)).fetchone()
+            if parent is None:
+                raise ValueError(f"Parent subdomain {parent_id} does not exist")
+            # Nested subdomains always live under their root's logical domain
+            parent_domain = parent[0]
+        
+        before = catalog_row(c, 'subdomains', subdomain_id)
+        c.execute(f'''
+            INSERT INTO subdomains (id, parent_domain, name, description, created_date, parent_id, version, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, {next_version('subdomains')}, {UPDATED_AT})
+            ON CONFLICT (id) DO UPDATE SET parent_domain = excluded.parent_domain, name = excluded.name,
+                description = excluded.description, parent_id = excluded.parent_id,
+                version = excluded.version, updated_at = excluded.updated_at
+        ''', (subdomain_id, parent_domain, name, description, datetime.now().isoformat(), parent_id or None))
+        # Rows whose domain follows the subtree, so the log has their images too
+        subtree = 'IN (SELECT descendant FROM subdomain_closure WHERE ancestor = ?)'
+        moved = [
+            (table, row['id'], row)
+            for table, where, params in (
+                ('subdomains', f'id {subtree} AND id != ? AND parent_domain IS NOT ?',
+                 (subdomain_id, subdomain_id, parent_domain)),
+                ('threats', f'subdomain_id {subtree} AND domain IS NOT ?', (subdomain_id, parent_domain)),
+                ('mitigations', f'subdomain_id {subtree} AND domain IS NOT ?', (subdomain_id, parent_domain)),
+            )
+            for row in catalog_rows(c, table, where, params)
+        ]
+        link_subdomain(c, subdomain_id, parent_domain, parent_id)
+        changes = [['subdomains', subdomain_id, before, catalog_row(c, 'subdomains', subdomain_id)]]
+        changes.extend([table, row_id, row, catalog_row(c, table, row_id)] for table, row_id, row in moved)
+        record(c, CATALOG_STREAM, 'save_subdomain', {'changes': changes})
         conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Error saving iteration: {e}")
-        return False
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         conn.close()
+    notify(current_db_path())
 
-def load_iteration(name: str):
+@timed()
+def delete_subdomains(subdomain_ids: List[str]):
+    # Each subdomain goes with its whole subtree in one DELETE: nested
+    # subdomains and closure rows cascade, and threats and mitigations in the
+    # subtree keep their domain but lose the subdomain (ON DELETE SET NULL)
+    subtree = f'IN (SELECT descendant FROM subdomain_closure WHERE ancestor {ID_SET})'
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT data FROM iterations WHERE name = ?', (name,))
-    result = c.fetchone()
-    conn.close()
-    if result:
-        return json.loads(result[0])
-    return None
+    try:
+        stage_ids(c, subdomain_ids)
+        changes = [[table, row['id'], row, dict(row, subdomain_id=None)]
+                   for table in ('threats', 'mitigations')
+                   for row in catalog_rows(c, table, f'subdomain_id {subtree}', ())]
+        c.execute(f'SELECT descendant, MAX(depth) FROM subdomain_closure WHERE descendant {subtree} GROUP BY descendant')
+        depth = dict(c.fetchall())
+        # Deepest first, so an undo recreates parents before their children
+        doomed = sorted(catalog_rows(c, 'subdomains', f'id {subtree}', ()), key=lambda row: -depth.get(row['id'], 0))
+        changes.extend(['subdomains', row['id'], row, None] for row in doomed)
+        # Cleared here rather than by ON DELETE SET NULL, which would leave their versions alone
+        for table in {change[0] for change in changes} - {'subdomains'}:
+            c.execute(f'UPDATE {table} SET subdomain_id = NULL, {stamp(table)} WHERE subdomain_id {subtree}')
+        c.execute(f'DELETE FROM subdomains WHERE id {subtree}')
+        if changes:
+            record(c, CATALOG_STREAM, 'delete_subdomains', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+    return len(doomed)
 
-def get_all_iterations():
+@timed()
+def get_subdomains(parent_domain: str = None):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT name, description, created_date FROM iterations ORDER BY created_date DESC')
+    if parent_domain:
+        c.execute('''
+            SELECT id, parent_domain, name, description, created_date
+            FROM subdomains WHERE parent_domain = ? ORDER BY name
+        ''', (parent_domain,))
+    else:
+        c.execute('''
+            SELECT id, parent_domain, name, description, created_date
+            FROM subdomains ORDER BY parent_domain, name
+        ''')
     results = c.fetchall()
     conn.close()
     return results
 
-def save_threat(threat_id: str, name: str, description: str, severity: str, domain: str):
+@timed()
+def get_subdomain_ancestors(subdomain_id: str):
+    # Root first, excluding the subdomain itself
     conn = get_db_connection()
     c = conn.cursor()
     c.execute('''
-        INSERT OR REPLACE INTO threats (id, name, description, severity, domain, created_date)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (threat_id, name, description, severity, domain, datetime.now().isoformat()))
-    conn.commit()
+        SELECT s.id, s.parent_domain, s.name, s.description, s.created_date, cl.depth
+        FROM subdomain_closure cl JOIN subdomains s ON s.id = cl.ancestor
+        WHERE cl.descendant = ? AND cl.depth > 0
+        ORDER BY cl.depth DESC
+    ''', (subdomain_id,))
+    results = c.fetchall()
     conn.close()
+    return results
 
-def save_mitigation(mit_id: str, threat_id: str, name: str, description: str, status: str, domain: str):
+@timed()
+def get_subdomain_descendants(subdomain_id: str, max_depth: int = None):
+    # Excluding the subdomain itself; depth is relative to it
     conn = get_db_connection()
     c = conn.cursor()
     c.execute('''
-        INSERT OR REPLACE INTO mitigations (id, threat_id, name, description, status, domain, created_date)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (mit_id, threat_id, name, description, status, domain, datetime.now().isoformat()))
-    conn.commit()
+        SELECT s.id, s.parent_domain, s.name, s.description, s.created_date, cl.depth
+        FROM subdomain_closure cl JOIN subdomains s ON s.id = cl.descendant
+        WHERE cl.ancestor = ? AND cl.depth > 0 AND (? IS NULL OR cl.depth <= ?)
+        ORDER BY cl.depth, s.name
+    ''', (subdomain_id, max_depth, max_depth))
+    results = c.fetchall()
     conn.close()
+    return results
 
-def get_all_threats():
+@timed()
+def get_subdomain_tree(parent_domain: str = None):
+    # Every subdomain with its parent, depth, path and subtree roll-ups:
+    # (id, parent_domain, parent_id, name, depth, path, descendants, threats, mitigations)
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT * FROM threats ORDER BY id')
+    c.execute('''
+        SELECT s.id, s.parent_domain, s.parent_id, s.name,
+               (SELECT MAX(depth) FROM subdomain_closure WHERE descendant = s.id) AS depth,
+               (SELECT group_concat(name, ' / ') FROM (
+                    SELECT a.name FROM subdomain_closure cl JOIN subdomains a ON a.id = cl.ancestor
+                    WHERE cl.descendant = s.id ORDER BY cl.depth DESC
+               )) AS path,
+               (SELECT COUNT(*) - 1 FROM subdomain_closure WHERE ancestor = s.id) AS descendants,
+               (SELECT COUNT(*) FROM subdomain_closure cl JOIN threats t ON t.subdomain_id = cl.descendant
+                WHERE cl.ancestor = s.id) AS threats,
+               (SELECT COUNT(*) FROM subdomain_closure cl JOIN mitigations m ON m.subdomain_id = cl.descendant
+                WHERE cl.ancestor = s.id) AS mitigations
+        FROM subdomains s
+        WHERE ? IS NULL OR s.parent_domain = ?
+        ORDER BY s.parent_domain, path
+    ''', (parent_domain, parent_domain))
     results = c.fetchall()
     conn.close()
     return results
 
-def get_mitigations_for_threat(threat_id: str):
+@timed()
+def get_threats_in_subtree(subdomain_id: str):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('SELECT * FROM mitigations WHERE threat_id = ? ORDER BY id', (threat_id,))
+    c.execute('''
+        SELECT t.id, t.name, t.description, t.severity, t.domain, t.created_date
+        FROM subdomain_closure cl JOIN threats t ON t.subdomain_id = cl.descendant
+        WHERE cl.ancestor = ?
+        ORDER BY t.id
+    ''', (subdomain_id,))
     results = c.fetchall()
     conn.close()
     return results
 
-def get_all_mitigations():
+# Change log
+@timed()
+def import_architecture(result: ImportResult, iteration_name: str = None, description: str = "",
+                        create_subdomains: bool = False):
+    # Writes an imported architecture in one transaction: the missing
+    # subdomains along each container path and, optionally, a new iteration
+    # holding it. Returns the number of subdomains created.
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('''
-        SELECT m.*, t.name as threat_name 
-        FROM mitigations m 
-        LEFT JOIN threats t ON m.threat_id = t.id 
-        ORDER BY m.id
-    ''')
-    results = c.fetchall()
+    try:
+        changes = []
+        if create_subdomains:
+            existing = {
+                (domain, parent_id, name.lower()): sub_id
+                for sub_id, domain, parent_id, name in c.execute(
+                    'SELECT id, parent_domain, parent_id, name FROM subdomains')
+            }
+            now = datetime.now().isoformat()
+            for domain, path in result.subdomains:
+                parent_id = None
+                for name in path:
+                    key = (domain, parent_id, name.lower())
+                    if key not in existing:
+                        row = {'id': f"SUB-{uuid.uuid4().hex[:8].upper()}", 'parent_domain': domain, 'name': name,
+                               'description': "Imported from architecture file", 'created_date': now,
+                               'parent_id': parent_id}
+                        write_catalog_row(c, 'subdomains', row)
+                        link_subdomain(c, row['id'], domain, parent_id)
+                        changes.append(['subdomains', row['id'], None, row])
+                        existing[key] = row['id']
+                    parent_id = existing[key]
+        created = len(changes)
+        if iteration_name:
+            if c.execute('SELECT 1 FROM iterations WHERE name = ?', (iteration_name,)).fetchone():
+                raise ValueError(f"Iteration {iteration_name} already exists")
+            data = {'domains': result.domains, 'interactions': result.interactions,
+                    'selected_threats': {}, 'selected_mitigations': {}}
+            c.execute(f'''
+                INSERT INTO iterations (name, description, created_date, data, version, updated_at)
+                VALUES (?, ?, ?, ?, {next_version('iterations')}, {UPDATED_AT})
+            ''', (iteration_name, description, datetime.now().isoformat(), json.dumps(data)))
+            changes.append(['iterations', c.lastrowid, None, catalog_row(c, 'iterations', c.lastrowid)])
+        if changes:
+            record(c, CATALOG_STREAM, 'import_architecture', {'changes': changes})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if changes:
+        notify(current_db_path())
+    return created
+
+@timed()
+def get_analytics():
+    # The process-wide columnar mirror, caught up with SQLite first
+    db_path = current_db_path()
+    analytics = get_analytics_store(db_path)
+    conn = get_db_connection(db_path)
+    analytics.refresh(conn)
+    conn.close()
+    return analytics
+
+@timed()
+def get_change_events(stream: str, limit: int = 50):
+    conn = get_db_connection()
+    c = conn.cursor()
+    results = get_recent_events(c, stream, limit)
     conn.close()
     return results
 
-def delete_threat(threat_id: str):
+def apply_catalog_changes(c, changes: List):
+    # Writes each change's after-image; None deletes the row
+    for table, row_id, before, after in changes:
+        current = catalog_row(c, table, row_id)
+        if current != before:
+            raise ValueError(f"{table[:-1].capitalize()} {row_id} has changed since; undo the later change first")
+        # A delete here must not cascade or null out rows the change does not
+        # carry images of, or those edits would be lost without a trace
+        if table == 'subdomains' and after is None:
+            if c.execute('SELECT 1 FROM subdomain_closure WHERE ancestor = ? AND depth > 0',
+                         (row_id,)).fetchone():
+                raise ValueError(f"Subdomain {row_id} has nested subdomains; remove them first")
+            if c.execute('SELECT 1 FROM threats WHERE subdomain_id = ? UNION ALL '
+                         'SELECT 1 FROM mitigations WHERE subdomain_id = ?', (row_id, row_id)).fetchone():
+                raise ValueError(f"Subdomain {row_id} has threats or mitigations assigned since; move them first")
+        if table == 'threats' and after is None:
+            if c.execute('SELECT 1 FROM mitigations WHERE threat_id = ?', (row_id,)).fetchone():
+                raise ValueError(f"Threat {row_id} has mitigations added since; remove them first")
+        if after is None:
+            c.execute(f'DELETE FROM {table} WHERE {"threat_id" if table == "threat_components" else "id"} = ?',
+                      (row_id,))
+        else:
+            write_catalog_row(c, table, after)
+            if table == 'subdomains':
+                link_subdomain(c, row_id, after['parent_domain'], after['parent_id'])
+
+@timed()
+def undo_catalog_change(seq: int):
+    # Appends the inverse of a catalog event; undoing an undo is a redo
+    conn = get_db_connection()
+    c = conn.cursor()
+    try:
+        event = get_event(c, seq)
+        if event is None or event[1] != CATALOG_STREAM:
+            raise ValueError(f"No catalog change #{seq}")
+        inverse = invert_changes(event[3]['changes'])
+        apply_catalog_changes(c, inverse)
+        new_seq = record(c, CATALOG_STREAM, 'undo', {'undoes': seq, 'changes': inverse})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    notify(current_db_path())
+    return new_seq
+
+@timed()
+def load_catalog_cache():
+    # One read transaction, so the rows and the change-log position agree
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('DELETE FROM mitigations WHERE threat_id = ?', (threat_id,))
-    c.execute('DELETE FROM threats WHERE id = ?', (threat_id,))
+    c.execute('BEGIN')
+    seq = c.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+    c.execute('SELECT id, name, description, severity, domain, created_date FROM threats ORDER BY id')
+    threat_rows = c.fetchall()
+    mitigation_count = c.execute('SELECT COUNT(*) FROM mitigations').fetchone()[0]
+    c.execute('SELECT id, parent_domain, name, parent_id FROM subdomains')
+    subdomain_rows = c.fetchall()
     conn.commit()
     conn.close()
+    return CatalogCache(seq, threat_rows, mitigation_count, subdomain_rows)
 
-def delete_mitigation(mit_id: str):
-    conn = get_db_connection()
+@timed()
+def load_suggestion_index(db_path: str = None):
+    conn = get_db_connection(db_path)
     c = conn.cursor()
-    c.execute('DELETE FROM mitigations WHERE id = ?', (mit_id,))
+    c.execute('BEGIN')
+    seq = c.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+    c.execute('SELECT id, domain, severity, subdomain_id FROM threats')
+    threat_rows = c.fetchall()
+    c.execute('SELECT threat_id, domain, component FROM threat_components')
+    component_rows = c.fetchall()
     conn.commit()
     conn.close()
+    return SuggestionIndex.build(seq, threat_rows, component_rows)
 
-def save_subdomain(subdomain_id: str, parent_domain: str, name: str, description: str):
+@timed()
+def suggest_threats(architecture: ArchitectureModel, selection: SelectionState, focus_components: List = (),
+                    focus_subdomains: List = (), limit: int = 20):
+    db_path = current_db_path()
+    index = get_suggestion_index(db_path, lambda: load_suggestion_index(db_path))
+    return index.suggest(architecture.domains, architecture.interactions, focus_components, focus_subdomains,
+                         exclude=selection.threats, limit=limit)
+
+@timed()
+def get_catalog_as_of(seq: int):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('''
-        INSERT OR REPLACE INTO subdomains (id, parent_domain, name, description, created_date)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (subdomain_id, parent_domain, name, description, datetime.now().isoformat()))
+    results = catalog_as_of(c, seq)
+    conn.close()
+    return results
+
+@timed()
+def log_session_event(stream: str, kind: str, payload: Dict, checkpoint: Dict = None):
+    conn = get_db_connection()
+    c = conn.cursor()
+    seq = record(c, stream, kind, payload)
+    if checkpoint is not None:
+        write_checkpoint(c, stream, seq, checkpoint)
+        prune_session_stream(c, stream)
     conn.commit()
     conn.close()
+    return seq
 
-def get_subdomains(parent_domain: str = None):
+@timed()
+def get_session_state_as_of(stream: str, seq: int):
     conn = get_db_connection()
     c = conn.cursor()
-    if parent_domain:
-        c.execute('SELECT * FROM subdomains WHERE parent_domain = ? ORDER BY name', (parent_domain,))
-    else:
-        c.execute('SELECT * FROM subdomains ORDER BY parent_domain, name')
-    results = c.fetchall()
+    results = session_state_as_of(c, BASE_ARCHITECTURE, stream, seq)
     conn.close()
     return results
 
@@ -506,70 +1327,183 @@ STATIC_INTERACTIONS = [
     {"from": "Physical Domain", "to": "Logical Domain", "relationship": "represent"}
 ]
 
+# Frozen, built once per process and shared by every session; sessions hold
+# copy-on-write overlays of it
+BASE_ARCHITECTURE = get_base_architecture('static', STATIC_DOMAINS, STATIC_INTERACTIONS)
+
+def select_workspace() -> str:
+    # Points this session's runs at its workspace and returns that database's
+    # path; a link can pick one with ?workspace=name
+    if 'workspace' not in st.session_state:
+        st.session_state.workspace = st.query_params.get('workspace', DEFAULT_WORKSPACE)
+    try:
+        db_path = (DEFAULT_DB_PATH if st.session_state.workspace == DEFAULT_WORKSPACE
+                   else workspace_path(WORKSPACE_DIR, st.session_state.workspace))
+    except ValueError:
+        st.session_state.workspace = DEFAULT_WORKSPACE
+        db_path = DEFAULT_DB_PATH
+    st.session_state.db_path = db_path
+    return db_path
+
+def switch_workspace(name: str):
+    # Everything else in the session was built from the old workspace's data
+    for key in [k for k in st.session_state if k not in ('workspace', 'workspace_choice', 'db_path')]:
+        del st.session_state[key]
+    st.session_state.workspace = name
+    st.query_params['workspace'] = name
+
+def _on_workspace_choice():
+    switch_workspace(st.session_state.workspace_choice)
+
+def _on_create_workspace():
+    name = st.session_state.new_workspace_name.strip()
+    try:
+        workspace_path(WORKSPACE_DIR, name)
+    except ValueError as e:
+        st.session_state.workspace_error = str(e)
+        return
+    # The database file is created by init_db on the next run
+    switch_workspace(name)
+
+def workspace_sidebar():
+    st.markdown("---")
+    workspaces = list(list_workspaces(WORKSPACE_DIR, DEFAULT_DB_PATH))
+    current = st.session_state.workspace
+    if current not in workspaces:
+        workspaces.append(current)
+    st.session_state.workspace_choice = current
+    st.selectbox("Workspace", workspaces, key="workspace_choice", on_change=_on_workspace_choice)
+    with st.expander("New Workspace"):
+        st.text_input("Workspace Name", key="new_workspace_name")
+        st.button("Create Workspace", on_click=_on_create_workspace)
+        if st.session_state.get('workspace_error'):
+            st.error(st.session_state.pop('workspace_error'))
+
 def initialize_session_state():
     if 'current_iteration' not in st.session_state:
         st.session_state.current_iteration = None
-    if 'domains' not in st.session_state:
-        st.session_state.domains = STATIC_DOMAINS.copy()
-    if 'interactions' not in st.session_state:
-        st.session_state.interactions = STATIC_INTERACTIONS.copy()
-    if 'selected_threats' not in st.session_state:
-        st.session_state.selected_threats = {}
-    if 'selected_mitigations' not in st.session_state:
-        st.session_state.selected_mitigations = {}
+        st.session_state.iteration_version = None
+    if 'architecture' not in st.session_state:
+        st.session_state.architecture = BASE_ARCHITECTURE
+    if 'selection' not in st.session_state:
+        st.session_state.selection = SelectionState()
+    if 'history' not in st.session_state:
+        st.session_state.history = SessionHistory(f"{SESSION_PREFIX}{uuid.uuid4().hex}")
+    if 'catalog' not in st.session_state:
+        # Subscribe before loading so no change falls between the two
+        st.session_state.subscription = get_change_feed(current_db_path()).subscribe()
+        st.session_state.catalog = load_catalog_cache()
 
-def render_architecture_diagram():
-    fig = go.Figure()
-    
-    # Add domains
-    for domain_name, domain_info in st.session_state.domains.items():
-        fig.add_trace(go.Scatter(
-            x=[domain_info["position"]["x"]],
-            y=[domain_info["position"]["y"]],
-            mode='markers+text',
-            marker=dict(
-                size=100,
-                color=domain_info["color"],
-                line=dict(color='black', width=2)
-            ),
-            text=domain_name,
-            textposition='middle center',
-            name=domain_name,
-            showlegend=False
-        ))
-    
-    # Add interactions
-    for interaction in st.session_state.interactions:
-        from_domain = st.session_state.domains.get(interaction["from"])
-        to_domain = st.session_state.domains.get(interaction["to"])
-        
-        if from_domain and to_domain:
-            fig.add_trace(go.Scatter(
-                x=[from_domain["position"]["x"], to_domain["position"]["x"]],
-                y=[from_domain["position"]["y"], to_domain["position"]["y"]],
-                mode='lines+text',
-                line=dict(color='gray', width=2),
-                text=['', f'<<{interaction["relationship"]}>>'],
-                textposition='middle center',
-                showlegend=False,
-                name=f'{interaction["from"]} -> {interaction["to"]}'
-            ))
-    
-    fig.update_layout(
-        title="Threat Model Architecture Diagram",
-        showlegend=False,
-        height=600,
-        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        plot_bgcolor='white'
+@timed()
+def sync_catalog():
+    # Applies pushed catalog changes to this session's cache and drops
+    # selections whose threat or mitigation was deleted or re-parented
+    catalog = st.session_state.catalog
+    selection = st.session_state.selection
+    deselected = False
+    for event in st.session_state.subscription.drain():
+        if not catalog.apply(event):
+            continue
+        if event.table == 'threats' and event.after is None and selection.has_threat(event.row_id):
+            _apply_and_log('deselect_threat', {
+                'threat_id': event.row_id,
+                'mitigations': {mit_id: event.row_id for mit_id in selection.mitigations_for(event.row_id)}
+            })
+            deselected = True
+        elif event.table == 'mitigations' and selection.has_mitigation(event.row_id):
+            threat_id = selection.mitigations[event.row_id]
+            if event.after is None or event.after['threat_id'] != threat_id:
+                _apply_and_log('deselect_mitigation', {'mit_id': event.row_id, 'threat_id': threat_id})
+                deselected = True
+    if deselected:
+        clear_selection_widgets()
+
+@st.fragment(run_every=2)
+def change_watcher():
+    # Reruns an idle session as soon as another user's change arrives
+    if st.session_state.subscription.pending():
+        st.rerun()
+
+def get_selected_rows(selection: SelectionState, threats_by_id: Dict = None, mitigations_by_id: Dict = None):
+    # Catalog rows for the selected IDs, in selection order, as
+    # ({threat_id: threat row}, {mit_id: mitigation row}). Rows already
+    # fetched this rerun can be passed in to skip the lookups.
+    threat_rows = threats_by_id if threats_by_id is not None else {
+        row[0]: row for row in get_threats_by_ids(list(selection.threats))
+    }
+    mit_rows = mitigations_by_id if mitigations_by_id is not None else {
+        row[0]: row for row in get_mitigations_by_ids(list(selection.mitigations))
+    }
+    selected_threats = {tid: threat_rows[tid] for tid in selection.threats if tid in threat_rows}
+    selected_mitigations = {
+        mid: mit_rows[mid] for mid in selection.mitigations
+        if mid in mit_rows and mit_rows[mid][1] in selected_threats
+    }
+    return selected_threats, selected_mitigations
+
+def clear_selection_widgets():
+    # Checkbox state from before a load would otherwise override the loaded selection
+    for key in [k for k in st.session_state if k.startswith(('threat_', 'mit_'))]:
+        del st.session_state[key]
+
+def _apply_and_log(kind: str, payload: Dict):
+    history = st.session_state.history
+    st.session_state.architecture = apply_session_event(
+        BASE_ARCHITECTURE, st.session_state.architecture, st.session_state.selection, kind, payload
     )
-    
-    return fig
+    history.since_checkpoint += 1
+    checkpoint = None
+    if history.since_checkpoint >= CHECKPOINT_EVERY:
+        checkpoint = session_snapshot(st.session_state.architecture, st.session_state.selection)
+        history.since_checkpoint = 0
+    log_session_event(history.stream, kind, payload, checkpoint)
+
+def apply_session_change(kind: str, payload: Dict):
+    # Every architecture/selection edit goes through here so it is logged and undoable
+    history = st.session_state.history
+    _apply_and_log(kind, payload)
+    history.undo_stack.append((kind, payload))
+    history.redo_stack.clear()
+
+def load_session_state(architecture: ArchitectureModel, selection: SelectionState):
+    apply_session_change('load', {'delta': snapshot_delta(
+        session_snapshot(st.session_state.architecture, st.session_state.selection),
+        session_snapshot(architecture, selection)
+    )})
+    clear_selection_widgets()
+
+def undo_session_change():
+    history = st.session_state.history
+    kind, payload = history.undo_stack.pop()
+    _apply_and_log(*invert_session_event(kind, payload))
+    history.redo_stack.append((kind, payload))
+    clear_selection_widgets()
 
+def redo_session_change():
+    history = st.session_state.history
+    kind, payload = history.redo_stack.pop()
+    _apply_and_log(kind, payload)
+    history.undo_stack.append((kind, payload))
+    clear_selection_widgets()
+
+@timed()
+def render_architecture_diagram():
+    architecture = st.session_state.architecture
+    return build_architecture_figure(architecture.domains, architecture.interactions)
+
+@timed()
 def admin_panel():
     st.header("🔧 Admin Panel")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Threats", "Mitigations", "Subdomains", "Iterations"])
+    tab_names = ["Threats", "Mitigations", "Subdomains", "Iterations", "Duplicates", "History", "Workspaces"]
+    if instrumentation.ENABLED:
+        tab_names.append("Performance")
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, *extra_tabs = st.tabs(tab_names)
+    
+    # Subdomain choices for the create forms: id -> "Domain / Parent / Child"
+    subdomain_tree = get_subdomain_tree()
+    subdomain_labels = {row[0]: f"{row[1]} / {row[5]}" for row in subdomain_tree}
+    subdomain_roots = {row[0]: row[1] for row in subdomain_tree}
     
     with tab1:
         st.subheader("Manage Threats")
@@ -584,25 +1518,37 @@ def admin_panel():
                 threat_desc = st.text_area("Description", key="new_threat_desc")
                 severity = st.selectbox("Severity", ["Low", "Medium", "High", "Critical"], key="new_threat_severity")
                 domain = st.selectbox("Primary Domain", list(STATIC_DOMAINS.keys()), key="new_threat_domain")
+                threat_subdomain = st.selectbox(
+                    "Subdomain (optional, overrides Primary Domain)", [""] + list(subdomain_labels),
+                    format_func=lambda k: subdomain_labels.get(k, "(none)"), key="new_threat_subdomain"
+                )
+                threat_components = st.multiselect(
+                    "Components (optional; a new threat's are inferred from the text when empty)",
+                    [(d, c) for d, info in STATIC_DOMAINS.items() for c in info['components']],
+                    format_func=lambda k: f"{k[0]} / {k[1]}", key="new_threat_components"
+                )
+                threat_overwrite = st.checkbox("Replace the threat if this ID exists", key="new_threat_overwrite")
                 
                 if st.form_submit_button("Create Threat"):
                     if threat_id and threat_name:
-                        save_threat(threat_id, threat_name, threat_desc, severity, domain)
-                        st.success(f"Threat {threat_id} created successfully!")
-                        st.rerun()
+                        if threat_subdomain:
+                            domain = subdomain_roots[threat_subdomain]
+                        try:
+                            save_threat(threat_id, threat_name, threat_desc, severity, domain,
+                                        threat_subdomain or None, threat_components or None,
+                                        expected_version=None if threat_overwrite else 0)
+                            st.success(f"Threat {threat_id} created successfully!")
+                            st.rerun()
+                        except ValueError as e:
+                            st.error(f"Error saving threat: {e}")
         
         with col2:
             st.write("**Existing Threats**")
             threats = get_all_threats()
             if threats:
                 threat_df = pd.DataFrame(threats, columns=['ID', 'Name', 'Description', 'Severity', 'Domain', 'Created'])
-                st.dataframe(threat_df, use_container_width=True)
-                
-                threat_to_delete = st.selectbox("Delete Threat", [""] + [t[0] for t in threats])
-                if st.button("Delete Selected Threat") and threat_to_delete:
-                    delete_threat(threat_to_delete)
-                    st.success(f"Threat {threat_to_delete} deleted!")
-                    st.rerun()
+                bulk_edit_panel('threats', threat_df, 'Severity', ["Low", "Medium", "High", "Critical"],
+                                ['ID', 'Name', 'Description', 'Severity', 'Domain', 'Created'])
     
     with tab2:
         st.subheader("Manage Mitigations")
@@ -620,12 +1566,28 @@ def admin_panel():
                     mit_desc = st.text_area("Description", key="new_mit_desc")
                     status = st.selectbox("Status", ["Planned", "In Progress", "Implemented", "Verified"], key="new_mit_status")
                     domain = st.selectbox("Implementation Domain", list(STATIC_DOMAINS.keys()), key="new_mit_domain")
+                    mit_subdomain = st.selectbox(
+                        "Subdomain (optional, overrides Implementation Domain)", [""] + list(subdomain_labels),
+                        format_func=lambda k: subdomain_labels.get(k, "(none)"), key="new_mit_subdomain"
+                    )
+                    col_cost, col_effort = st.columns(2)
+                    with col_cost:
+                        cost = st.number_input("Cost", min_value=0.0, value=0.0, step=1.0, key="new_mit_cost")
+                    with col_effort:
+                        effort = st.number_input("Effort (person-days)", min_value=0.0, value=0.0, step=0.5, key="new_mit_effort")
+                    mit_overwrite = st.checkbox("Replace the mitigation if this ID exists", key="new_mit_overwrite")
                     
                     if st.form_submit_button("Create Mitigation"):
                         if mit_id and mit_name and threat_id:
-                            save_mitigation(mit_id, threat_id, mit_name, mit_desc, status, domain)
-                            st.success(f"Mitigation {mit_id} created successfully!")
-                            st.rerun()
+                            if mit_subdomain:
+                                domain = subdomain_roots[mit_subdomain]
+                            try:
+                                save_mitigation(mit_id, threat_id, mit_name, mit_desc, status, domain, cost, effort,
+                                                mit_subdomain or None, expected_version=None if mit_overwrite else 0)
+                                st.success(f"Mitigation {mit_id} created successfully!")
+                                st.rerun()
+                            except ValueError as e:
+                                st.error(f"Error saving mitigation: {e}")
             else:
                 st.info("Create threats first before adding mitigations.")
         
@@ -634,13 +1596,8 @@ def admin_panel():
             mitigations = get_all_mitigations()
             if mitigations:
                 mit_df = pd.DataFrame(mitigations, columns=['ID', 'Threat_ID', 'Name', 'Description', 'Status', 'Domain', 'Created', 'Threat_Name'])
-                st.dataframe(mit_df[['ID', 'Threat_ID', 'Name', 'Status', 'Domain', 'Threat_Name']], use_container_width=True)
-                
-                mit_to_delete = st.selectbox("Delete Mitigation", [""] + [m[0] for m in mitigations])
-                if st.button("Delete Selected Mitigation") and mit_to_delete:
-                    delete_mitigation(mit_to_delete)
-                    st.success(f"Mitigation {mit_to_delete} deleted!")
-                    st.rerun()
+                bulk_edit_panel('mitigations', mit_df, 'Status', ["Planned", "In Progress", "Implemented", "Verified"],
+                                ['ID', 'Threat_ID', 'Name', 'Status', 'Domain', 'Threat_Name'])
     
     with tab3:
         st.subheader("Manage Subdomains")
@@ -652,21 +1609,53 @@ def admin_panel():
             with st.form("create_subdomain"):
                 subdomain_id = st.text_input("Subdomain ID", key="new_subdomain_id")
                 parent_domain = st.selectbox("Parent Domain", list(STATIC_DOMAINS.keys()), key="new_subdomain_parent")
+                parent_subdomain = st.selectbox(
+                    "Parent Subdomain (optional, overrides Parent Domain)", [""] + list(subdomain_labels),
+                    format_func=lambda k: subdomain_labels.get(k, "(none)"), key="new_subdomain_parent_id"
+                )
                 subdomain_name = st.text_input("Subdomain Name", key="new_subdomain_name")
                 subdomain_desc = st.text_area("Description", key="new_subdomain_desc")
+                subdomain_overwrite = st.checkbox("Replace the subdomain if this ID exists (moves its subtree)",
+                                                  key="new_subdomain_overwrite")
                 
                 if st.form_submit_button("Create Subdomain"):
                     if subdomain_id and subdomain_name and parent_domain:
-                        save_subdomain(subdomain_id, parent_domain, subdomain_name, subdomain_desc)
-                        st.success(f"Subdomain {subdomain_name} created successfully!")
-                        st.rerun()
+                        try:
+                            save_subdomain(subdomain_id, parent_domain, subdomain_name, subdomain_desc,
+                                           parent_subdomain or None,
+                                           expected_version=None if subdomain_overwrite else 0)
+                            st.success(f"Subdomain {subdomain_name} created successfully!")
+                            st.rerun()
+                        except ValueError as e:
+                            st.error(f"Error saving subdomain: {e}")
         
         with col2:
             st.write("**Existing Subdomains**")
-            subdomains = get_subdomains()
-            if subdomains:
-                subdomain_df = pd.DataFrame(subdomains, columns=['ID', 'Parent_Domain', 'Name', 'Description', 'Created'])
-                st.dataframe(subdomain_df, use_container_width=True)
+            if subdomain_tree:
+                subdomain_df = pd.DataFrame(
+                    subdomain_tree,
+                    columns=['ID', 'Parent_Domain', 'Parent_ID', 'Name', 'Depth', 'Path',
+                             'Descendants', 'Threats (subtree)', 'Mitigations (subtree)']
+                )
+                st.dataframe(
+                    subdomain_df[['ID', 'Parent_Domain', 'Path', 'Depth', 'Descendants',
+                                  'Threats (subtree)', 'Mitigations (subtree)']],
+                    use_container_width=True, hide_index=True
+                )
+                
+                to_delete = st.multiselect("Delete Subdomains", list(subdomain_labels),
+                                           format_func=lambda k: subdomain_labels[k], key="delete_subdomains")
+                if to_delete:
+                    by_id = subdomain_df.set_index('ID')
+                    nested = int(by_id.loc[to_delete, 'Descendants'].sum())
+                    st.warning((f"Also deletes up to {nested} nested subdomains. " if nested else "") +
+                               "Threats and mitigations in them keep their domain and lose the subdomain.")
+                if st.button("Delete Selected Subdomains", disabled=not to_delete):
+                    count = delete_subdomains(to_delete)
+                    st.session_state.subdomain_delete_result = f"Deleted {count} subdomains"
+                    st.rerun()
+                if st.session_state.get('subdomain_delete_result'):
+                    st.success(st.session_state.subdomain_delete_result)
     
     with tab4:
         st.subheader("Manage Iterations")
@@ -680,26 +1669,336 @@ def admin_panel():
             with st.form("save_iteration"):
                 iteration_name = st.text_input("Iteration Name")
                 iteration_desc = st.text_area("Description")
+                iteration_overwrite = st.checkbox("Replace an existing iteration with this name")
                 
                 if st.form_submit_button("Save Current State as Iteration"):
                     if iteration_name:
+                        selected_threats, selected_mitigations = get_selected_rows(st.session_state.selection)
                         data = {
-                            'domains': st.session_state.domains,
-                            'interactions': st.session_state.interactions,
-                            'selected_threats': st.session_state.selected_threats,
-                            'selected_mitigations': st.session_state.selected_mitigations
+                            **st.session_state.architecture.to_data(),
+                            'selected_threats': selected_threats,
+                            'selected_mitigations': selected_mitigations
                         }
-                        if save_iteration(iteration_name, iteration_desc, data):
+                        # Saving back to the loaded iteration fails if someone else saved it since
+                        if iteration_name == st.session_state.current_iteration and not iteration_overwrite:
+                            expected_version = st.session_state.iteration_version
+                        else:
+                            expected_version = None if iteration_overwrite else 0
+                        version = save_iteration(iteration_name, iteration_desc, data, expected_version)
+                        if version:
+                            st.session_state.current_iteration = iteration_name
+                            st.session_state.iteration_version = version
                             st.success(f"Iteration '{iteration_name}' saved successfully!")
                             st.rerun()
+        
+        retention_panel()
+    
+    with tab5:
+        duplicates_panel()
+    
+    with tab6:
+        catalog_history_panel()
+    
+    with tab7:
+        workspaces_panel()
+    
+    if extra_tabs:
+        with extra_tabs[0]:
+            performance_panel()
+
+def retention_panel():
+    st.write("#### 🧹 Retention & Maintenance")
+    st.caption(f"Keeping {RETENTION_POLICY.describe()}; older iterations are archived to compressed files.")
+    stats, due, runs, pinned = get_retention_status()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Database Size", f"{stats['size_bytes'] / 1e6:.1f} MB")
+    col2.metric("Free Pages", stats['free_pages'])
+    col3.metric("Due for Archive", len(due))
+    col4.metric("Incremental Vacuum", "On" if stats['incremental_vacuum'] else "Pending")
+    if not stats['incremental_vacuum'] and stats['size_bytes'] > CONVERT_MAX_BYTES:
+        st.warning("This database predates incremental vacuum. Converting it takes one full VACUUM, which "
+                   "rewrites the whole file and blocks every save until it finishes, so scheduled runs skip it.")
+        if st.button("Convert Now (full VACUUM)", key="convert_auto_vacuum"):
+            try:
+                summary = run_maintenance_now(convert=True)
+            except (sqlite3.Error, OSError) as e:
+                st.error(f"Maintenance failed: {e}")
+            else:
+                st.session_state.maintenance_summary = summary
+                st.rerun()
+    if due:
+        with st.expander(f"Iterations the next run will archive ({len(due)})"):
+            st.dataframe(pd.DataFrame(due, columns=['Name', 'Created']), use_container_width=True, hide_index=True)
+    
+    
+    st.write("**Pinned Iterations**")
+    st.caption("Pinned iterations are never archived.")
+    col1, col2 = st.columns(2)
+    with col1:
+        to_pin = st.multiselect("Pin", [i[0] for i in get_all_iterations() if i[0] not in pinned], key="pin_names")
+        if st.button("📌 Pin", key="pin_iterations", disabled=not to_pin):
+            set_iterations_pinned(to_pin, True)
+            del st.session_state["pin_names"]
+            st.rerun()
+    with col2:
+        to_unpin = st.multiselect("Unpin", pinned, key="unpin_names")
+        if st.button("Unpin", key="unpin_iterations", disabled=not to_unpin):
+            set_iterations_pinned(to_unpin, False)
+            del st.session_state["unpin_names"]
+            st.rerun()
+    
+    if st.button("Run Maintenance Now", key="run_maintenance"):
+        try:
+            summary = run_maintenance_now()
+        except (sqlite3.Error, OSError) as e:
+            st.error(f"Maintenance failed: {e}")
+        else:
+            st.session_state.maintenance_summary = summary
+            st.rerun()
+    summary = st.session_state.get('maintenance_summary')
+    if summary:
+        st.success(f"Archived {summary['archived']} iterations, dropped {summary['sessions']} idle session "
+                   f"histories and freed {summary['freed_pages']} pages "
+                   f"in {summary['seconds']:.1f}s")
+    
+    if runs:
+        st.write("**Recent Runs**")
+        st.dataframe(pd.DataFrame(
+            [(run_date, archived, os.path.basename(archive) if archive else "", freed, round(seconds, 2))
+             for run_date, archived, archive, freed, seconds in runs],
+            columns=['Run', 'Archived', 'Archive', 'Freed Pages', 'Seconds']
+        ), use_container_width=True, hide_index=True)
+    
+    archives = list_archives(get_maintenance_job(current_db_path(), RETENTION_POLICY, MAINTENANCE_INTERVAL).archive_dir)
+    if archives:
+        st.write("**Restore from Archive**")
+        paths = dict(archives)
+        path = st.selectbox("Archive", list(paths), key="restore_archive",
+                            format_func=lambda p: f"{os.path.basename(p)} ({paths[p] / 1e3:.0f} kB)")
+        names = [record['name'] for record in read_archive(path)]
+        chosen = st.multiselect("Iterations", names, key="restore_names")
+        if st.button("Restore", key="restore_iterations", disabled=not chosen):
+            restored = restore_archived_iterations(path, chosen)
+            skipped = len(chosen) - len(restored)
+            st.success(f"Restored {len(restored)} iterations" + (f"; {skipped} already exist" if skipped else ""))
+
+def bulk_edit_panel(table: str, df: pd.DataFrame, field: str, field_options: List[str], display_columns: List[str]):
+    # Filter the table, pick rows (or every match) and apply one bulk change
+    label = table.capitalize()
+    col1, col2 = st.columns(2)
+    with col1:
+        domain_filter = st.multiselect("Filter by Domain", sorted(df['Domain'].dropna().unique()),
+                                       key=f"bulk_{table}_domains")
+    with col2:
+        value_filter = st.multiselect(f"Filter by {field}", field_options, key=f"bulk_{table}_values")
+    mask = pd.Series(True, index=df.index)
+    if domain_filter:
+        mask &= df['Domain'].isin(domain_filter)
+    if value_filter:
+        mask &= df[field].isin(value_filter)
+    shown = df[mask]
+    st.dataframe(shown[display_columns], use_container_width=True, hide_index=True)
+    
+    st.write(f"**Bulk Edit {label}**")
+    if st.checkbox(f"All {len(shown)} {table} shown", key=f"bulk_{table}_all"):
+        row_ids = shown['ID'].tolist()
+    else:
+        row_ids = st.multiselect(f"{label} to change", shown['ID'].tolist(), key=f"bulk_{table}_ids")
+    action = st.radio("Action", ["Delete", f"Set {field}", "Reassign Domain"], horizontal=True,
+                      key=f"bulk_{table}_action")
+    value = None
+    if action == f"Set {field}":
+        value = st.selectbox(field, field_options, key=f"bulk_{table}_value")
+    elif action == "Reassign Domain":
+        value = st.selectbox("Domain", list(STATIC_DOMAINS.keys()), key=f"bulk_{table}_domain")
+    confirmed = action != "Delete" or st.checkbox(
+        f"Delete {len(row_ids)} {table}" + (" and all their mitigations" if table == 'threats' else ""),
+        key=f"bulk_{table}_confirm"
+    )
+    
+    if st.button(f"Apply to {len(row_ids)} {label}", disabled=not row_ids or not confirmed,
+                 key=f"bulk_{table}_apply"):
+        if action == "Delete":
+            count = (delete_threats if table == 'threats' else delete_mitigations)(row_ids)
+            message = f"Deleted {count} {table}"
+        else:
+            column = field.lower() if action == f"Set {field}" else 'domain'
+            count = bulk_update(table, row_ids, {column: value})
+            message = f"Updated {count} {table}"
+        st.session_state[f"bulk_{table}_result"] = message
+        st.rerun()
+    result = st.session_state.get(f"bulk_{table}_result")
+    if result:
+        st.success(result)
+
+def workspaces_panel():
+    st.subheader("Workspaces")
+    st.write(f"Current workspace: **{st.session_state.workspace}** (`{current_db_path()}`)")
+    st.caption("Each workspace is its own database file. Switch or create workspaces in the sidebar.")
+    
+    st.write("**Cross-Workspace Report**")
+    if st.button("Build Report", key="build_workspace_report"):
+        try:
+            st.session_state.workspace_report = get_workspace_report()
+        except sqlite3.Error as e:
+            st.error(f"Error reading workspaces: {e}")
+    if 'workspace_report' not in st.session_state:
+        return
+    totals, severity, status = st.session_state.workspace_report
+    totals['Coverage'] = (totals['Covered'] / totals['Threats'].where(totals['Threats'] > 0)).fillna(0).map('{:.0%}'.format)
+    st.dataframe(totals.drop(columns='Covered'), use_container_width=True, hide_index=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**Threats by Severity**")
+        st.dataframe(severity.pivot_table(index='Workspace', columns='Severity', values='Count', fill_value=0),
+                     use_container_width=True)
+    with col2:
+        st.write("**Mitigations by Status**")
+        st.dataframe(status.pivot_table(index='Workspace', columns='Status', values='Count', fill_value=0),
+                     use_container_width=True)
+
+def duplicates_panel():
+    st.subheader("Near-Duplicate Entries")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        table = st.radio("Catalog", ["threats", "mitigations"], format_func=str.capitalize,
+                         horizontal=True, key="dedup_table")
+    with col2:
+        threshold = st.slider("Similarity threshold", 0.5, 1.0, 0.8, 0.05, key="dedup_threshold")
+    if st.button("🔍 Find Duplicates"):
+        st.session_state.duplicate_clusters = (table, find_duplicate_clusters(table, threshold))
+    
+    scan = st.session_state.get('duplicate_clusters')
+    if not scan or scan[0] != table:
+        st.info("Scan the catalog to list clusters of near-identical entries.")
+        return
+    clusters = scan[1]
+    if not clusters:
+        st.success("No near-duplicates found.")
+        return
+    st.write(f"{len(clusters)} clusters, {sum(len(cluster) - 1 for cluster in clusters)} redundant entries")
+    
+    merge = merge_threats if table == 'threats' else merge_mitigations
+    for cluster in clusters[:50]:
+        ids = [entry[0] for entry in cluster]
+        with st.expander(f"{cluster[0][1]} ({len(cluster)} entries)"):
+            st.dataframe(pd.DataFrame(cluster, columns=['ID', 'Name', 'Similarity']),
+                         use_container_width=True, hide_index=True)
+            keep = st.selectbox("Keep", ids, key=f"dedup_keep_{ids[0]}")
+            if st.button("🔗 Merge into kept entry", key=f"dedup_merge_{ids[0]}"):
+                try:
+                    merge(keep, [entry_id for entry_id in ids if entry_id != keep])
+                    clusters.remove(cluster)
+                    st.success(f"Merged {len(ids) - 1} entries into {keep}")
+                    st.rerun()
+                except ValueError as e:
+                    st.error(str(e))
+
+def catalog_history_panel():
+    st.subheader("Catalog History")
+    
+    events = get_change_events(CATALOG_STREAM, limit=50)
+    if not events:
+        st.info("No catalog changes recorded yet.")
+        return
+    
+    history_df = pd.DataFrame([
+        {
+            'Event': seq,
+            'Change': f"{kind} #{payload['undoes']}" if kind == 'undo' else kind,
+            'Rows': ", ".join(sorted({str(row_id) for _, row_id, _, _ in payload['changes']})),
+            'Time': created
+        }
+        for seq, kind, payload, created in events
+    ])
+    st.dataframe(history_df, use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        undo_seq = st.selectbox("Change to undo", [e[0] for e in events], key="catalog_undo_seq")
+        if st.button("↩️ Undo Change"):
+            try:
+                undo_catalog_change(undo_seq)
+                st.success(f"Undid change #{undo_seq}")
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
+    with col2:
+        as_of_seq = st.number_input("View catalog as of event", min_value=0, value=events[0][0], step=1)
+        if st.button("View"):
+            catalog = get_catalog_as_of(int(as_of_seq))
+            st.write(f"{len(catalog['threats'])} threats, {len(catalog['mitigations'])} mitigations, "
+                     f"{len(catalog['subdomains'])} subdomains")
+            st.dataframe(pd.DataFrame(list(catalog['threats'].values())), use_container_width=True, hide_index=True)
+
+def performance_panel():
+    st.subheader("Performance")
+    
+    snapshot = instrumentation.REGISTRY.snapshot()
+    last_rerun = instrumentation.REGISTRY.last_rerun()
+    rerun_latency = snapshot['rerun_latency_seconds']
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Reruns", rerun_latency['count'])
+    with col2:
+        mean_ms = rerun_latency['sum'] / rerun_latency['count'] * 1000 if rerun_latency['count'] else 0
+        st.metric("Mean Rerun", f"{mean_ms:.1f} ms", delta=f"p95 ≤ {rerun_latency['p95']*1000:.0f} ms", delta_color="off")
+    with col3:
+        queries = snapshot['rerun_queries']
+        st.metric("Queries / Rerun", f"{queries['sum'] / queries['count']:.1f}" if queries['count'] else "0")
+    with col4:
+        st.metric("Last Rerun Queries", last_rerun['queries'] if last_rerun else 0)
+    
+    timing_rows = [
+        {
+            'Function': name,
+            'Calls': hist['count'],
+            'Total (ms)': round(hist['sum'] * 1000, 2),
+            'Mean (ms)': round(hist['sum'] / hist['count'] * 1000, 3) if hist['count'] else 0,
+            'p95 (ms)': hist['p95'] * 1000,
+            'Max (ms)': round(hist['max'] * 1000, 2)
+        }
+        for name, hist in snapshot['timings'].items()
+    ]
+    if timing_rows:
+        timing_df = pd.DataFrame(timing_rows).sort_values('Total (ms)', ascending=False)
+        st.dataframe(timing_df, use_container_width=True, hide_index=True)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("📥 Prometheus", instrumentation.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+    with col2:
+        st.download_button("📥 JSON", instrumentation.to_json(), file_name="metrics.json", mime="application/json")
+    with col3:
+        if st.button("🗑️ Reset Metrics"):
+            instrumentation.REGISTRY.reset()
+            st.rerun()
 
+# Checkbox lists are paginated: every rendered checkbox costs time on each rerun
+THREATS_PER_PAGE = 50
+MITIGATION_THREATS_PER_PAGE = 20
+
+def paginate(items: List, page_size: int, key: str) -> List:
+    # Page picker for lists longer than one page; returns the current page
+    pages = max(1, -(-len(items) // page_size))
+    if pages == 1:
+        return items
+    if st.session_state.get(key, 1) > pages:
+        st.session_state[key] = pages
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=key)
+    return items[(page - 1) * page_size:page * page_size]
+
+@timed()
 def user_interface():
     st.header("🎯 Threat Modeling Interface")
     
     # Load iteration selector
     iterations = get_all_iterations()
     if iterations:
-        col1, col2 = st.columns([2, 1])
+        col1, col2, col3 = st.columns([2, 1, 1])
         
         with col1:
             selected_iteration = st.selectbox(
@@ -710,20 +2009,56 @@ def user_interface():
         
         with col2:
             if st.button("Load Selected Iteration") and selected_iteration != "New Iteration":
-                data = load_iteration(selected_iteration)
-                if data:
-                    st.session_state.domains = data.get('domains', STATIC_DOMAINS.copy())
-                    st.session_state.interactions = data.get('interactions', STATIC_INTERACTIONS.copy())
-                    st.session_state.selected_threats = data.get('selected_threats', {})
-                    st.session_state.selected_mitigations = data.get('selected_mitigations', {})
+                loaded = load_iteration_for_edit(selected_iteration)
+                if loaded:
+                    data, st.session_state.iteration_version = loaded
+                    load_session_state(
+                        BASE_ARCHITECTURE.with_data(
+                            data.get('domains', STATIC_DOMAINS), data.get('interactions', STATIC_INTERACTIONS)
+                        ),
+                        SelectionState.from_saved(
+                            data.get('selected_threats', {}), data.get('selected_mitigations', {})
+                        )
+                    )
                     st.session_state.current_iteration = selected_iteration
                     st.success(f"Loaded iteration: {selected_iteration}")
                     st.rerun()
+        
+        with col3:
+            if st.button("Reset to Default"):
+                load_session_state(BASE_ARCHITECTURE, SelectionState())
+                st.session_state.current_iteration = None
+                st.rerun()
     
     # Display current iteration info
     if st.session_state.current_iteration:
         st.info(f"Current Iteration: **{st.session_state.current_iteration}**")
     
+    history = st.session_state.history
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("↩️ Undo", disabled=not history.can_undo()):
+            undo_session_change()
+            st.rerun()
+    with col2:
+        if st.button("↪️ Redo", disabled=not history.can_redo()):
+            redo_session_change()
+            st.rerun()
+    with col3:
+        with st.expander("🕘 Session History"):
+            events = get_change_events(history.stream, limit=20)
+            if events:
+                st.dataframe(pd.DataFrame(
+                    [(seq, kind, created) for seq, kind, payload, created in events],
+                    columns=['Event', 'Change', 'Time']
+                ), use_container_width=True, hide_index=True)
+                restore_seq = st.selectbox("Restore state as of event", [e[0] for e in events])
+                if st.button("Restore"):
+                    load_session_state(*get_session_state_as_of(history.stream, restore_seq))
+                    st.rerun()
+            else:
+                st.caption("No changes in this session yet.")
+    
     # Main interface tabs
     tab1, tab2, tab3 = st.tabs(["Architecture View", "Threat Selection", "Analysis"])
     
@@ -741,21 +2076,23 @@ def user_interface():
         
         with col1:
             st.write("**Current Interactions**")
-            if st.session_state.interactions:
-                for i, interaction in enumerate(st.session_state.interactions):
+            architecture = st.session_state.architecture
+            if architecture.interactions:
+                for i, interaction in enumerate(architecture.interactions):
                     col_a, col_b = st.columns([3, 1])
                     with col_a:
                         st.write(f"{interaction['from']} → {interaction['to']} ({interaction['relationship']})")
                     with col_b:
                         if st.button("Delete", key=f"del_int_{i}"):
-                            st.session_state.interactions.pop(i)
+                            apply_session_change('remove_interaction', {'index': i, 'interaction': thaw(interaction)})
                             st.rerun()
         
         with col2:
             st.write("**Add New Interaction**")
             with st.form("add_interaction"):
-                from_domain = st.selectbox("From Domain", list(st.session_state.domains.keys()))
-                to_domain = st.selectbox("To Domain", list(st.session_state.domains.keys()))
+                domain_names = list(st.session_state.architecture.domains.keys())
+                from_domain = st.selectbox("From Domain", domain_names)
+                to_domain = st.selectbox("To Domain", domain_names)
                 relationship = st.text_input("Relationship (e.g., uses, creates, hosts)")
                 
                 if st.form_submit_button("Add Interaction"):
@@ -765,39 +2102,105 @@ def user_interface():
                             "to": to_domain,
                             "relationship": relationship
                         }
-                        st.session_state.interactions.append(new_interaction)
+                        apply_session_change('add_interaction', {
+                            'index': len(st.session_state.architecture.interactions),
+                            'interaction': new_interaction
+                        })
                         st.rerun()
+        
+        architecture_import_panel()
     
     with tab2:
         st.subheader("Select Threats and Mitigations")
         
-        threats = get_all_threats()
+        catalog = st.session_state.catalog
+        threats = catalog.threat_rows()
         if not threats:
             st.warning("No threats available. Please create threats in the Admin Panel first.")
             return
         
+        selection = st.session_state.selection
+        threats_by_id = catalog.threats
+        mitigations_by_id = {}
+        
+        with st.expander("💡 Suggested Threats", expanded=True):
+            architecture = st.session_state.architecture
+            component_options = [(d, c) for d, info in architecture.domains.items() for c in info['components']]
+            col_a, col_b = st.columns(2)
+            with col_a:
+                focus_components = st.multiselect(
+                    "Focus on components", component_options, format_func=lambda k: f"{k[0]} / {k[1]}",
+                    key="suggest_components"
+                )
+            with col_b:
+                focus_roots = st.multiselect(
+                    "Focus on subdomains", sorted(catalog.subdomains),
+                    format_func=lambda k: f"{catalog.subdomains[k][1]} / {catalog.subdomains[k][2]}",
+                    key="suggest_subdomains"
+                )
+            focus_subdomains = [sub for root in focus_roots for sub in catalog.subdomain_subtree(root)]
+            suggestions = suggest_threats(architecture, selection, focus_components, focus_subdomains)
+            suggestions = [item for item in suggestions if item[0] in threats_by_id]
+            if suggestions:
+                st.dataframe(pd.DataFrame([
+                    {
+                        'ID': threat_id,
+                        'Threat': threats_by_id[threat_id][1],
+                        'Severity': threats_by_id[threat_id][3],
+                        'Score': score,
+                        'Why': ", ".join(reasons)
+                    }
+                    for threat_id, score, reasons in suggestions
+                ]), use_container_width=True, hide_index=True)
+                to_add = st.multiselect("Add suggested threats", [item[0] for item in suggestions], key="suggest_add")
+                if st.button("➕ Add to Selection") and to_add:
+                    for threat_id in to_add:
+                        apply_session_change('select_threat', {'threat_id': threat_id})
+                        st.session_state.pop(f"threat_{threat_id}", None)
+                    del st.session_state["suggest_add"]
+                    st.rerun()
+            else:
+                st.caption("No unselected threats match this architecture.")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            severity_filter = st.multiselect("Filter by Severity", ["Low", "Medium", "High", "Critical"],
+                                             key="filter_severity")
+        with col2:
+            domain_filter = st.multiselect("Filter by Domain", sorted({t[4] for t in threats}), key="filter_domain")
+        with col3:
+            search_term = st.text_input("🔍 Search threats", placeholder="ID or name...", key="filter_search").lower()
+        
+        # Empty filters match everything
+        filtered_threats = [
+            t for t in threats
+            if (not severity_filter or t[3] in severity_filter)
+            and (not domain_filter or t[4] in domain_filter)
+            and (not search_term or search_term in t[0].lower() or search_term in t[1].lower())
+        ]
+        
         col1, col2 = st.columns(2)
         
         with col1:
-            st.write("**Available Threats**")
-            for threat in threats:
+            st.write(f"**Available Threats ({len(filtered_threats)})**")
+            for threat in paginate(filtered_threats, THREATS_PER_PAGE, "page_threats"):
                 threat_id, name, desc, severity, domain, created = threat
                 
                 is_selected = st.checkbox(
                     f"**{threat_id}**: {name}",
                     key=f"threat_{threat_id}",
-                    value=threat_id in st.session_state.selected_threats
+                    value=selection.has_threat(threat_id)
                 )
                 
-                if is_selected and threat_id not in st.session_state.selected_threats:
-                    st.session_state.selected_threats[threat_id] = threat
-                elif not is_selected and threat_id in st.session_state.selected_threats:
-                    del st.session_state.selected_threats[threat_id]
-                    # Also remove associated mitigations
-                    st.session_state.selected_mitigations = {
-                        k: v for k, v in st.session_state.selected_mitigations.items()
-                        if v[1] != threat_id
-                    }
+                if is_selected and not selection.has_threat(threat_id):
+                    apply_session_change('select_threat', {'threat_id': threat_id})
+                elif not is_selected and selection.has_threat(threat_id):
+                    # Also removes the threat's selected mitigations; they are
+                    # recorded so an undo brings them back
+                    apply_session_change('deselect_threat', {
+                        'threat_id': threat_id,
+                        'mitigations': {mit_id: threat_id for mit_id in selection.mitigations_for(threat_id)}
+                    })
                 
                 if is_selected:
                     st.write(f"   📊 **Severity**: {severity} | 🏢 **Domain**: {domain}")
@@ -805,16 +2208,24 @@ def user_interface():
                         st.write(f"   📝 {desc}")
         
         with col2:
-            st.write(f"**🛡️ Select Mitigations for Selected Threats ({len(st.session_state.selected_threats)})**")
+            st.write(f"**🛡️ Select Mitigations for Selected Threats ({len(selection.threats)})**")
             
-            if not st.session_state.selected_threats:
+            if not selection.threats:
                 st.info("👈 Select threats from the left panel to see available mitigations.")
             else:
-                for threat_id in st.session_state.selected_threats:
-                    threat_info = st.session_state.selected_threats[threat_id]
+                for threat_id in paginate(list(selection.threats), MITIGATION_THREATS_PER_PAGE, "page_mitigations"):
+                    threat_info = threats_by_id.get(threat_id)
+                    if threat_info is None:
+                        # Deleted from the catalog since it was selected
+                        apply_session_change('deselect_threat', {
+                            'threat_id': threat_id,
+                            'mitigations': {mit_id: threat_id for mit_id in selection.mitigations_for(threat_id)}
+                        })
+                        continue
                     st.markdown(f"### 🎯 Mitigations for **{threat_id}**: {threat_info[1]}")
                     
-                    mitigations = get_mitigations_for_threat(threat_id)
+                    mitigations = catalog.mitigations_for(threat_id, get_mitigations_for_threat)
+                    mitigations_by_id.update((m[0], m) for m in mitigations)
                     
                     if mitigations:
                         for mitigation in mitigations:
@@ -833,13 +2244,15 @@ def user_interface():
                             is_selected = st.checkbox(
                                 f"{status_info['icon']} **{mit_id}**: {name} ({status})",
                                 key=f"mit_{mit_id}",
-                                value=mit_id in st.session_state.selected_mitigations
+                                value=selection.has_mitigation(mit_id)
                             )
                             
-                            if is_selected:
-                                st.session_state.selected_mitigations[mit_id] = mitigation
-                            elif mit_id in st.session_state.selected_mitigations:
-                                del st.session_state.selected_mitigations[mit_id]
+                            if is_selected and selection.mitigations.get(mit_id) != t_id:
+                                apply_session_change('select_mitigation', {'mit_id': mit_id, 'threat_id': t_id})
+                            elif not is_selected and selection.has_mitigation(mit_id):
+                                apply_session_change('deselect_mitigation', {
+                                    'mit_id': mit_id, 'threat_id': selection.mitigations[mit_id]
+                                })
                             
                             if is_selected and desc:
                                 st.markdown(f"""
@@ -855,14 +2268,20 @@ def user_interface():
     with tab3:
         st.subheader("📊 Analysis Dashboard")
         
-        if st.session_state.selected_threats:
+        # Selected mitigations of threats on other pages of tab 2
+        missing = [mit_id for mit_id in selection.mitigations if mit_id not in mitigations_by_id]
+        if missing:
+            mitigations_by_id.update((m[0], m) for m in get_mitigations_by_ids(missing))
+        selected_threats, selected_mitigations = get_selected_rows(selection, threats_by_id, mitigations_by_id)
+        
+        if selected_threats:
             # Summary metrics
             col1, col2, col3, col4 = st.columns(4)
             
-            total_threats = len(st.session_state.selected_threats)
-            total_mitigations = len(st.session_state.selected_mitigations)
-            critical_threats = len([t for t in st.session_state.selected_threats.values() if t[3] == "Critical"])
-            implemented_mitigations = len([m for m in st.session_state.selected_mitigations.values() if m[4] == "Implemented"])
+            total_threats = len(selected_threats)
+            total_mitigations = len(selected_mitigations)
+            critical_threats = len([t for t in selected_threats.values() if t[3] == "Critical"])
+            implemented_mitigations = len([m for m in selected_mitigations.values() if m[4] == "Implemented"])
             
             with col1:
                 st.metric("🎯 Total Threats", total_threats)
@@ -877,99 +2296,35 @@ def user_interface():
             # Threat overview table
             st.write("### 🎯 Selected Threats Overview")
             
-            threat_data = []
-            for threat_id, threat in st.session_state.selected_threats.items():
-                mitigations_count = len([m for m in st.session_state.selected_mitigations.values() if m[1] == threat_id])
-                implemented_count = len([m for m in st.session_state.selected_mitigations.values() 
-                                       if m[1] == threat_id and m[4] == "Implemented"])
-                
-                threat_data.append({
-                    'Threat ID': threat_id,
-                    'Name': threat[1],
-                    'Severity': threat[3],
-                    'Domain': threat[4],
-                    'Total Mitigations': mitigations_count,
-                    'Implemented': implemented_count,
-                    'Coverage %': f"{(implemented_count/mitigations_count*100):.1f}%" if mitigations_count > 0 else "0%"
-                })
-            
-            threat_df = pd.DataFrame(threat_data)
+            threat_df = threat_overview(selected_threats, selected_mitigations)
             st.dataframe(threat_df, use_container_width=True, hide_index=True)
             
             # Charts
             col1, col2 = st.columns(2)
             
             with col1:
-                if len(threat_data) > 0:
-                    severity_count = threat_df['Severity'].value_counts()
-                    fig_severity = px.pie(
-                        values=severity_count.values,
-                        names=severity_count.index,
-                        title="🎯 Threats by Severity",
-                        color_discrete_map={
-                            'Critical': '#dc3545',
-                            'High': '#fd7e14',
-                            'Medium': '#ffc107',
-                            'Low': '#28a745'
-                        }
-                    )
-                    fig_severity.update_traces(textposition='inside', textinfo='percent+label')
-                    st.plotly_chart(fig_severity, use_container_width=True)
+                if len(threat_df) > 0:
+                    st.plotly_chart(severity_chart(threat_df), use_container_width=True)
             
             with col2:
-                if len(threat_data) > 0:
-                    domain_count = threat_df['Domain'].value_counts()
-                    fig_domain = px.bar(
-                        x=domain_count.index,
-                        y=domain_count.values,
-                        title="🏢 Threats by Domain",
-                        color=domain_count.values,
-                        color_continuous_scale="Blues"
-                    )
-                    fig_domain.update_layout(showlegend=False, xaxis_tickangle=-45)
-                    st.plotly_chart(fig_domain, use_container_width=True)
+                if len(threat_df) > 0:
+                    st.plotly_chart(threat_domain_chart(threat_df), use_container_width=True)
             
             # Mitigation analysis
-            if st.session_state.selected_mitigations:
+            if selected_mitigations:
                 st.write("### 🛡️ Mitigation Analysis")
                 
-                mit_data = []
-                for mit_id, mitigation in st.session_state.selected_mitigations.items():
-                    mit_data.append({
-                        'Mitigation ID': mit_id,
-                        'Threat ID': mitigation[1],
-                        'Name': mitigation[2],
-                        'Status': mitigation[4],
-                        'Domain': mitigation[5]
-                    })
-                
-                mit_df = pd.DataFrame(mit_data)
+                mit_df = mitigation_table(selected_mitigations)
                 
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     # Mitigation status chart
-                    status_count = mit_df['Status'].value_counts()
-                    fig_status = px.bar(
-                        x=status_count.index,
-                        y=status_count.values,
-                        title="📈 Mitigations by Status",
-                        color=status_count.values,
-                        color_continuous_scale="RdYlGn"
-                    )
-                    fig_status.update_layout(showlegend=False)
-                    st.plotly_chart(fig_status, use_container_width=True)
+                    st.plotly_chart(mitigation_status_chart(mit_df), use_container_width=True)
                 
                 with col2:
                     # Domain distribution of mitigations
-                    domain_mit_count = mit_df['Domain'].value_counts()
-                    fig_domain_mit = px.pie(
-                        values=domain_mit_count.values,
-                        names=domain_mit_count.index,
-                        title="🏢 Mitigations by Domain"
-                    )
-                    fig_domain_mit.update_traces(textposition='inside', textinfo='percent+label')
-                    st.plotly_chart(fig_domain_mit, use_container_width=True)
+                    st.plotly_chart(mitigation_domain_chart(mit_df), use_container_width=True)
                 
                 # Detailed mitigation table
                 st.write("#### 📋 Detailed Mitigation Status")
@@ -977,25 +2332,81 @@ def user_interface():
                 
                 # Risk coverage matrix
                 st.write("#### 🎯 Risk Coverage Matrix")
-                coverage_data = []
-                for threat_id in st.session_state.selected_threats:
-                    threat_mitigations = [m for m in mit_df.to_dict('records') if m['Threat ID'] == threat_id]
-                    total = len(threat_mitigations)
-                    implemented = len([m for m in threat_mitigations if m['Status'] == 'Implemented'])
-                    in_progress = len([m for m in threat_mitigations if m['Status'] == 'In Progress'])
-                    planned = len([m for m in threat_mitigations if m['Status'] == 'Planned'])
-                    
-                    coverage_data.append({
-                        'Threat ID': threat_id,
-                        'Total Mitigations': total,
-                        'Implemented': implemented,
-                        'In Progress': in_progress,
-                        'Planned': planned,
-                        'Coverage Score': f"{(implemented/total*100):.0f}%" if total > 0 else "0%"
-                    })
-                
-                coverage_df = pd.DataFrame(coverage_data)
+                coverage_df = coverage_matrix(selected_threats, selected_mitigations)
                 st.dataframe(coverage_df, use_container_width=True, hide_index=True)
+            
+            # Budgeted mitigation recommendations
+            st.write("### 💡 Recommended Mitigations")
+            # Greedy only: exact search can run for many seconds and is left to
+            # offline runs (recommend_mitigations(..., mode="exact"))
+            col1, col2 = st.columns(2)
+            with col1:
+                budget = st.number_input("Budget (cost)", min_value=0.0, value=100.0, step=10.0, key="opt_budget")
+            with col2:
+                max_effort = st.number_input("Max effort (0 = unlimited)", min_value=0.0, value=0.0, step=1.0, key="opt_effort")
+            
+            # Kept across reruns while the selection and budgets are unchanged
+            opt_inputs = (frozenset(selected_threats), budget, max_effort)
+            if st.button("💡 Recommend Mitigations"):
+                candidates = get_mitigation_costs(list(selected_threats))
+                st.session_state.recommendation = (opt_inputs, recommend_mitigations(
+                    selected_threats,
+                    candidates,
+                    budget,
+                    max_effort=max_effort or None
+                ))
+            
+            saved = st.session_state.get('recommendation')
+            if saved is not None and saved[0] == opt_inputs:
+                recommendation = saved[1]
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("🎯 Weighted Coverage", f"{recommendation['coverage']*100:.1f}%",
+                              delta=f"{(recommendation['coverage'] - recommendation['baseline_coverage'])*100:.1f}%")
+                with col2:
+                    st.metric("💰 Cost", f"{recommendation['cost']:.1f}")
+                with col3:
+                    st.metric("⏱️ Effort", f"{recommendation['effort']:.1f}")
+                if not recommendation['optimal']:
+                    st.caption("Greedy pick: close to the best coverage for the budget, but not proven optimal.")
+                
+                if recommendation['mitigations']:
+                    rec_df = pd.DataFrame(
+                        get_mitigations_by_ids(recommendation['mitigations']),
+                        columns=['ID', 'Threat_ID', 'Name', 'Description', 'Status', 'Domain', 'Created']
+                    )
+                    st.dataframe(rec_df[['ID', 'Threat_ID', 'Name', 'Status', 'Domain']], use_container_width=True, hide_index=True)
+                else:
+                    st.info("No further mitigations fit within the budget.")
+            
+            # Shareable report, rendered by the background worker pool
+            st.write("### 📄 Report")
+            if st.button("📄 Generate HTML Report"):
+                report_data = {
+                    **st.session_state.architecture.to_data(),
+                    'selected_threats': selected_threats,
+                    'selected_mitigations': selected_mitigations
+                }
+                report_name = st.session_state.current_iteration or "Current State"
+                report_dir = report_dir_for(current_db_path())
+                st.session_state.report_job = get_report_service().submit(report_name, report_data, report_dir)
+            
+            report_job = st.session_state.get('report_job')
+            if report_job is not None:
+                if not report_job.done():
+                    st.info("⏳ Rendering report in the background...")
+                    if st.button("🔄 Refresh Status"):
+                        st.rerun()
+                elif report_job.exception() is not None:
+                    st.error(f"Error generating report: {report_job.exception()}")
+                else:
+                    with open(report_job.result(), 'rb') as f:
+                        st.download_button(
+                            "📥 Download Report",
+                            f.read(),
+                            file_name=f"threat_model_report_{st.session_state.current_iteration or 'current'}.html",
+                            mime="text/html"
+                        )
         else:
             st.info("👈 Select threats and mitigations to see detailed analysis.")
             
@@ -1004,31 +2415,25 @@ def user_interface():
             
             col1, col2, col3 = st.columns(3)
             
-            all_threats = get_all_threats()
-            all_mitigations = get_all_mitigations()
+            # Counts from the session's catalog cache and one GROUP BY; the
+            # columnar mirror is only built when the trends below are opened
+            catalog = st.session_state.catalog
             all_iterations = get_all_iterations()
             
             with col1:
-                st.metric("📁 Total Threats in System", len(all_threats))
-                if all_threats:
-                    severity_dist = {}
-                    for threat in all_threats:
-                        severity = threat[3]
-                        severity_dist[severity] = severity_dist.get(severity, 0) + 1
-                    
-                    for severity, count in severity_dist.items():
-                        st.write(f"  • {severity}: {count}")
+                st.metric("📁 Total Threats in System", len(catalog.threats))
+                severity_dist = {}
+                for threat in catalog.threats.values():
+                    severity = threat[3]
+                    severity_dist[severity] = severity_dist.get(severity, 0) + 1
+                
+                for severity, count in severity_dist.items():
+                    st.write(f"  • {severity}: {count}")
             
             with col2:
-                st.metric("🛡️ Total Mitigations in System", len(all_mitigations))
-                if all_mitigations:
-                    status_dist = {}
-                    for mitigation in all_mitigations:
-                        status = mitigation[4]
-                        status_dist[status] = status_dist.get(status, 0) + 1
-                    
-                    for status, count in status_dist.items():
-                        st.write(f"  • {status}: {count}")
+                st.metric("🛡️ Total Mitigations in System", catalog.mitigation_count)
+                for status, count in get_mitigation_status_counts():
+                    st.write(f"  • {status}: {count}")
             
             with col3:
                 st.metric("📋 Saved Iterations", len(all_iterations))
@@ -1036,7 +2441,81 @@ def user_interface():
                     st.write("Recent iterations:")
                     for iteration in all_iterations[:5]:  # Show last 5
                         st.write(f"  • {iteration[0]}")
+        
+        # Aggregates over every saved iteration, from the columnar mirror (built on first use)
+        if st.toggle("📈 Show trends across saved iterations", key="show_iteration_trends"):
+            iteration_trends_panel(get_analytics())
+
+
+def architecture_import_panel():
+    with st.expander("📥 Import Architecture"):
+        uploaded = st.file_uploader(
+            "Graphviz DOT, draw.io or JSON graph file", type=['dot', 'gv', 'drawio', 'xml', 'json'], key="import_file"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            mode = st.radio("Mode", ["Merge", "Replace"], key="import_mode", horizontal=True,
+                            help="Merge adds to the current domains and interactions; Replace starts from the file alone")
+        with col2:
+            target = st.radio("Load into", ["Current session", "New iteration"], key="import_target", horizontal=True)
+        iteration_name = iteration_desc = None
+        if target == "New iteration":
+            iteration_name = st.text_input("Iteration Name", key="import_iteration_name")
+            iteration_desc = st.text_area("Description", key="import_iteration_desc")
+        create_subdomains = st.checkbox("Create subdomains for nested containers", key="import_subdomains")
+        
+        if st.button("Import", disabled=uploaded is None or (target == "New iteration" and not iteration_name)):
+            try:
+                graph = read_graph(uploaded, uploaded.name)
+                architecture = st.session_state.architecture
+                result = map_graph(graph, thaw(architecture.domains), thaw(architecture.interactions),
+                                   replace=mode == "Replace")
+                created = import_architecture(result, iteration_name, iteration_desc or "", create_subdomains)
+            except ValueError as e:
+                st.error(f"Error importing architecture: {e}")
+            else:
+                if target == "Current session":
+                    load_session_state(BASE_ARCHITECTURE.with_data(result.domains, result.interactions),
+                                       st.session_state.selection)
+                st.session_state.import_summary = (uploaded.name, target, result, created)
+                st.rerun()
+        
+        summary = st.session_state.get('import_summary')
+        if summary:
+            filename, target, result, created = summary
+            st.success(f"Imported {filename} into {target.lower()}")
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Nodes", len(result.nodes))
+            col2.metric("New Domains", len(result.new_domains))
+            col3.metric("Interactions Added", result.added_interactions)
+            col4.metric("Subdomains Created", created)
+            if result.internal_edges:
+                st.caption(f"{result.internal_edges} edges stay inside one domain and are not interactions.")
+            st.dataframe(pd.DataFrame(
+                [(label, domain, component or "", " / ".join(path)) for label, domain, component, path in result.nodes],
+                columns=['Node', 'Domain', 'Component', 'Subdomain Path']
+            ), use_container_width=True, hide_index=True)
 
+def iteration_trends_panel(analytics):
+    severity_by_iteration = analytics.iteration_crosstab('iteration_threats', ['severity'])
+    if severity_by_iteration.empty:
+        st.info("No saved iterations with selected threats yet.")
+        return
+    st.plotly_chart(iteration_severity_chart(severity_by_iteration), use_container_width=True)
+    
+    names = list(dict.fromkeys(severity_by_iteration['name']))
+    iteration_name = st.selectbox("Iteration", names[::-1], key="trend_iteration")
+    cells = analytics.iteration_crosstab('iteration_threats', ['severity', 'domain'])
+    cells = cells[cells['name'] == iteration_name]
+    st.plotly_chart(severity_domain_heatmap(cells, f"🔥 Severity × Domain in {iteration_name}"),
+                    use_container_width=True)
+    
+    st.write("#### 🛡️ Mitigation Status per Iteration")
+    status_by_iteration = analytics.iteration_crosstab('iteration_mitigations', ['status'])
+    if not status_by_iteration.empty:
+        status_table = status_by_iteration.pivot_table(index=['created_date', 'name'], columns='status', values='count',
+                                                       aggfunc='sum', fill_value=0, observed=True)
+        st.dataframe(status_table.reset_index(level='created_date', drop=True), use_container_width=True)
 
 def main():
     st.set_page_config(
@@ -1045,44 +2524,57 @@ def main():
         layout="wide"
     )
     
-    # Initialize database and session state
-    init_db()
-    initialize_session_state()
-    
-    st.title("🛡️ Threat Modeling Architecture System")
-    st.markdown("---")
+    # Optional Prometheus/JSON scrape endpoint for production monitoring; set
+    # THREAT_MODEL_METRICS_HOST (e.g. 0.0.0.0) to expose it beyond localhost
+    metrics_port = os.environ.get('THREAT_MODEL_METRICS_PORT')
+    if metrics_port:
+        instrumentation.start_metrics_server(int(metrics_port),
+                                             os.environ.get('THREAT_MODEL_METRICS_HOST', '127.0.0.1'))
     
-    # Sidebar for navigation
-    with st.sidebar:
-        st.header("Navigation")
-        mode = st.radio(
-            "Select Mode:",
-            ["👥 User Interface", "🔧 Admin Panel"],
-            index=0
-        )
+    with rerun_scope():
+        # Initialize database and session state
+        db_path = select_workspace()
+        init_db(db_path)
+        if MAINTENANCE_INTERVAL:
+            get_maintenance_job(db_path, RETENTION_POLICY, MAINTENANCE_INTERVAL)
+        initialize_session_state()
+        sync_catalog()
         
+        st.title("🛡️ Threat Modeling Architecture System")
         st.markdown("---")
-        st.header("Quick Stats")
         
-        # Display quick statistics
-        threats = get_all_threats()
-        mitigations = get_all_mitigations()
-        iterations = get_all_iterations()
+        # Sidebar for navigation
+        with st.sidebar:
+            st.header("Navigation")
+            mode = st.radio(
+                "Select Mode:",
+                ["👥 User Interface", "🔧 Admin Panel"],
+                index=0
+            )
+            workspace_sidebar()
         
-        st.metric("Total Threats", len(threats))
-        st.metric("Total Mitigations", len(mitigations))
-        st.metric("Saved Iterations", len(iterations))
+            st.markdown("---")
+            st.header("Quick Stats")
         
-        if st.session_state.selected_threats:
-            st.metric("Selected Threats", len(st.session_state.selected_threats))
-        if st.session_state.selected_mitigations:
-            st.metric("Selected Mitigations", len(st.session_state.selected_mitigations))
-    
-    # Main content based on mode
-    if mode == "🔧 Admin Panel":
-        admin_panel()
-    else:
-        user_interface()
+            # Display quick statistics
+            catalog = st.session_state.catalog
+            iterations = get_all_iterations()
+        
+            st.metric("Total Threats", len(catalog.threats))
+            st.metric("Total Mitigations", catalog.mitigation_count)
+            st.metric("Saved Iterations", len(iterations))
+        
+            if st.session_state.selection.threats:
+                st.metric("Selected Threats", len(st.session_state.selection.threats))
+            if st.session_state.selection.mitigations:
+                st.metric("Selected Mitigations", len(st.session_state.selection.mitigations))
+        
+        # Main content based on mode
+        if mode == "🔧 Admin Panel":
+            admin_panel()
+        else:
+            change_watcher()
+            user_interface()
 
 if __name__ == "__main__":
     main()
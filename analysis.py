@@ -0,0 +1,214 @@
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.express as px
+
+from instrumentation import timed
+
+# Analysis computations and figures shared by the Analysis tab and the report
+# renderer. Nothing here touches st.session_state, so it also runs headless.
+
+SEVERITY_COLOR_MAP = {
+    'Critical': '#dc3545',
+    'High': '#fd7e14',
+    'Medium': '#ffc107',
+    'Low': '#28a745'
+}
+
+
+@timed()
+def build_architecture_figure(domains: Dict, interactions: List[Dict]):
+    fig = go.Figure()
+
+    # Add domains
+    for domain_name, domain_info in domains.items():
+        fig.add_trace(go.Scatter(
+            x=[domain_info["position"]["x"]],
+            y=[domain_info["position"]["y"]],
+            mode='markers+text',
+            marker=dict(
+                size=100,
+                color=domain_info["color"],
+                line=dict(color='black', width=2)
+            ),
+            text=domain_name,
+            textposition='middle center',
+            name=domain_name,
+            showlegend=False
+        ))
+
+    # Add interactions
+    for interaction in interactions:
+        from_domain = domains.get(interaction["from"])
+        to_domain = domains.get(interaction["to"])
+
+        if from_domain and to_domain:
+            fig.add_trace(go.Scatter(
+                x=[from_domain["position"]["x"], to_domain["position"]["x"]],
+                y=[from_domain["position"]["y"], to_domain["position"]["y"]],
+                mode='lines+text',
+                line=dict(color='gray', width=2),
+                text=['', f'<<{interaction["relationship"]}>>'],
+                textposition='middle center',
+                showlegend=False,
+                name=f'{interaction["from"]} -> {interaction["to"]}'
+            ))
+
+    fig.update_layout(
+        title="Threat Model Architecture Diagram",
+        showlegend=False,
+        height=600,
+        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+        plot_bgcolor='white'
+    )
+
+    return fig
+
+
+def _status_counts_by_threat(selected_mitigations: Dict):
+    # One pass over the mitigations instead of one scan per threat
+    counts = defaultdict(Counter)
+    for mitigation in selected_mitigations.values():
+        counts[mitigation[1]][mitigation[4]] += 1
+    return counts
+
+
+@timed()
+def threat_overview(selected_threats: Dict, selected_mitigations: Dict):
+    counts = _status_counts_by_threat(selected_mitigations)
+    threat_data = []
+    for threat_id, threat in selected_threats.items():
+        statuses = counts.get(threat_id, Counter())
+        mitigations_count = sum(statuses.values())
+        implemented_count = statuses['Implemented']
+
+        threat_data.append({
+            'Threat ID': threat_id,
+            'Name': threat[1],
+            'Severity': threat[3],
+            'Domain': threat[4],
+            'Total Mitigations': mitigations_count,
+            'Implemented': implemented_count,
+            'Coverage %': f"{(implemented_count/mitigations_count*100):.1f}%" if mitigations_count > 0 else "0%"
+        })
+
+    return pd.DataFrame(threat_data)
+
+
+@timed()
+def mitigation_table(selected_mitigations: Dict):
+    mit_data = []
+    for mit_id, mitigation in selected_mitigations.items():
+        mit_data.append({
+            'Mitigation ID': mit_id,
+            'Threat ID': mitigation[1],
+            'Name': mitigation[2],
+            'Status': mitigation[4],
+            'Domain': mitigation[5]
+        })
+
+    return pd.DataFrame(mit_data)
+
+
+@timed()
+def coverage_matrix(selected_threats: Dict, selected_mitigations: Dict):
+    counts = _status_counts_by_threat(selected_mitigations)
+    coverage_data = []
+    for threat_id in selected_threats:
+        statuses = counts.get(threat_id, Counter())
+        total = sum(statuses.values())
+        implemented = statuses['Implemented']
+
+        coverage_data.append({
+            'Threat ID': threat_id,
+            'Total Mitigations': total,
+            'Implemented': implemented,
+            'In Progress': statuses['In Progress'],
+            'Planned': statuses['Planned'],
+            'Coverage Score': f"{(implemented/total*100):.0f}%" if total > 0 else "0%"
+        })
+
+    return pd.DataFrame(coverage_data)
+
+
+@timed()
+def severity_chart(threat_df: pd.DataFrame):
+    severity_count = threat_df['Severity'].value_counts()
+    fig_severity = px.pie(
+        values=severity_count.values,
+        names=severity_count.index,
+        title="🎯 Threats by Severity",
+        color_discrete_map=SEVERITY_COLOR_MAP
+    )
+    fig_severity.update_traces(textposition='inside', textinfo='percent+label')
+    return fig_severity
+
+
+@timed()
+def threat_domain_chart(threat_df: pd.DataFrame):
+    domain_count = threat_df['Domain'].value_counts()
+    fig_domain = px.bar(
+        x=domain_count.index,
+        y=domain_count.values,
+        title="🏢 Threats by Domain",
+        color=domain_count.values,
+        color_continuous_scale="Blues"
+    )
+    fig_domain.update_layout(showlegend=False, xaxis_tickangle=-45)
+    return fig_domain
+
+
+@timed()
+def mitigation_status_chart(mit_df: pd.DataFrame):
+    status_count = mit_df['Status'].value_counts()
+    fig_status = px.bar(
+        x=status_count.index,
+        y=status_count.values,
+        title="📈 Mitigations by Status",
+        color=status_count.values,
+        color_continuous_scale="RdYlGn"
+    )
+    fig_status.update_layout(showlegend=False)
+    return fig_status
+
+
+@timed()
+def mitigation_domain_chart(mit_df: pd.DataFrame):
+    domain_mit_count = mit_df['Domain'].value_counts()
+    fig_domain_mit = px.pie(
+        values=domain_mit_count.values,
+        names=domain_mit_count.index,
+        title="🏢 Mitigations by Domain"
+    )
+    fig_domain_mit.update_traces(textposition='inside', textinfo='percent+label')
+    return fig_domain_mit
+
+
+@timed()
+def iteration_severity_chart(trend_df: pd.DataFrame):
+    # trend_df: one row per (iteration, severity) with its threat count
+    fig_trend = px.bar(
+        trend_df,
+        x='name',
+        y='count',
+        color='severity',
+        title="📈 Threats by Severity per Iteration",
+        color_discrete_map=SEVERITY_COLOR_MAP,
+        category_orders={'severity': list(SEVERITY_COLOR_MAP), 'name': list(dict.fromkeys(trend_df['name']))}
+    )
+    fig_trend.update_layout(xaxis_title="Iteration", yaxis_title="Threats", xaxis_tickangle=-45)
+    return fig_trend
+
+
+@timed()
+def severity_domain_heatmap(counts_df: pd.DataFrame, title: str):
+    # counts_df: one row per (severity, domain) with its threat count
+    matrix = counts_df.pivot_table(index='severity', columns='domain', values='count',
+                                   aggfunc='sum', fill_value=0, observed=True)
+    matrix = matrix.reindex([s for s in SEVERITY_COLOR_MAP if s in matrix.index])
+    fig_heatmap = px.imshow(matrix, text_auto=True, aspect='auto', color_continuous_scale="Reds", title=title)
+    fig_heatmap.update_layout(xaxis_title="Domain", yaxis_title="Severity")
+    return fig_heatmap
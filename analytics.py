@@ -0,0 +1,314 @@
+import importlib.util
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from changelog import CATALOG_STREAM
+
+try:
+    import duckdb  # optional, runs the aggregations when installed
+except ImportError:
+    duckdb = None
+
+# Optional, enables Parquet snapshots; only imported (by pandas) when used
+PARQUET = importlib.util.find_spec('pyarrow') is not None
+
+# Columnar mirror of the catalog and of saved iterations for analytics.
+#
+# SQLite stays the source of truth. The mirror keeps one pandas frame per
+# table, with categorical columns for every dimension, so a crosstab is a
+# bincount over integer codes instead of a Python loop over rows. Saved
+# iterations are normalised into one fact row per selected threat or
+# mitigation. The mirror catches up incrementally: catalog rows from the
+# change log after `seq`, iterations by diffing the set of iteration IDs
+# (for deletes) plus the rows whose version is above the highest one
+# already mirrored (saves and in-place rewrites). Frames are replaced,
+# never modified, so readers and snapshot writers can hold on to them
+# without the lock.
+
+SNAPSHOT_INTERVAL = 300  # seconds between Parquet snapshots
+
+COLUMNS = {
+    'threats': ('id', 'severity', 'domain', 'subdomain_id'),
+    'mitigations': ('id', 'threat_id', 'status', 'domain', 'cost', 'effort'),
+    'iterations': ('id', 'name', 'created_date'),
+    'iteration_threats': ('iteration_id', 'threat_id', 'severity', 'domain'),
+    'iteration_mitigations': ('iteration_id', 'mitigation_id', 'threat_id', 'status', 'domain'),
+}
+CATEGORIES = {
+    'threats': ('severity', 'domain'),
+    'mitigations': ('status', 'domain'),
+    'iterations': (),
+    'iteration_threats': ('iteration_id', 'severity', 'domain'),
+    'iteration_mitigations': ('iteration_id', 'status', 'domain'),
+}
+
+
+def _frame(table: str, rows: List) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=list(COLUMNS[table]))
+    for column in CATEGORIES[table]:
+        frame[column] = frame[column].astype('category')
+    return frame
+
+
+def _append(frame: pd.DataFrame, table: str, rows) -> pd.DataFrame:
+    # rows: a list of row tuples or a dict of column lists. Concatenates
+    # without losing the categorical dtypes by growing each column's
+    # categories instead of re-encoding the existing codes.
+    new = pd.DataFrame(rows, columns=list(COLUMNS[table]))
+    if new.empty:
+        return frame
+    for column in CATEGORIES[table]:
+        categories = frame[column].cat.categories
+        missing = pd.Index(new[column].dropna().unique()).difference(categories)
+        if len(missing):
+            frame = frame.assign(**{column: frame[column].cat.add_categories(missing)})
+            categories = frame[column].cat.categories
+        new[column] = pd.Categorical(new[column], categories=categories)
+    return pd.concat([frame, new], ignore_index=True)
+
+
+class AnalyticsStore:
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        self.snapshot_dir = snapshot_dir
+        self.seq = 0
+        # created_date of change-log event `seq`; ties a snapshot to its database
+        self.stamp = None
+        # Highest iterations.version mirrored so far
+        self.iteration_version = 0
+        self.loaded = False
+        self.frames: Dict[str, pd.DataFrame] = {table: _frame(table, []) for table in COLUMNS}
+        self._lock = threading.Lock()
+        # The first build is the expensive one, so snapshot it right away
+        self._snapshot_at = float('-inf')
+        self._snapshot_thread = None
+
+    @property
+    def engine(self) -> str:
+        return 'duckdb' if duckdb is not None else 'numpy'
+
+    def refresh(self, conn) -> bool:
+        # Catches up with the database; returns whether anything changed
+        with self._lock:
+            if self.loaded or self._load_snapshot(conn):
+                changed = self._catch_up(conn)
+            else:
+                self._load_all(conn)
+                changed = True
+        if changed:
+            self._maybe_snapshot()
+        return changed
+
+    def _set_seq(self, conn, seq: int):
+        self.seq = seq
+        row = conn.execute('SELECT created_date FROM change_log WHERE seq = ?', (seq,)).fetchone()
+        self.stamp = row[0] if row else None
+
+    def _catch_up(self, conn) -> bool:
+        rows = conn.execute('SELECT seq, payload FROM change_log WHERE stream = ? AND seq > ? ORDER BY seq',
+                            (CATALOG_STREAM, self.seq)).fetchall()
+        latest = {}
+        for _, payload in rows:
+            for table, row_id, _, after in json.loads(payload)['changes']:
+                latest[(table, row_id)] = after
+        if rows:
+            self._set_seq(conn, rows[-1][0])
+        for table in ('threats', 'mitigations'):
+            touched = [row_id for (name, row_id) in latest if name == table]
+            if touched:
+                frame = self.frames[table]
+                frame = frame[~frame['id'].isin(touched)]
+                upserts = [[after.get(c) for c in COLUMNS[table]]
+                           for (name, _), after in latest.items() if name == table and after is not None]
+                self.frames[table] = _append(frame, table, upserts)
+
+        live = {row[0] for row in conn.execute('SELECT id FROM iterations')}
+        known = set(self.frames['iterations']['id'].tolist())
+        rewritten = dict(conn.execute('SELECT id, version FROM iterations WHERE version > ?',
+                                      (self.iteration_version,)).fetchall())
+        if rewritten:
+            self.iteration_version = max(rewritten.values())
+        stale = (known - live) | (set(rewritten) & known)
+        fresh = (live - known) | (set(rewritten) & live)
+        if stale:
+            self._drop_iterations(stale)
+        if fresh:
+            self._load_iterations(conn, sorted(fresh))
+        return bool(rows or stale or fresh)
+
+    def _load_all(self, conn):
+        # One read transaction, so the rows and the change-log position agree
+        conn.execute('BEGIN')
+        self._set_seq(conn, conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0])
+        self.frames['threats'] = _frame('threats', conn.execute(
+            'SELECT id, severity, domain, subdomain_id FROM threats').fetchall())
+        self.frames['mitigations'] = _frame('mitigations', conn.execute(
+            'SELECT id, threat_id, status, domain, cost, effort FROM mitigations').fetchall())
+        for table in ('iterations', 'iteration_threats', 'iteration_mitigations'):
+            self.frames[table] = _frame(table, [])
+        versions = dict(conn.execute('SELECT id, version FROM iterations').fetchall())
+        self.iteration_version = max(versions.values(), default=0)
+        self._load_iterations(conn, list(versions))
+        conn.commit()
+        self.loaded = True
+
+    def _drop_iterations(self, iteration_ids):
+        ids = list(iteration_ids)
+        for table, column in (('iterations', 'id'), ('iteration_threats', 'iteration_id'),
+                              ('iteration_mitigations', 'iteration_id')):
+            frame = self.frames[table]
+            self.frames[table] = frame[~frame[column].isin(ids)]
+
+    def _load_iterations(self, conn, iteration_ids: List[int]):
+        catalog = None
+        iterations = []
+        # Built column by column; far cheaper than a tuple per fact row
+        threat_facts = {column: [] for column in COLUMNS['iteration_threats']}
+        mitigation_facts = {column: [] for column in COLUMNS['iteration_mitigations']}
+        for i in range(0, len(iteration_ids), 500):
+            chunk = iteration_ids[i:i + 500]
+            for iteration_id, name, created, data in conn.execute(f'''
+                SELECT id, name, created_date, data FROM iterations WHERE id IN ({",".join("?" * len(chunk))})
+            ''', chunk):
+                iterations.append((iteration_id, name, created))
+                data = json.loads(data)
+                selected = data.get('selected_threats', {})
+                if not isinstance(selected, dict) or not all(selected.values()):
+                    # Older iterations saved bare IDs; use the catalog's values
+                    if catalog is None:
+                        catalog = {row[0]: row for row in self.frames['threats'].itertuples(index=False)}
+                    selected = {
+                        threat_id: row or [threat_id, None, None, *catalog.get(threat_id, (None,) * 3)[1:3]]
+                        for threat_id, row in (selected.items() if isinstance(selected, dict)
+                                               else ((threat_id, None) for threat_id in selected))
+                    }
+                rows = list(selected.values())
+                threat_facts['iteration_id'].extend([iteration_id] * len(rows))
+                threat_facts['threat_id'].extend(selected)
+                threat_facts['severity'].extend([row[3] for row in rows])
+                threat_facts['domain'].extend([row[4] for row in rows])
+                selected = data.get('selected_mitigations', {})
+                rows = list(selected.values())
+                mitigation_facts['iteration_id'].extend([iteration_id] * len(rows))
+                mitigation_facts['mitigation_id'].extend(selected)
+                mitigation_facts['threat_id'].extend([row[1] for row in rows])
+                mitigation_facts['status'].extend([row[4] for row in rows])
+                mitigation_facts['domain'].extend([row[5] for row in rows])
+        self.frames['iterations'] = _append(self.frames['iterations'], 'iterations', iterations)
+        self.frames['iteration_threats'] = _append(self.frames['iteration_threats'], 'iteration_threats',
+                                                   threat_facts)
+        self.frames['iteration_mitigations'] = _append(self.frames['iteration_mitigations'],
+                                                       'iteration_mitigations', mitigation_facts)
+
+    def crosstab(self, table: str, dims: Sequence[str]) -> pd.DataFrame:
+        # Row counts per combination of the categorical dims that occurs,
+        # as a long frame with one column per dim plus 'count'
+        frame = self.frames[table]
+        dims = list(dims)
+        if duckdb is not None:
+            con = duckdb.connect()
+            con.register('facts', frame)
+            columns = ", ".join(dims)
+            result = con.execute(f'''
+                SELECT {columns}, COUNT(*) AS count FROM facts
+                WHERE {" AND ".join(f"{d} IS NOT NULL" for d in dims)}
+                GROUP BY {columns} ORDER BY {columns}
+            ''').df()
+            con.close()
+            return result
+        columns = [frame[dim] if isinstance(frame[dim].dtype, pd.CategoricalDtype) else frame[dim].astype('category')
+                   for dim in dims]
+        codes = np.zeros(len(frame), dtype=np.int64)
+        valid = np.ones(len(frame), dtype=bool)
+        sizes = [len(column.cat.categories) for column in columns]
+        for column, size in zip(columns, sizes):
+            dim_codes = column.cat.codes.to_numpy()
+            valid &= dim_codes >= 0
+            codes = codes * size + dim_codes
+        codes = codes[valid]
+        if np.prod(sizes, dtype=np.float64) <= max(len(codes), 1) * 4:
+            counts = np.bincount(codes, minlength=int(np.prod(sizes)))
+            combos = np.flatnonzero(counts)
+            counts = counts[combos]
+        else:
+            # Sparse: far more possible combinations than rows
+            combos, counts = np.unique(codes, return_counts=True)
+        positions = np.unravel_index(combos, sizes)
+        result = pd.DataFrame({
+            dim: column.cat.categories[position] for dim, column, position in zip(dims, columns, positions)
+        })
+        result['count'] = counts
+        return result
+
+    def iteration_crosstab(self, table: str, dims: Sequence[str]) -> pd.DataFrame:
+        # crosstab by iteration, with the iteration's name and date attached
+        counts = self.crosstab(table, ['iteration_id', *dims])
+        iterations = self.frames['iterations'].rename(columns={'id': 'iteration_id'})
+        counts['iteration_id'] = counts['iteration_id'].astype('int64')
+        return iterations.merge(counts, on='iteration_id').sort_values(['created_date', 'iteration_id', *dims])
+
+    def save_snapshot(self, path: Optional[str] = None):
+        path = path or self.snapshot_dir
+        with self._lock:
+            frames = dict(self.frames)
+            meta = {'seq': self.seq, 'stamp': self.stamp, 'iteration_version': self.iteration_version}
+        os.makedirs(path, exist_ok=True)
+        for table, frame in frames.items():
+            frame.to_parquet(os.path.join(path, f'{table}.parquet.tmp'), index=False)
+            os.replace(os.path.join(path, f'{table}.parquet.tmp'), os.path.join(path, f'{table}.parquet'))
+        # Written last: a snapshot only counts once all of its tables are in place
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def _load_snapshot(self, conn) -> bool:
+        # Only a snapshot whose change-log position still exists in this
+        # database with the same timestamp is trusted; anything else rebuilds
+        meta_path = os.path.join(self.snapshot_dir, 'meta.json') if self.snapshot_dir else None
+        if not PARQUET or not meta_path or not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            row = conn.execute('SELECT created_date FROM change_log WHERE seq = ?', (meta['seq'],)).fetchone()
+            if row is None or row[0] != meta['stamp']:
+                return False
+            frames = {table: pd.read_parquet(os.path.join(self.snapshot_dir, f'{table}.parquet'))
+                      for table in COLUMNS}
+        except (OSError, ValueError, KeyError):
+            # Unreadable or half-written
+            return False
+        self.frames, self.seq, self.stamp, self.loaded = frames, meta['seq'], meta['stamp'], True
+        self.iteration_version = meta['iteration_version']
+        self._snapshot_at = time.monotonic()
+        return True
+
+    def _maybe_snapshot(self):
+        # Snapshots are written in the background; seq 0 has no stamp to check against
+        if not (PARQUET and self.snapshot_dir and self.stamp):
+            return
+        if time.monotonic() - self._snapshot_at < SNAPSHOT_INTERVAL:
+            return
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        self._snapshot_at = time.monotonic()
+        self._snapshot_thread = threading.Thread(target=self.save_snapshot, name='analytics-snapshot', daemon=True)
+        self._snapshot_thread.start()
+
+
+_stores: Dict[str, AnalyticsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_analytics_store(db_path: str) -> AnalyticsStore:
+    # One mirror per database per process; its first refresh warm-starts
+    # from the last Parquet snapshot when there is a valid one
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = AnalyticsStore(f'{db_path}.analytics')
+        return store
@@ -0,0 +1,241 @@
+import bisect
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List
+
+# Process-wide, immutable base architecture plus per-session overlays.
+#
+# Every session starts from the same frozen base. An ArchitectureModel is a
+# persistent value: edits return a new model holding only the overlay (edited
+# or removed domains, removed base interactions, added interactions) and share
+# everything else with the previous model and the base. Nothing reachable from
+# a model can be mutated in place, so one session's edits cannot leak into
+# another and resetting is just pointing back at the base model.
+#
+# Sharing is at the level of the base: an edit copies the model's overlay
+# (its domain edits, removed set or added tuple), which is O(edits made in
+# the session), never the base domains. Building the visible interaction
+# tuple, and mapping a removed interaction back to its base index, are O(n)
+# in the base interactions.
+#
+# Each added interaction carries a slot: the base index it sits in front of
+# (len(base) for the end). Added interactions are kept sorted by slot, so
+# the visible order interleaves base and added interactions exactly as they
+# were saved or inserted, whatever is removed from the base later.
+
+
+def freeze(value):
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    # Plain dicts/lists, e.g. for json.dumps
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+_REMOVED = object()
+
+
+class DomainsView(Mapping):
+    # Read-only merged view of base domains and a model's domain edits
+    __slots__ = ('_base', '_edits')
+
+    def __init__(self, base: Mapping, edits: Mapping):
+        self._base = base
+        self._edits = edits
+
+    def __getitem__(self, name):
+        value = self._edits.get(name, None)
+        if value is _REMOVED:
+            raise KeyError(name)
+        if value is not None:
+            return value
+        return self._base[name]
+
+    def __iter__(self):
+        for name in self._base:
+            if self._edits.get(name) is not _REMOVED:
+                yield name
+        for name, value in self._edits.items():
+            if name not in self._base and value is not _REMOVED:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class ArchitectureModel:
+    __slots__ = ('base_domains', 'base_interactions', '_domain_edits', '_removed', '_added', '_interactions')
+
+    def __init__(self, base_domains: Mapping, base_interactions: tuple,
+                 domain_edits: Mapping = MappingProxyType({}), removed: frozenset = frozenset(),
+                 added: tuple = ()):
+        # added: ((slot, interaction), ...), sorted by slot
+        self.base_domains = base_domains
+        self.base_interactions = base_interactions
+        self._domain_edits = domain_edits
+        self._removed = removed
+        self._added = added
+        self._interactions = None
+
+    @classmethod
+    def base(cls, domains: Dict, interactions: List[Dict]):
+        return cls(freeze(domains), freeze(interactions))
+
+    def _derive(self, domain_edits=None, removed=None, added=None):
+        return ArchitectureModel(
+            self.base_domains, self.base_interactions,
+            self._domain_edits if domain_edits is None else domain_edits,
+            self._removed if removed is None else removed,
+            self._added if added is None else added
+        )
+
+    @property
+    def domains(self) -> Mapping:
+        if not self._domain_edits:
+            return self.base_domains
+        return DomainsView(self.base_domains, self._domain_edits)
+
+    def _layout(self) -> List[tuple]:
+        # Visible interactions in order, as ('base', base index) or
+        # ('added', index into self._added)
+        layout, j = [], 0
+        for i in range(len(self.base_interactions)):
+            while j < len(self._added) and self._added[j][0] <= i:
+                layout.append(('added', j))
+                j += 1
+            if i not in self._removed:
+                layout.append(('base', i))
+        layout.extend(('added', k) for k in range(j, len(self._added)))
+        return layout
+
+    @property
+    def interactions(self) -> tuple:
+        # Visible interactions: surviving base ones with the added ones in their slots
+        if self._interactions is None:
+            if not self._added:
+                self._interactions = tuple(x for i, x in enumerate(self.base_interactions)
+                                           if i not in self._removed)
+            else:
+                self._interactions = tuple(
+                    self.base_interactions[i] if kind == 'base' else self._added[i][1]
+                    for kind, i in self._layout()
+                )
+        return self._interactions
+
+    @property
+    def is_pristine(self) -> bool:
+        return not (self._domain_edits or self._removed or self._added)
+
+    def with_domain(self, name: str, info: Dict):
+        edits = dict(self._domain_edits)
+        edits[name] = freeze(info)
+        return self._derive(domain_edits=MappingProxyType(edits))
+
+    def without_domain(self, name: str):
+        edits = dict(self._domain_edits)
+        if name in self.base_domains:
+            edits[name] = _REMOVED
+        else:
+            edits.pop(name, None)
+        return self._derive(domain_edits=MappingProxyType(edits))
+
+    def with_interaction(self, interaction: Dict):
+        return self._derive(added=self._added + ((len(self.base_interactions), freeze(interaction)),))
+
+    def without_interaction(self, index: int):
+        # index is a position in self.interactions
+        kind, i = self._layout()[index]
+        if kind == 'base':
+            return self._derive(removed=self._removed | {i})
+        return self._derive(added=self._added[:i] + self._added[i + 1:])
+
+    def with_interaction_at(self, index: int, interaction: Dict):
+        # Inverse of without_interaction: re-shows a removed base interaction
+        # when it belongs at index, otherwise inserts an added one there
+        frozen = freeze(interaction)
+        layout = self._layout()
+        for base_index in sorted(self._removed):
+            if self.base_interactions[base_index] != frozen:
+                continue
+            # Where it would show: after everything visible that precedes it
+            before = sum(1 for kind, i in layout
+                         if (i < base_index if kind == 'base' else self._added[i][0] <= base_index))
+            if before == index:
+                return self._derive(removed=self._removed - {base_index})
+        if index >= len(layout):
+            slot, added_index = len(self.base_interactions), len(self._added)
+        else:
+            kind, i = layout[index]
+            if kind == 'base':
+                # In front of base interaction i, behind the added ones already there
+                slot, added_index = i, sum(1 for s, _ in self._added if s <= i)
+            else:
+                slot, added_index = self._added[i][0], i
+        return self._derive(added=self._added[:added_index] + ((slot, frozen),) + self._added[added_index:])
+
+    def reset(self):
+        return self._derive(domain_edits=MappingProxyType({}), removed=frozenset(), added=())
+
+    def with_data(self, domains: Dict, interactions: Iterable[Dict]):
+        # Overlay that reproduces a saved (domains, interactions) pair while
+        # sharing whatever still matches the base
+        edits = {}
+        for name, info in domains.items():
+            frozen = freeze(info)
+            if self.base_domains.get(name) != frozen:
+                edits[name] = frozen
+        for name in self.base_domains:
+            if name not in domains:
+                edits[name] = _REMOVED
+
+        # A saved interaction shares a base one only when that comes after the
+        # last one shared, so the saved order survives; the rest are added in
+        # front of the next base interaction
+        unmatched = {}
+        for i, interaction in enumerate(self.base_interactions):
+            unmatched.setdefault(_interaction_key(interaction), []).append(i)
+        kept, added, last = set(), [], -1
+        for interaction in interactions:
+            indices = unmatched.get(_interaction_key(interaction))
+            if indices:
+                position = bisect.bisect_right(indices, last)
+                if position < len(indices):
+                    last = indices.pop(position)
+                    kept.add(last)
+                    continue
+            added.append((last + 1, freeze(interaction)))
+        removed = frozenset(range(len(self.base_interactions))) - kept
+        return ArchitectureModel(self.base_domains, self.base_interactions,
+                                 MappingProxyType(edits), removed, tuple(added))
+
+    def to_data(self) -> Dict[str, Any]:
+        return {'domains': thaw(self.domains), 'interactions': thaw(self.interactions)}
+
+
+def _interaction_key(interaction: Mapping):
+    return tuple(sorted((k, repr(v)) for k, v in interaction.items()))
+
+
+_bases: Dict[str, ArchitectureModel] = {}
+_bases_lock = threading.Lock()
+
+
+def get_base_architecture(name: str, domains: Dict, interactions: List[Dict]) -> ArchitectureModel:
+    # One frozen base per name per process. Streamlit re-executes the app
+    # script on every rerun, so a base built there would be rebuilt each time
+    # and never shared between sessions; this module is imported once.
+    with _bases_lock:
+        base = _bases.get(name)
+        if base is None:
+            base = _bases[name] = ArchitectureModel.base(domains, interactions)
+        return base
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+import Threatmodeling as tm
+import instrumentation
+from benchmarks.synthetic import populate_catalog, synthetic_iteration
+
+# UI-level latency regression harness. Drives Threatmodeling.py through
+# streamlit.testing AppTest on a seeded database, records wall time and SQL
+# statement counts per step, and fails when a step regresses past the stored
+# baseline.
+#
+#   python -m benchmarks.apptest_flows                    # check against baseline
+#   python -m benchmarks.apptest_flows --update-baseline  # record a new baseline
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Threatmodeling.py')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'apptest_baseline.json')
+
+SEED_ITERATION = "Seeded Iteration"
+
+
+def seed_database(db_path: str, num_threats: int, seed: int = 0):
+    tm.DB_PATH = db_path
+    tm.init_db()
+    conn = sqlite3.connect(db_path)
+    populate_catalog(conn, num_threats, num_threats * 2, list(tm.STATIC_DOMAINS), num_subdomains=num_threats // 10,
+                     seed=seed, components={name: info['components'] for name, info in tm.STATIC_DOMAINS.items()})
+    iteration = synthetic_iteration(conn, tm.STATIC_DOMAINS, tm.STATIC_INTERACTIONS, num_selected=20, seed=seed)
+    conn.close()
+    tm.save_iteration(SEED_ITERATION, "seeded by apptest_flows", iteration)
+    return iteration
+
+
+class FlowRecorder:
+    def __init__(self):
+        self.steps = {}
+
+    def step(self, name: str):
+        return _Step(self, name)
+
+
+class _Step:
+    def __init__(self, recorder: FlowRecorder, name: str):
+        self.recorder = recorder
+        self.name = name
+        self.reruns = 0
+
+    def __enter__(self):
+        # Queries issued inside reruns, so background threads cannot skew the count
+        self.queries = instrumentation.REGISTRY.counters.get('rerun_queries_total', 0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        queries = instrumentation.REGISTRY.counters.get('rerun_queries_total', 0) - self.queries
+        self.recorder.steps[self.name] = {'seconds': seconds, 'queries': int(queries), 'reruns': self.reruns}
+        print(f"  {self.name:<22} {seconds*1000:10.1f} ms {int(queries):7d} queries {self.reruns:5d} reruns",
+              file=sys.stderr)
+        return False
+
+    def run(self, at: AppTest):
+        at.run()
+        self.reruns += 1
+        if at.exception:
+            raise RuntimeError(f"{self.name}: app raised {at.exception[0].value}")
+        return at
+
+
+def run_flows(num_threats: int, toggles: int, interactions: int, seed: int = 0):
+    with tempfile.TemporaryDirectory(prefix='threatmodel-apptest-') as tmpdir:
+        db_path = os.path.join(tmpdir, 'apptest.db')
+        iteration = seed_database(db_path, num_threats, seed)
+        os.environ['THREAT_MODEL_DB'] = db_path
+
+        recorder = FlowRecorder()
+        at = AppTest.from_file(APP_PATH, default_timeout=120)
+
+        with recorder.step('initial_load') as step:
+            step.run(at)
+
+        with recorder.step('load_iteration') as step:
+            at.selectbox(key='iteration_selector').set_value(SEED_ITERATION)
+            step.run(at)
+            next(b for b in at.button if b.label == "Load Selected Iteration").click()
+            step.run(at)
+            assert at.session_state.current_iteration == SEED_ITERATION
+
+        threat_ids = [row[0] for row in tm.get_all_threats()]
+        to_toggle = [threat_id for threat_id in threat_ids if threat_id not in iteration['selected_threats']][:toggles]
+        with recorder.step('toggle_threats') as step:
+            for threat_id in to_toggle:
+                # The threat list is paginated; turn the page first when needed
+                page = threat_ids.index(threat_id) // tm.THREATS_PER_PAGE + 1
+                if at.session_state['page_threats'] != page:
+                    at.number_input(key='page_threats').set_value(page)
+                    step.run(at)
+                at.checkbox(key=f'threat_{threat_id}').check()
+                step.run(at)
+        assert len(at.session_state.selection.threats) == len(iteration['selected_threats']) + len(to_toggle)
+
+        domain_names = list(tm.STATIC_DOMAINS)
+        interactions_before = len(at.session_state.architecture.interactions)
+        with recorder.step('add_interactions') as step:
+            for i in range(interactions):
+                at.selectbox[[s.label for s in at.selectbox].index("From Domain")].set_value(domain_names[i % len(domain_names)])
+                at.selectbox[[s.label for s in at.selectbox].index("To Domain")].set_value(domain_names[(i + 1) % len(domain_names)])
+                at.text_input[[t.label for t in at.text_input].index("Relationship (e.g., uses, creates, hosts)")].input(f"flow-{i}")
+                next(b for b in at.button if b.label == "Add Interaction").click()
+                step.run(at)
+        assert len(at.session_state.architecture.interactions) == interactions_before + interactions
+
+        with recorder.step('analysis') as step:
+            step.run(at)
+            next(b for b in at.button if b.label == "💡 Recommend Mitigations").click()
+            step.run(at)
+
+        os.environ.pop('THREAT_MODEL_DB', None)
+        return recorder.steps
+
+
+def check_regressions(steps, baseline, time_tolerance: float, query_tolerance: float):
+    failures = []
+    for name, stats in steps.items():
+        base = baseline.get('steps', {}).get(name)
+        if base is None:
+            continue
+        if stats['seconds'] > base['seconds'] * (1 + time_tolerance):
+            failures.append(f"{name}: {stats['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        if stats['queries'] > base['queries'] * (1 + query_tolerance):
+            failures.append(f"{name}: {stats['queries']} queries vs baseline {base['queries']}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AppTest UI latency regression harness")
+    parser.add_argument('--threats', type=int, default=300, help="threats in the seeded catalog")
+    parser.add_argument('--toggles', type=int, default=200, help="threats ticked one rerun at a time")
+    parser.add_argument('--interactions', type=int, default=5, help="interactions added through the form")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--time-tolerance', type=float, default=0.5,
+                        help="allowed wall-time growth over baseline, as a fraction")
+    parser.add_argument('--query-tolerance', type=float, default=0.0,
+                        help="allowed query-count growth over baseline, as a fraction")
+    args = parser.parse_args(argv)
+
+    steps = run_flows(args.threats, args.toggles, args.interactions, args.seed)
+    params = {'threats': args.threats, 'toggles': args.toggles, 'interactions': args.interactions, 'seed': args.seed}
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'params': params, 'steps': steps}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline first", file=sys.stderr)
+        return 1
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('params') != params:
+        print(f"Baseline was recorded with {baseline.get('params')}, not {params}", file=sys.stderr)
+        return 1
+
+    failures = check_regressions(steps, baseline, args.time_tolerance, args.query_tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    if not failures:
+        print("No regressions against baseline")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import Threatmodeling as tm
+import analysis
+import instrumentation
+from coverage_optimizer import recommend_mitigations
+from importers import map_graph, read_graph
+from selection import SelectionState
+from architecture import ArchitectureModel
+from benchmarks.synthetic import (
+    synthetic_domains, synthetic_interactions, synthetic_dot, populate_catalog, populate_iterations,
+    synthetic_iteration
+)
+
+# Headless benchmarks for the data-access helpers, iteration persistence, the
+# architecture diagram and the analysis computations.
+#
+#   python -m benchmarks.run --sizes 100 1000 10000 --output results.json
+#   python -m benchmarks.run --sizes 1000 --compare results.json
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+
+def _measure(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_size(size: int, repeat: int, seed: int, workdir: str):
+    tm.DB_PATH = os.path.join(workdir, f'bench_{size}.db')
+    if os.path.exists(tm.DB_PATH):
+        os.remove(tm.DB_PATH)
+    tm.init_db()
+
+    num_domains = min(500, max(9, size // 100))
+    domains = synthetic_domains(num_domains, seed)
+    interactions = synthetic_interactions(domains, num_domains * 2, seed)
+
+    conn = sqlite3.connect(tm.DB_PATH)
+    start = time.perf_counter()
+    populate_catalog(conn, size, size, list(domains), num_subdomains=max(1, size // 10), seed=seed,
+                     components={name: info['components'] for name, info in domains.items()})
+    iteration = synthetic_iteration(conn, domains, interactions, num_selected=min(size, 5000), seed=seed)
+    populate_iterations(conn, min(size, 1000), json.dumps({'domains': {}, 'interactions': []}))
+    setup_seconds = time.perf_counter() - start
+    conn.close()
+
+    rng = random.Random(seed)
+    sample_ids = [f"T{rng.randrange(size):0{len(str(size))}d}" for _ in range(100)]
+    sample_domain = next(iter(domains))
+    num_subdomains = max(1, size // 10)
+    sample_subdomains = [f"S{rng.randrange(num_subdomains):0{len(str(size))}d}" for _ in range(100)]
+    selected_threats = iteration['selected_threats']
+    selected_mitigations = iteration['selected_mitigations']
+    threat_df = analysis.threat_overview(selected_threats, selected_mitigations)
+    mit_df = analysis.mitigation_table(selected_mitigations)
+
+    def get_mitigations_for_threat():
+        for threat_id in sample_ids:
+            tm.get_mitigations_for_threat(threat_id)
+
+    def selection_cascade():
+        # Rebuild the session selection, then deselect every threat
+        selection = SelectionState.from_saved(selected_threats, selected_mitigations)
+        for threat_id in list(selection.threats):
+            selection.deselect_threat(threat_id)
+
+    architecture = ArchitectureModel.base(domains, interactions)
+    focus = [(name, info['components'][0]) for name, info in list(domains.items())[:3]]
+
+    def suggest():
+        # First call builds the process-wide index; later calls only rank
+        tm.suggest_threats(architecture, SelectionState(), focus, sample_subdomains[:3])
+
+    dot = synthetic_dot(domains, min(size, 100000), seed).encode()
+
+    def import_dot():
+        map_graph(read_graph(io.BytesIO(dot), 'benchmark.dot'), domains, interactions)
+
+    bulk_ids = [f"T{i:0{len(str(size))}d}" for i in range(0, size, max(1, size // 1000))]
+    bulk_severities = itertools.cycle(["Low", "Critical"])
+
+    def bulk_update_severity():
+        # Alternates the value so every repeat changes (and logs) each row
+        tm.bulk_update('threats', bulk_ids, {'severity': next(bulk_severities)})
+
+    def recommend():
+        recommend_mitigations(selected_threats, tm.get_mitigation_costs(list(selected_threats)), budget=1000)
+
+    cases = {
+        'get_all_threats': tm.get_all_threats,
+        'get_all_mitigations': tm.get_all_mitigations,
+        'get_mitigations_for_threat_x100': get_mitigations_for_threat,
+        'get_subdomains': tm.get_subdomains,
+        'get_subdomains_one_domain': lambda: tm.get_subdomains(sample_domain),
+        'get_subdomain_ancestors_x100': lambda: [tm.get_subdomain_ancestors(s) for s in sample_subdomains],
+        'get_subdomain_descendants_x100': lambda: [tm.get_subdomain_descendants(s) for s in sample_subdomains],
+        'get_threats_in_subtree_x100': lambda: [tm.get_threats_in_subtree(s) for s in sample_subdomains],
+        'get_all_iterations': tm.get_all_iterations,
+        'get_retention_status': tm.get_retention_status,
+        'save_iteration': lambda: tm.save_iteration('Benchmark', 'benchmark iteration', iteration),
+        'load_iteration': lambda: tm.load_iteration('Benchmark'),
+        'render_architecture_diagram': lambda: analysis.build_architecture_figure(domains, interactions),
+        'threat_overview': lambda: analysis.threat_overview(selected_threats, selected_mitigations),
+        'mitigation_table': lambda: analysis.mitigation_table(selected_mitigations),
+        'coverage_matrix': lambda: analysis.coverage_matrix(selected_threats, selected_mitigations),
+        'severity_chart': lambda: analysis.severity_chart(threat_df),
+        'threat_domain_chart': lambda: analysis.threat_domain_chart(threat_df),
+        'mitigation_status_chart': lambda: analysis.mitigation_status_chart(mit_df),
+        'mitigation_domain_chart': lambda: analysis.mitigation_domain_chart(mit_df),
+        'recommend_mitigations_greedy': recommend,
+        'suggest_threats': suggest,
+        'load_suggestion_index': tm.load_suggestion_index,
+        'find_duplicate_threats': lambda: tm.find_duplicate_clusters('threats'),
+        'import_architecture_dot': import_dot,
+        'iteration_crosstab': lambda: tm.get_analytics().iteration_crosstab('iteration_threats', ['severity', 'domain']),
+        'selection_cascade': selection_cascade,
+        'bulk_update_severity_x1000': bulk_update_severity,
+    }
+
+    results = {}
+    for name, func in cases.items():
+        results[name] = _measure(func, repeat)
+        print(f"  {size:>8} {name:<34} median {results[name]['median']*1000:10.2f} ms", file=sys.stderr)
+    return {
+        'size': size,
+        'domains': num_domains,
+        'interactions': len(interactions),
+        'selected_threats': len(selected_threats),
+        'selected_mitigations': len(selected_mitigations),
+        'setup_seconds': setup_seconds,
+        'cases': results,
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base_by_size = {run['size']: run['cases'] for run in baseline['runs']}
+    print(f"{'size':>8} {'case':<34} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for run in current['runs']:
+        base_cases = base_by_size.get(run['size'], {})
+        for name, stats in run['cases'].items():
+            if name not in base_cases:
+                continue
+            old, new = base_cases[name]['median'], stats['median']
+            ratio = new / old if old else float('inf')
+            print(f"{run['size']:>8} {name:<34} {old*1000:12.2f} {new*1000:12.2f} {ratio:7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Threat model benchmark suite")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="catalog sizes (threats and mitigations each), e.g. 100 1000 1000000")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--compare', help="baseline JSON results to compare against")
+    parser.add_argument('--workdir', help="directory for the scratch databases (default: a temp dir)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='threatmodel-bench-') as tmpdir:
+        workdir = args.workdir or tmpdir
+        os.makedirs(workdir, exist_ok=True)
+        runs = [run_size(size, args.repeat, args.seed, workdir) for size in args.sizes]
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'instrumentation': instrumentation.ENABLED,
+        },
+        'runs': runs,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+# Deterministic synthetic catalogs and iterations. The same seed and sizes
+# always produce the same rows, so results from different runs compare.
+
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+STATUSES = ["Planned", "In Progress", "Implemented", "Verified"]
+WORDS = [
+    "credential", "phishing", "injection", "tampering", "spoofing", "escalation", "exfiltration",
+    "denial", "replay", "misconfiguration", "insider", "ransomware", "supply", "chain", "session",
+    "hijack", "token", "leak", "firmware", "physical", "access", "logging", "gap", "backup", "patch"
+]
+
+
+def _text(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def synthetic_domains(num_domains: int, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    domains = {}
+    for i in range(num_domains):
+        domains[f"Domain {i:04d}"] = {
+            "color": f"#{rng.randrange(0x1000000):06X}",
+            "position": {"x": rng.random(), "y": rng.random()},
+            "components": [f"Component {i}-{j}" for j in range(rng.randint(1, 5))]
+        }
+    return domains
+
+
+def synthetic_interactions(domains: Dict, num_interactions: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed + 1)
+    names = list(domains)
+    interactions = []
+    for _ in range(num_interactions):
+        a, b = rng.sample(names, 2)
+        interactions.append({"from": a, "to": b, "relationship": rng.choice(["uses", "hosts", "creates", "transfer"])})
+    return interactions
+
+
+def synthetic_dot(domains: Dict, num_edges: int, seed: int = 0) -> str:
+    # A DOT graph with one cluster per domain, its components as nodes and
+    # random component-to-component edges, for the importer benchmark
+    rng = random.Random(seed + 2)
+    lines = ['digraph G {']
+    nodes = []
+    for i, (name, info) in enumerate(domains.items()):
+        lines.append(f'  subgraph cluster_{i} {{ label="{name}";')
+        for j, component in enumerate(info['components']):
+            nodes.append(f'n{i}_{j}')
+            lines.append(f'    n{i}_{j} [label="{component}"];')
+        lines.append('  }')
+    for _ in range(num_edges):
+        a, b = rng.sample(nodes, 2)
+        lines.append(f'  {a} -> {b} [label="{rng.choice(["uses", "hosts", "creates", "transfer"])}"];')
+    lines.append('}')
+    return "\n".join(lines)
+
+
+def populate_catalog(conn: sqlite3.Connection, num_threats: int, num_mitigations: int,
+                     domain_names: List[str], num_subdomains: int = 0, seed: int = 0,
+                     components: Dict[str, List[str]] = None):
+    # Bulk-loads subdomains (with closure rows), threats and mitigations in one
+    # transaction. With components ({domain: [component, ...]}) each threat is
+    # also mapped to one or two components of its domain.
+    rng = random.Random(seed + 2)
+    now = datetime(2024, 1, 1).isoformat()
+    width = len(str(max(num_threats, num_mitigations, num_subdomains, 1)))
+    component_rows = []
+
+    # Subdomains form a forest: most nest under an earlier subdomain of the same domain
+    sub_ids = [f"S{i:0{width}d}" for i in range(num_subdomains)]
+    sub_domain, sub_parent, closure = {}, {}, []
+    for i, sub_id in enumerate(sub_ids):
+        parent = sub_ids[rng.randrange(i)] if i and rng.random() < 0.7 else None
+        sub_parent[sub_id] = parent
+        sub_domain[sub_id] = sub_domain[parent] if parent else rng.choice(domain_names)
+        node, depth = sub_id, 0
+        while node is not None:
+            closure.append((node, sub_id, depth))
+            node, depth = sub_parent[node], depth + 1
+
+    def threat_rows():
+        for i in range(num_threats):
+            subdomain = rng.choice(sub_ids) if sub_ids and rng.random() < 0.5 else None
+            domain = sub_domain[subdomain] if subdomain else rng.choice(domain_names)
+            if components and components.get(domain):
+                choices = components[domain]
+                for component in rng.sample(choices, min(len(choices), rng.randint(1, 2))):
+                    component_rows.append((f"T{i:0{width}d}", domain, component))
+            yield (f"T{i:0{width}d}", _text(rng, 4), _text(rng, 12), rng.choice(SEVERITIES), domain, now, subdomain)
+
+    def mitigation_rows():
+        for i in range(num_mitigations):
+            yield (f"M{i:0{width}d}", f"T{rng.randrange(num_threats):0{width}d}", _text(rng, 4), _text(rng, 10),
+                   rng.choice(STATUSES), rng.choice(domain_names), now,
+                   round(rng.uniform(1, 100), 2), round(rng.uniform(0.5, 20), 1))
+
+    def subdomain_rows():
+        for sub_id in sub_ids:
+            yield (sub_id, sub_domain[sub_id], _text(rng, 2), _text(rng, 6), now, sub_parent[sub_id])
+
+    with conn:
+        conn.executemany('INSERT INTO subdomains (id, parent_domain, name, description, created_date, parent_id) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', subdomain_rows())
+        conn.executemany('INSERT INTO subdomain_closure (ancestor, descendant, depth) VALUES (?, ?, ?)', closure)
+        conn.executemany('INSERT INTO threats (id, name, description, severity, domain, created_date, subdomain_id) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)', threat_rows())
+        conn.executemany('INSERT INTO threat_components (threat_id, domain, component) VALUES (?, ?, ?)',
+                         component_rows)
+        if num_threats:
+            conn.executemany('INSERT INTO mitigations (id, threat_id, name, description, status, domain, '
+                             'created_date, cost, effort) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', mitigation_rows())
+
+
+def populate_iterations(conn: sqlite3.Connection, num_iterations: int, payload_json: str):
+    start = datetime(2024, 1, 1)
+    with conn:
+        conn.executemany(
+            'INSERT INTO iterations (name, description, created_date, data) VALUES (?, ?, ?, ?)',
+            ((f"Iteration {i:05d}", "synthetic", (start + timedelta(hours=i)).isoformat(), payload_json)
+             for i in range(num_iterations))
+        )
+
+
+def synthetic_iteration(conn: sqlite3.Connection, domains: Dict, interactions: List[Dict],
+                        num_selected: int, seed: int = 0) -> Dict:
+    # Picks num_selected threats and all of their mitigations, stored the way
+    # the Threat Selection tab stores them (full rows keyed by ID)
+    rng = random.Random(seed + 3)
+    threat_rows = conn.execute(
+        'SELECT id, name, description, severity, domain, created_date FROM threats ORDER BY id'
+    ).fetchall()
+    chosen = rng.sample(threat_rows, min(num_selected, len(threat_rows)))
+    selected_threats = {row[0]: list(row) for row in chosen}
+    selected_mitigations = {}
+    ids = list(selected_threats)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = conn.execute(
+            f'SELECT id, threat_id, name, description, status, domain, created_date FROM mitigations '
+            f'WHERE threat_id IN ({",".join("?" * len(chunk))})', chunk
+        ).fetchall()
+        selected_mitigations.update({row[0]: list(row) for row in rows})
+    return {
+        'domains': domains,
+        'interactions': interactions,
+        'selected_threats': selected_threats,
+        'selected_mitigations': selected_mitigations
+    }
@@ -0,0 +1,199 @@
+import json
+import sqlite3
+import threading
+import weakref
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from changelog import CATALOG_STREAM
+
+# Live catalog change notifications. One ChangeFeed per database per process
+# runs a background thread that watches PRAGMA data_version (it changes
+# whenever another connection, in this process or any other, commits). When
+# it does, the new catalog events are read from change_log and pushed as
+# per-row events to every subscribed session, which patches its CatalogCache
+# in place instead of refetching whole tables.
+
+POLL_INTERVAL = 0.5
+
+THREAT_FIELDS = ('id', 'name', 'description', 'severity', 'domain', 'created_date')
+MITIGATION_FIELDS = ('id', 'threat_id', 'name', 'description', 'status', 'domain', 'created_date')
+SUBDOMAIN_FIELDS = ('id', 'parent_domain', 'name', 'parent_id')
+
+
+class ChangeEvent(NamedTuple):
+    seq: int
+    table: str
+    row_id: str
+    before: Optional[Dict]
+    after: Optional[Dict]  # None when the row was deleted
+
+
+class Subscription:
+    # A session's inbox; the feed thread pushes, the session's rerun drains
+    __slots__ = ('_events', '_lock', '__weakref__')
+
+    def __init__(self):
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def push(self, events: List[ChangeEvent]):
+        with self._lock:
+            self._events.extend(events)
+
+    def pending(self) -> bool:
+        return bool(self._events)
+
+    def drain(self) -> List[ChangeEvent]:
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+
+class ChangeFeed:
+    def __init__(self, db_path: str, interval: float = POLL_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        # Sessions just disappear when their browser tab closes, so hold them weakly
+        self._subscribers = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        self._last_seq = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def poll(self) -> int:
+        # Publishes catalog events committed since the last poll; returns how many
+        with self._lock:
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return 0
+            self._data_version = data_version
+            rows = self._conn.execute('''
+                SELECT seq, payload FROM change_log WHERE stream = ? AND seq > ? ORDER BY seq
+            ''', (CATALOG_STREAM, self._last_seq)).fetchall()
+            if not rows:
+                return 0
+            self._last_seq = rows[-1][0]
+            events = [
+                ChangeEvent(seq, table, row_id, before, after)
+                for seq, payload in rows
+                for table, row_id, before, after in json.loads(payload)['changes']
+            ]
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(events)
+        return len(events)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except sqlite3.Error:
+                # e.g. the database is briefly locked; try again next tick
+                continue
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._conn.close()
+
+
+_feeds: Dict[str, ChangeFeed] = {}
+_feeds_lock = threading.Lock()
+
+
+def get_change_feed(db_path: str) -> ChangeFeed:
+    with _feeds_lock:
+        feed = _feeds.get(db_path)
+        if feed is None:
+            feed = _feeds[db_path] = ChangeFeed(db_path)
+        return feed
+
+
+def notify(db_path: str):
+    # Called after a local write so this process's sessions see it on their
+    # very next rerun instead of after the next poll tick
+    feed = _feeds.get(db_path)
+    if feed is not None:
+        feed.poll()
+
+
+class CatalogCache:
+    # Per-session copy of the threat catalog plus the mitigations of the
+    # threats the session has looked at, kept current by change events.
+    # Events at or before `seq` are already part of the loaded snapshot.
+    __slots__ = ('seq', 'threats', 'mitigation_count', 'subdomains', '_mitigations', '_mit_threat', '_sorted')
+
+    def __init__(self, seq: int, threat_rows: List[tuple], mitigation_count: int, subdomain_rows: List[tuple] = ()):
+        self.seq = seq
+        self.threats: Dict[str, tuple] = {row[0]: row for row in threat_rows}
+        self.mitigation_count = mitigation_count
+        # id -> (id, parent_domain, name, parent_id)
+        self.subdomains: Dict[str, tuple] = {row[0]: row for row in subdomain_rows}
+        # threat id -> {mitigation id: row}, filled lazily per threat
+        self._mitigations: Dict[str, Dict[str, tuple]] = {}
+        self._mit_threat: Dict[str, str] = {}
+        self._sorted = None
+
+    def threat_rows(self) -> List[tuple]:
+        if self._sorted is None:
+            self._sorted = [self.threats[k] for k in sorted(self.threats)]
+        return self._sorted
+
+    def mitigations_for(self, threat_id: str, loader: Callable[[str], List[tuple]]) -> List[tuple]:
+        rows = self._mitigations.get(threat_id)
+        if rows is None:
+            rows = self._mitigations[threat_id] = {row[0]: row for row in loader(threat_id)}
+            self._mit_threat.update((mit_id, threat_id) for mit_id in rows)
+        return [rows[k] for k in sorted(rows)]
+
+    def subdomain_subtree(self, subdomain_id: str) -> List[str]:
+        children: Dict[str, List[str]] = {}
+        for row in self.subdomains.values():
+            if row[3]:
+                children.setdefault(row[3], []).append(row[0])
+        subtree, stack = [], [subdomain_id]
+        while stack:
+            node = stack.pop()
+            subtree.append(node)
+            stack.extend(children.get(node, ()))
+        return subtree
+
+    def apply(self, event: ChangeEvent) -> bool:
+        # Returns False for events the snapshot already reflects
+        if event.seq <= self.seq:
+            return False
+        if event.table == 'threats':
+            self._sorted = None
+            if event.after is None:
+                self.threats.pop(event.row_id, None)
+                for mit_id in self._mitigations.pop(event.row_id, {}):
+                    self._mit_threat.pop(mit_id, None)
+            else:
+                self.threats[event.row_id] = tuple(event.after[f] for f in THREAT_FIELDS)
+        elif event.table == 'mitigations':
+            self.mitigation_count += (event.after is not None) - (event.before is not None)
+            old_threat = self._mit_threat.pop(event.row_id, None)
+            if old_threat is not None:
+                self._mitigations[old_threat].pop(event.row_id, None)
+            if event.after is not None:
+                rows = self._mitigations.get(event.after['threat_id'])
+                if rows is not None:
+                    rows[event.row_id] = tuple(event.after[f] for f in MITIGATION_FIELDS)
+                    self._mit_threat[event.row_id] = event.after['threat_id']
+        elif event.table == 'subdomains':
+            if event.after is None:
+                self.subdomains.pop(event.row_id, None)
+            else:
+                self.subdomains[event.row_id] = tuple(event.after[f] for f in SUBDOMAIN_FIELDS)
+        return True
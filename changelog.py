@@ -0,0 +1,310 @@
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from architecture import ArchitectureModel, thaw
+from selection import SelectionState
+
+# Append-only change log. Every mutation is stored as one compact event in a
+# stream: one stream per user session for architecture/selection edits, and
+# the shared 'catalog' stream for admin CRUD. Session streams are
+# checkpointed every CHECKPOINT_EVERY events, so any past state is the
+# nearest checkpoint plus a short replay. Undo never deletes history; it
+# appends the inverse event.
+#
+# Session streams only back a session's undo/restore, so they are bounded:
+# a new checkpoint drops the events and checkpoints before the oldest of the
+# last SESSION_CHECKPOINTS_KEPT, and the maintenance job drops streams idle
+# for SESSION_IDLE_DAYS (sessions have no end event). Loading an iteration
+# logs only what the load changed, not the states before and after it.
+
+CATALOG_STREAM = 'catalog'
+SESSION_PREFIX = 'session:'
+CHECKPOINT_EVERY = 50
+SESSION_CHECKPOINTS_KEPT = 2
+SESSION_IDLE_DAYS = 7
+
+
+def init_changelog(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            stream TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            created_date TEXT
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_change_log_stream ON change_log (stream, seq)')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_checkpoints (
+            stream TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (stream, seq)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'), default=list)
+
+
+def record(c, stream: str, kind: str, payload: Dict) -> int:
+    c.execute('INSERT INTO change_log (stream, kind, payload, created_date) VALUES (?, ?, ?, ?)',
+              (stream, kind, _dumps(payload), datetime.now().isoformat()))
+    return c.lastrowid
+
+
+def write_checkpoint(c, stream: str, seq: int, state: Dict):
+    c.execute('INSERT OR REPLACE INTO change_checkpoints (stream, seq, state) VALUES (?, ?, ?)',
+              (stream, seq, _dumps(state)))
+
+
+def prune_session_stream(c, stream: str, keep: int = SESSION_CHECKPOINTS_KEPT) -> int:
+    # Drops what precedes the oldest of the last `keep` checkpoints; every
+    # state from there on is still a checkpoint plus a replay. Returns the
+    # number of events dropped.
+    row = c.execute('SELECT seq FROM change_checkpoints WHERE stream = ? ORDER BY seq DESC LIMIT 1 OFFSET ?',
+                    (stream, keep - 1)).fetchone()
+    if row is None:
+        return 0
+    c.execute('DELETE FROM change_checkpoints WHERE stream = ? AND seq < ?', (stream, row[0]))
+    return c.execute('DELETE FROM change_log WHERE stream = ? AND seq < ?', (stream, row[0])).rowcount
+
+
+def drop_idle_sessions(c, before: str) -> int:
+    # Drops session streams whose last event is older than `before` (an ISO
+    # timestamp); returns how many streams went
+    streams = [row[0] for row in c.execute(f'''
+        SELECT stream FROM change_log WHERE stream GLOB '{SESSION_PREFIX}*'
+        GROUP BY stream HAVING MAX(created_date) < ?
+    ''', (before,))]
+    for start in range(0, len(streams), 500):
+        chunk = streams[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        c.execute(f'DELETE FROM change_log WHERE stream IN ({placeholders})', chunk)
+        c.execute(f'DELETE FROM change_checkpoints WHERE stream IN ({placeholders})', chunk)
+    return len(streams)
+
+
+def get_events(c, stream: str, after_seq: int = 0, until_seq: Optional[int] = None, limit: Optional[int] = None):
+    # (seq, kind, payload, created_date), oldest first
+    c.execute('''
+        SELECT seq, kind, payload, created_date FROM change_log
+        WHERE stream = ? AND seq > ? AND (? IS NULL OR seq <= ?)
+        ORDER BY seq LIMIT ?
+    ''', (stream, after_seq, until_seq, until_seq, -1 if limit is None else limit))
+    return [(seq, kind, json.loads(payload), created) for seq, kind, payload, created in c.fetchall()]
+
+
+def get_recent_events(c, stream: str, limit: int = 50):
+    # (seq, kind, payload, created_date), newest first
+    c.execute('''
+        SELECT seq, kind, payload, created_date FROM change_log
+        WHERE stream = ? ORDER BY seq DESC LIMIT ?
+    ''', (stream, limit))
+    return [(seq, kind, json.loads(payload), created) for seq, kind, payload, created in c.fetchall()]
+
+
+def get_event(c, seq: int):
+    row = c.execute('SELECT seq, stream, kind, payload, created_date FROM change_log WHERE seq = ?', (seq,)).fetchone()
+    if row is None:
+        return None
+    return row[0], row[1], row[2], json.loads(row[3]), row[4]
+
+
+# Session streams
+
+def session_snapshot(architecture: ArchitectureModel, selection: SelectionState) -> Dict:
+    return {
+        **architecture.to_data(),
+        'threats': list(selection.threats),
+        'mitigations': dict(selection.mitigations),
+    }
+
+
+# A load's delta per snapshot part: lists ('interactions', 'threats') as one
+# splice [start, removed, inserted], dicts ('domains', 'mitigations') as
+# {key: [before, after]} with None for absent; unchanged parts are left out
+LIST_PARTS = ('interactions', 'threats')
+DICT_PARTS = ('domains', 'mitigations')
+
+
+def _splice(before: List, after: List) -> Optional[List]:
+    start, limit = 0, min(len(before), len(after))
+    while start < limit and before[start] == after[start]:
+        start += 1
+    end = 0
+    while end < limit - start and before[-1 - end] == after[-1 - end]:
+        end += 1
+    if start == len(before) == len(after):
+        return None
+    return [start, before[start:len(before) - end], after[start:len(after) - end]]
+
+
+def snapshot_delta(previous: Dict, state: Dict) -> Dict:
+    delta = {}
+    for part in LIST_PARTS:
+        splice = _splice(previous[part], state[part])
+        if splice is not None:
+            delta[part] = splice
+    for part in DICT_PARTS:
+        before, after = previous[part], state[part]
+        keys = [*before, *(key for key in after if key not in before)]
+        changed = {key: [before.get(key), after.get(key)] for key in keys if before.get(key) != after.get(key)}
+        if changed:
+            delta[part] = changed
+    return delta
+
+
+def invert_delta(delta: Dict) -> Dict:
+    inverse = {}
+    for part, change in delta.items():
+        if part in LIST_PARTS:
+            start, removed, inserted = change
+            inverse[part] = [start, inserted, removed]
+        else:
+            inverse[part] = {key: [after, before] for key, (before, after) in change.items()}
+    return inverse
+
+
+def apply_delta(snapshot: Dict, delta: Dict) -> Dict:
+    state = dict(snapshot)
+    for part, change in delta.items():
+        if part in LIST_PARTS:
+            start, removed, inserted = change
+            state[part] = state[part][:start] + inserted + state[part][start + len(removed):]
+        else:
+            values = dict(state[part])
+            for key, (_, after) in change.items():
+                if after is None:
+                    values.pop(key, None)
+                else:
+                    values[key] = after
+            state[part] = values
+    return state
+
+
+def restore_snapshot(base: ArchitectureModel, state: Dict, selection: SelectionState) -> ArchitectureModel:
+    selection.clear()
+    for threat_id in state.get('threats', []):
+        selection.select_threat(threat_id)
+    for mit_id, threat_id in state.get('mitigations', {}).items():
+        selection.select_mitigation(mit_id, threat_id)
+    return base.with_data(state.get('domains', thaw(base.base_domains)),
+                          state.get('interactions', thaw(base.base_interactions)))
+
+
+def apply_session_event(base: ArchitectureModel, architecture: ArchitectureModel, selection: SelectionState,
+                        kind: str, payload: Dict) -> ArchitectureModel:
+    # Applies one event; mutates selection in place and returns the new architecture
+    if kind == 'add_interaction':
+        return architecture.with_interaction(payload['interaction'])
+    if kind == 'insert_interaction':
+        return architecture.with_interaction_at(payload['index'], payload['interaction'])
+    if kind == 'remove_interaction':
+        return architecture.without_interaction(payload['index'])
+    if kind == 'select_threat':
+        selection.select_threat(payload['threat_id'])
+        for mit_id, threat_id in payload.get('mitigations', {}).items():
+            selection.select_mitigation(mit_id, threat_id)
+    elif kind == 'deselect_threat':
+        selection.deselect_threat(payload['threat_id'])
+    elif kind == 'select_mitigation':
+        selection.select_mitigation(payload['mit_id'], payload['threat_id'])
+    elif kind == 'deselect_mitigation':
+        selection.deselect_mitigation(payload['mit_id'])
+    elif kind == 'load':
+        if 'delta' in payload:
+            state = apply_delta(session_snapshot(architecture, selection), payload['delta'])
+        else:
+            # Logged before loads were stored as deltas
+            state = payload['state']
+        return restore_snapshot(base, state, selection)
+    else:
+        raise ValueError(f"Unknown session event {kind}")
+    return architecture
+
+
+def invert_session_event(kind: str, payload: Dict) -> Tuple[str, Dict]:
+    if kind == 'add_interaction':
+        return 'remove_interaction', {'index': payload['index'], 'interaction': payload['interaction']}
+    if kind == 'insert_interaction':
+        return 'remove_interaction', payload
+    if kind == 'remove_interaction':
+        return 'insert_interaction', payload
+    if kind == 'select_threat':
+        return 'deselect_threat', payload
+    if kind == 'deselect_threat':
+        return 'select_threat', payload
+    if kind == 'select_mitigation':
+        return 'deselect_mitigation', payload
+    if kind == 'deselect_mitigation':
+        return 'select_mitigation', payload
+    if kind == 'load':
+        if 'delta' in payload:
+            return 'load', {'delta': invert_delta(payload['delta'])}
+        return 'load', {'state': payload['previous'], 'previous': payload['state']}
+    raise ValueError(f"Unknown session event {kind}")
+
+
+class SessionHistory:
+    # Per-session undo/redo stacks of (kind, payload) events. Each step is one
+    # inverse application plus one appended log row.
+    __slots__ = ('stream', 'undo_stack', 'redo_stack', 'since_checkpoint')
+
+    def __init__(self, stream: str):
+        self.stream = stream
+        self.undo_stack: List[Tuple[str, Dict]] = []
+        self.redo_stack: List[Tuple[str, Dict]] = []
+        self.since_checkpoint = 0
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+
+def session_state_as_of(c, base: ArchitectureModel, stream: str, seq: int):
+    # Nearest checkpoint at or before seq, then replay the events after it
+    row = c.execute('''
+        SELECT seq, state FROM change_checkpoints
+        WHERE stream = ? AND seq <= ? ORDER BY seq DESC LIMIT 1
+    ''', (stream, seq)).fetchone()
+    selection = SelectionState()
+    if row is None:
+        start, architecture = 0, base
+    else:
+        start, architecture = row[0], restore_snapshot(base, json.loads(row[1]), selection)
+    for _, kind, payload, _ in get_events(c, stream, start, seq):
+        architecture = apply_session_event(base, architecture, selection, kind, payload)
+    return architecture, selection
+
+
+# Catalog stream: payload {'changes': [[table, id, before_row, after_row], ...]}
+# where rows are {column: value} dicts and None means "absent"
+
+def invert_changes(changes: List) -> List:
+    return [[table, row_id, after, before] for table, row_id, before, after in reversed(changes)]
+
+
+def catalog_as_of(c, seq: int, tables=('threats', 'mitigations', 'subdomains')) -> Dict[str, Dict]:
+    # The live tables act as the newest checkpoint; undo every later event
+    state = {}
+    for table in tables:
+        cursor = c.execute(f'SELECT * FROM {table}')
+        columns = [d[0] for d in cursor.description]
+        state[table] = {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+    c.execute('SELECT payload FROM change_log WHERE stream = ? AND seq > ? ORDER BY seq DESC',
+              (CATALOG_STREAM, seq))
+    for (payload,) in c.fetchall():
+        for table, row_id, before, after in reversed(json.loads(payload).get('changes', [])):
+            if table not in state:
+                continue
+            if before is None:
+                state[table].pop(row_id, None)
+            else:
+                state[table][row_id] = before
+    return state
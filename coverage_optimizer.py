@@ -0,0 +1,184 @@
+import heapq
+import time
+from typing import Dict, List, Iterable, Optional, Set
+
+# Weight of a covered threat in the coverage score
+SEVERITY_WEIGHTS = {"Low": 1, "Medium": 2, "High": 4, "Critical": 8}
+
+# Mitigation statuses that already cover their threat at no extra cost
+DONE_STATUSES = ("Implemented", "Verified")
+
+
+class Candidate:
+    __slots__ = ("mit_id", "threats", "cost", "effort")
+
+    def __init__(self, mit_id: str, threats: Iterable[str], cost: float = 0.0, effort: float = 0.0):
+        self.mit_id = mit_id
+        self.threats = frozenset(threats)
+        self.cost = max(float(cost or 0.0), 0.0)
+        self.effort = max(float(effort or 0.0), 0.0)
+
+
+def build_candidates(threats: Dict[str, tuple], mitigations: Iterable[tuple]):
+    # threats: {threat_id: threat row}, mitigations: (id, threat_id, status, cost, effort) rows.
+    # Returns (weights, candidates, already covered threat ids)
+    weights = {tid: SEVERITY_WEIGHTS.get(row[3], 1) for tid, row in threats.items()}
+    covered = set()
+    by_id: Dict[str, Candidate] = {}
+    for mit_id, threat_id, status, cost, effort in mitigations:
+        if threat_id not in weights:
+            continue
+        if status in DONE_STATUSES:
+            covered.add(threat_id)
+            continue
+        cand = by_id.get(mit_id)
+        if cand is None:
+            by_id[mit_id] = Candidate(mit_id, (threat_id,), cost, effort)
+        else:
+            cand.threats = cand.threats | {threat_id}
+    return weights, list(by_id.values()), covered
+
+
+def _fits(cand: Candidate, cost_left: float, effort_left: Optional[float]) -> bool:
+    if cand.cost > cost_left + 1e-9:
+        return False
+    return effort_left is None or cand.effort <= effort_left + 1e-9
+
+
+def _price(cand: Candidate, budget: float, max_effort: Optional[float]) -> float:
+    # Normalised resource use so cost and effort budgets are comparable
+    price = cand.cost / budget if budget > 0 else cand.cost
+    if max_effort:
+        price += cand.effort / max_effort
+    return max(price, 1e-9)
+
+
+def greedy_cover(weights: Dict[str, float], candidates: List[Candidate], budget: float,
+                 max_effort: Optional[float] = None, covered: Optional[Set[str]] = None):
+    # Lazy greedy for budgeted maximum coverage: always take the best marginal
+    # gain per unit of budget, re-scoring stale heap entries only when popped.
+    initial = frozenset(covered or ())
+    covered = set(initial)
+    cost_left, effort_left = float(budget), max_effort
+    heap = []
+    for i, cand in enumerate(candidates):
+        gain = sum(weights.get(t, 0) for t in cand.threats - covered)
+        if gain > 0:
+            heap.append((-gain / _price(cand, budget, max_effort), i, gain))
+    heapq.heapify(heap)
+
+    chosen = []
+    gained = 0.0
+    while heap:
+        _, i, stale_gain = heapq.heappop(heap)
+        cand = candidates[i]
+        if not _fits(cand, cost_left, effort_left):
+            continue
+        gain = sum(weights.get(t, 0) for t in cand.threats - covered)
+        if gain <= 0:
+            continue
+        if gain < stale_gain:
+            heapq.heappush(heap, (-gain / _price(cand, budget, max_effort), i, gain))
+            continue
+        chosen.append(cand)
+        covered |= cand.threats
+        gained += gain
+        cost_left -= cand.cost
+        if effort_left is not None:
+            effort_left -= cand.effort
+
+    # Classic fix-up for the budgeted variant: a single expensive mitigation
+    # can beat the ratio-greedy pick set.
+    best_single, best_gain = None, gained
+    for cand in candidates:
+        if _fits(cand, budget, max_effort):
+            gain = sum(weights.get(t, 0) for t in cand.threats - initial)
+            if gain > best_gain:
+                best_single, best_gain = cand, gain
+    if best_single is not None:
+        return [best_single]
+    return chosen
+
+
+def exact_cover(weights: Dict[str, float], candidates: List[Candidate], budget: float,
+                max_effort: Optional[float] = None, covered: Optional[Set[str]] = None,
+                time_limit: Optional[float] = None):
+    # Depth-first branch and bound seeded with the greedy answer. The bound is a
+    # fractional knapsack over the remaining candidates' current marginal gains;
+    # it ignores overlaps and the effort budget, so it never underestimates.
+    # Returns (chosen, proven): proven is False when time_limit cut the search
+    # short and chosen is only the best set found so far.
+    base = frozenset(covered or ())
+    pool = [c for c in candidates
+            if _fits(c, budget, max_effort) and any(t not in base for t in c.threats)]
+    pool.sort(key=lambda c: -sum(weights.get(t, 0) for t in c.threats) / _price(c, budget, max_effort))
+
+    best_set = greedy_cover(weights, pool, budget, max_effort, base)
+    best_value = _value(weights, best_set, base)
+    deadline = time.perf_counter() + time_limit if time_limit else None
+
+    def bound(idx, cov, cost_left):
+        items = []
+        for c in pool[idx:]:
+            gain = sum(weights.get(t, 0) for t in c.threats - cov)
+            if gain > 0:
+                items.append((gain / c.cost if c.cost > 0 else float('inf'), gain, c.cost))
+        items.sort(reverse=True)
+        total = 0.0
+        for _, gain, cost in items:
+            if cost <= cost_left:
+                total += gain
+                cost_left -= cost
+            else:
+                total += gain * cost_left / cost
+                break
+        return total
+
+    # Explicit stack instead of recursion: pools can hold thousands of candidates
+    stack = [(0, base, 0.0, float(budget), max_effort, ())]
+    while stack:
+        if deadline is not None and time.perf_counter() > deadline:
+            return best_set, False
+        idx, cov, value, cost_left, effort_left, picked = stack.pop()
+        if value > best_value:
+            best_value, best_set = value, [pool[i] for i in picked]
+        if idx >= len(pool) or value + bound(idx, cov, cost_left) <= best_value + 1e-9:
+            continue
+        cand = pool[idx]
+        stack.append((idx + 1, cov, value, cost_left, effort_left, picked))
+        gain = sum(weights.get(t, 0) for t in cand.threats - cov)
+        if gain > 0 and _fits(cand, cost_left, effort_left):
+            stack.append((idx + 1, cov | cand.threats, value + gain, cost_left - cand.cost,
+                          None if effort_left is None else effort_left - cand.effort,
+                          picked + (idx,)))
+    return best_set, True
+
+
+def _value(weights: Dict[str, float], chosen: List[Candidate], covered: Set[str]) -> float:
+    newly = set().union(*[c.threats for c in chosen]) - set(covered) if chosen else set()
+    return sum(weights.get(t, 0) for t in newly)
+
+
+def recommend_mitigations(threats: Dict[str, tuple], mitigations: Iterable[tuple], budget: float,
+                          max_effort: Optional[float] = None, mode: str = "greedy",
+                          time_limit: Optional[float] = 30.0):
+    # Exact search is for offline runs; it can take up to time_limit seconds.
+    # 'optimal' is True only when the exact search finished within it.
+    weights, candidates, covered = build_candidates(threats, mitigations)
+    if mode == "exact":
+        chosen, optimal = exact_cover(weights, candidates, budget, max_effort, covered, time_limit)
+    else:
+        chosen, optimal = greedy_cover(weights, candidates, budget, max_effort, covered), False
+
+    total_weight = sum(weights.values())
+    base_weight = sum(weights[t] for t in covered)
+    gained = _value(weights, chosen, covered)
+    return {
+        'mitigations': [c.mit_id for c in chosen],
+        'cost': sum(c.cost for c in chosen),
+        'effort': sum(c.effort for c in chosen),
+        'covered_threats': sorted(set(covered).union(*[c.threats for c in chosen])),
+        'baseline_coverage': base_weight / total_weight if total_weight else 0.0,
+        'coverage': (base_weight + gained) / total_weight if total_weight else 0.0,
+        'optimal': optimal,
+    }
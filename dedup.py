@@ -0,0 +1,146 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Near-duplicate detection with MinHash and LSH.
+#
+# Each text is normalised (lower case, single spaces) and shingled into
+# overlapping SHINGLE-byte windows, packed straight into uint64 values. The
+# signature of a text is the minimum of NUM_PERM multiply-shift hashes over
+# its shingles, computed for all texts at once with NumPy. Signatures are cut
+# into BANDS bands; texts sharing a band land in one bucket, and a bucket
+# member joins the bucket's first member's cluster when their signatures
+# agree on at least `threshold` of the positions (the estimated Jaccard
+# similarity). Work is linear in the number of texts and shingles; there is
+# no pairwise comparison.
+
+SHINGLE = 5
+NUM_PERM = 64
+BANDS = 16
+SEED = 1
+BATCH = 1 << 16  # shingles hashed per pass
+
+
+def _shingles(texts: Sequence[str]):
+    # (shingle values, index of the first shingle of each text, mask of
+    # texts at least one shingle long)
+    encoded = [" ".join((text or "").lower().split()).encode('utf-8') for text in texts]
+    full = np.fromiter((len(b) >= SHINGLE for b in encoded), dtype=bool, count=len(encoded))
+    # Texts shorter than one shingle still get exactly one, but a single
+    # padded shingle is too little to call two texts duplicates
+    encoded = [b.ljust(SHINGLE) for b in encoded]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    windows = len(buf) - SHINGLE + 1
+    values = np.zeros(windows, dtype=np.uint64)
+    for j in range(SHINGLE):
+        values = (values << np.uint64(8)) | buf[j:j + windows]
+
+    # Keep only windows that start and end inside one text
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    counts = lengths - SHINGLE + 1
+    doc = np.repeat(np.arange(len(encoded)), counts)
+    offsets = np.arange(len(doc)) - np.repeat(np.cumsum(counts) - counts, counts)
+    values = values[np.repeat(starts, counts) + offsets]
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return values, first, full
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = NUM_PERM, seed: int = SEED):
+    # (len(texts), num_perm) uint32 signatures, plus the mask of texts long
+    # enough to cluster
+    values, first, full = _shingles(texts)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    shift = np.uint64(32)
+    # Hash in batches of whole texts small enough to stay in cache across
+    # all num_perm passes; that is several times faster than full-length passes
+    bounds = np.unique(np.append(np.searchsorted(first, np.arange(0, len(values), BATCH)), len(first)))
+    buf = np.empty(min(len(values), 4 * BATCH), dtype=np.uint64)
+    for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        start = first[lo]
+        end = first[hi] if hi < len(first) else len(values)
+        chunk = values[start:end]
+        if len(chunk) > len(buf):
+            buf = np.empty(len(chunk), dtype=np.uint64)
+        out = buf[:len(chunk)]
+        offsets = first[lo:hi] - start
+        for i in range(num_perm):
+            # Multiply-shift hashing; uint64 arithmetic wraps, which is the point
+            np.multiply(chunk, a[i], out=out)
+            np.add(out, b[i], out=out)
+            np.right_shift(out, shift, out=out)
+            signatures[lo:hi, i] = np.minimum.reduceat(out, offsets)
+    return signatures, full
+
+
+def _find(parent: np.ndarray, i: int) -> int:
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def find_clusters(ids: Sequence, texts: Sequence[str], threshold: float = 0.8,
+                  groups: Optional[Sequence] = None, num_perm: int = NUM_PERM,
+                  bands: int = BANDS) -> List[List[Tuple[object, float]]]:
+    # Clusters of near-duplicate ids, largest first, each as
+    # [(id, estimated similarity to the cluster's first id), ...]. With
+    # groups, only ids in the same group can cluster together.
+    n = len(ids)
+    if n < 2:
+        return []
+    signatures, full = minhash_signatures(texts, num_perm)
+    rows = num_perm // bands
+    group_codes = np.zeros(n, dtype=np.uint64)
+    if groups is not None:
+        group_codes = np.unique(np.asarray([str(g) for g in groups]), return_inverse=True)[1].astype(np.uint64)
+    candidates = np.flatnonzero(full)
+    if len(candidates) < 2:
+        return []
+
+    parent = np.arange(n)
+    mix = np.uint64(0x9E3779B97F4A7C15)
+    for band in range(bands):
+        # Fold the band's rows (and the group) into one key; a rare
+        # collision only costs a verification below
+        keys = group_codes[candidates] * mix
+        for col in range(band * rows, (band + 1) * rows):
+            keys = keys * mix + signatures[candidates, col]
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        run_start = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        head = order[np.maximum.accumulate(np.where(run_start, np.arange(len(order)), 0))]
+        members = order[~run_start]
+        if not len(members):
+            continue
+        reps = head[~run_start]
+        a, b = candidates[members], candidates[reps]
+        similar = ((signatures[a] == signatures[b]).mean(axis=1) >= threshold) & (group_codes[a] == group_codes[b])
+        for i, j in zip(a[similar].tolist(), b[similar].tolist()):
+            ri, rj = _find(parent, i), _find(parent, j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+    # Point every id straight at its root, then group by root
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            break
+        parent = grand
+    roots, sizes = np.unique(parent, return_counts=True)
+    multi = np.isin(parent, roots[sizes > 1])
+    members_by_root: Dict[int, List[int]] = {}
+    for i in np.flatnonzero(multi).tolist():
+        members_by_root.setdefault(int(parent[i]), []).append(i)
+    result = []
+    for members in members_by_root.values():
+        similarity = (signatures[members] == signatures[members[0]]).mean(axis=1)
+        result.append([(ids[m], round(float(s), 3)) for m, s in zip(members, similarity)])
+    result.sort(key=lambda cluster: (-len(cluster), str(cluster[0][0])))
+    return result
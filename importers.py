@@ -0,0 +1,500 @@
+import base64
+import html
+import io
+import json
+import math
+import re
+import zlib
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import unquote
+
+from suggestions import component_patterns
+
+# Architecture import from Graphviz DOT, draw.io and JSON graph files.
+#
+# Each reader streams its input into a RawGraph: nodes with a label, an
+# optional container (DOT cluster, draw.io group/swimlane, JSON compound
+# parent) and an optional explicit domain, plus deduplicated edges. DOT is
+# tokenised from fixed-size chunks and draw.io is read with iterparse,
+# dropping every cell once it has been recorded, so memory grows with the
+# number of nodes and edges rather than with the file. map_graph then
+# places nodes into domains and components, turns nested containers into
+# subdomain paths and collapses edges into unique domain interactions.
+
+DEFAULT_DOMAIN = "Imported"
+DEFAULT_RELATIONSHIP = "connects"
+PALETTE = ["#FFF2CC", "#DAE8FC", "#D5E8D4", "#F8CECC", "#E1D5E7", "#FFE6CC", "#F5F5F5"]
+CHUNK_SIZE = 1 << 16
+
+
+class RawGraph:
+    __slots__ = ('nodes', 'edges')
+
+    def __init__(self):
+        # id -> {'label', 'parent', 'domain'}; parent is a container node id
+        self.nodes: Dict[str, Dict] = {}
+        # (source, target, label), in first-seen order
+        self.edges: Dict[Tuple[str, str, str], None] = {}
+
+    def add_node(self, node_id: str, label: str = None, parent: str = None, domain: str = None):
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = {'label': None, 'parent': None, 'domain': None}
+        if label:
+            node['label'] = label
+        # A node belongs to the first container it is mentioned in
+        if parent and not node['parent'] and parent != node_id:
+            node['parent'] = parent
+        if domain:
+            node['domain'] = domain
+
+    def add_edge(self, source: str, target: str, label: str = None):
+        self.add_node(source)
+        self.add_node(target)
+        self.edges.setdefault((source, target, label or ''), None)
+
+
+def _clean_label(text) -> Optional[str]:
+    # Labels may carry HTML (draw.io html=1, DOT <...> labels) and escapes
+    if text is None:
+        return None
+    text = str(text)
+    if '<' not in text and '&' not in text and '\\' not in text:
+        return " ".join(text.split()) or None
+    text = re.sub(r'<br\s*/?>', ' ', text, flags=re.IGNORECASE)
+    text = html.unescape(re.sub(r'<[^>]*>', ' ', text))
+    text = re.sub(r'\\[nlr]', ' ', text)
+    return " ".join(text.split()) or None
+
+
+# --- Graphviz DOT ---------------------------------------------------------
+
+_DOT_SKIP = r'''(?:\s+|//[^\n]*(?:\n|\Z)|\#[^\n]*(?:\n|\Z)|/\*.*?\*/)*'''
+# Whitespace and comments are consumed in front of each token rather than
+# yielded, which halves the number of matches
+_DOT_TOKEN = re.compile(_DOT_SKIP + r'''(?:
+    (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<html><(?:[^<>]|<[^<>]*>)*>)
+  | (?P<edgeop>->|--)
+  | (?P<punct>[{}\[\];=,:+])
+  | (?P<id>[A-Za-z_\x80-\U0010ffff][\w\x80-\U0010ffff]*|-?(?:\.\d+|\d+(?:\.\d*)?))
+)''', re.VERBOSE | re.DOTALL)
+_DOT_TRAILER = re.compile(_DOT_SKIP + r'\Z', re.VERBOSE | re.DOTALL)
+
+
+def _dot_tokens(stream) -> Iterator[Tuple[str, str]]:
+    buf, pos, eof = '', 0, False
+    match_token = _DOT_TOKEN.match
+    while True:
+        match = match_token(buf, pos)
+        # A match running into the end of the buffer may be cut short
+        if match is None or (match.end() == len(buf) and not eof):
+            if eof:
+                if not _DOT_TRAILER.match(buf, pos):
+                    raise ValueError(f"Unexpected {buf[pos:pos + 20].strip()!r} in DOT input")
+                return
+            chunk = stream.read(CHUNK_SIZE)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1]
+            if '\\' in value:
+                value = re.sub(r'\\\r?\n', '', value).replace('\\"', '"')
+            kind = 'id'
+        elif kind == 'html':
+            value, kind = value[1:-1], 'id'
+        yield kind, value
+
+
+class _Tokens:
+    # One-token lookahead over the DOT token stream
+    __slots__ = ('_iter', '_peeked')
+
+    def __init__(self, tokens: Iterator):
+        self._iter = tokens
+        self._peeked = None
+
+    def peek(self) -> Tuple[Optional[str], Optional[str]]:
+        if self._peeked is None:
+            self._peeked = next(self._iter, (None, None))
+        return self._peeked
+
+    def next(self) -> Tuple[Optional[str], Optional[str]]:
+        token = self.peek()
+        self._peeked = None
+        return token
+
+    def accept(self, value: str) -> bool:
+        if self.peek()[1] == value:
+            self.next()
+            return True
+        return False
+
+
+def _dot_value(tokens: _Tokens) -> str:
+    value = tokens.next()[1] or ''
+    while tokens.accept('+'):
+        value += tokens.next()[1] or ''
+    return value
+
+
+def _dot_attrs(tokens: _Tokens) -> Dict[str, str]:
+    attrs = {}
+    while tokens.accept('['):
+        while True:
+            kind, key = tokens.next()
+            if kind is None or key == ']':
+                break
+            if key in (',', ';'):
+                continue
+            attrs[key.lower()] = _dot_value(tokens) if tokens.accept('=') else 'true'
+    return attrs
+
+
+def _dot_endpoint(tokens: _Tokens, first: Tuple[str, str]) -> List[str]:
+    # A node ID (ports dropped) or an anonymous { a b c } group
+    kind, value = first
+    if value.lower() == 'subgraph' and kind == 'id':
+        if tokens.peek()[0] == 'id':
+            tokens.next()
+        kind, value = tokens.next()
+    if value == '{':
+        nodes = []
+        while True:
+            kind, value = tokens.next()
+            if kind is None or value == '}':
+                return nodes
+            if kind == 'id':
+                nodes.append(value)
+    while tokens.accept(':'):
+        tokens.next()
+    return [value]
+
+
+def read_dot(stream) -> RawGraph:
+    graph = RawGraph()
+    tokens = _Tokens(_dot_tokens(stream))
+    # Container (cluster) for each open brace; None at the top level
+    stack = [None]
+    while True:
+        kind, value = tokens.next()
+        if kind is None:
+            break
+        if kind == 'punct':
+            if value == '{':
+                stack.append(stack[-1])
+            elif value == '}' and len(stack) > 1:
+                stack.pop()
+            continue
+        if kind != 'id':
+            # e.g. an edge from an anonymous group at statement start
+            continue
+        keyword = value.lower()
+        if keyword == 'strict':
+            continue
+        if keyword in ('graph', 'digraph') and tokens.peek()[1] not in ('[', '='):
+            if tokens.peek()[0] == 'id':
+                tokens.next()
+            tokens.accept('{')
+            continue
+        if keyword == 'subgraph' and tokens.peek()[1] != '->':
+            name = tokens.next()[1] if tokens.peek()[0] == 'id' else None
+            tokens.accept('{')
+            if name and name.lower().startswith('cluster'):
+                container = f'cluster:{name}'
+                default = re.sub(r'^cluster[_\-\s]*', '', name, flags=re.IGNORECASE) or name
+                graph.add_node(container, default, stack[-1])
+                stack.append(container)
+            else:
+                stack.append(stack[-1])
+            continue
+        if keyword in ('graph', 'node', 'edge') and tokens.peek()[1] == '[':
+            attrs = _dot_attrs(tokens)
+            if keyword == 'graph' and stack[-1] and attrs.get('label'):
+                graph.add_node(stack[-1], _clean_label(attrs['label']))
+            continue
+        if tokens.accept('='):
+            attr_value = _dot_value(tokens)
+            if keyword == 'label' and stack[-1]:
+                graph.add_node(stack[-1], _clean_label(attr_value))
+            continue
+
+        endpoints = [_dot_endpoint(tokens, (kind, value))]
+        while tokens.peek()[0] == 'edgeop':
+            tokens.next()
+            endpoints.append(_dot_endpoint(tokens, tokens.next()))
+        attrs = _dot_attrs(tokens)
+        if len(endpoints) == 1:
+            for node_id in endpoints[0]:
+                graph.add_node(node_id, _clean_label(attrs.get('label')), stack[-1], attrs.get('domain'))
+            continue
+        label = _clean_label(attrs.get('label') or attrs.get('xlabel'))
+        for sources, targets in zip(endpoints, endpoints[1:]):
+            for node_id in sources + targets:
+                graph.add_node(node_id, parent=stack[-1])
+            for source in sources:
+                for target in targets:
+                    graph.add_edge(source, target, label)
+    return graph
+
+
+# --- draw.io --------------------------------------------------------------
+
+def _inflate(text: str) -> bytes:
+    # Compressed draw.io pages: base64, raw deflate, then URL encoding
+    data = zlib.decompress(base64.b64decode(text), -15)
+    return unquote(data.decode('utf-8')).encode('utf-8')
+
+
+def _read_cells(events: Iterable, prefix: str, cells: Dict, compressed: List):
+    # Records each mxCell (with its object/UserObject wrapper's attributes)
+    # as (label, parent, kind, source, target, domain), then drops it. Cell
+    # IDs are only unique within a page, so they get a per-page prefix.
+    stack = []
+    wrapped = None
+    page = f'{prefix}0/'
+    pages = 0
+    for event, elem in events:
+        if event == 'start':
+            stack.append(elem)
+            if elem.tag == 'diagram':
+                pages += 1
+                page = f'{prefix}{pages}/'
+            continue
+        stack.pop()
+        tag = elem.tag
+        if tag == 'diagram':
+            if len(elem) == 0 and (elem.text or '').strip():
+                compressed.append(elem.text.strip())
+        elif tag == 'mxCell':
+            attrs = elem.attrib
+            if stack and stack[-1].tag in ('object', 'UserObject'):
+                wrapped = dict(attrs)
+            else:
+                _record_cell(cells, page, attrs.get('id'), attrs.get('value'), attrs, None)
+        elif tag in ('object', 'UserObject') and wrapped is not None:
+            attrs = elem.attrib
+            _record_cell(cells, page, attrs.get('id'), attrs.get('label'), wrapped, attrs.get('domain'))
+            wrapped = None
+        else:
+            continue
+        # Drop the finished element so the tree never holds more than the open path
+        if stack:
+            stack[-1].remove(elem)
+        elem.clear()
+
+
+def _record_cell(cells: Dict, prefix: str, cell_id, label, attrs: Mapping, domain):
+    if cell_id is None:
+        return
+    kind = 'vertex' if attrs.get('vertex') == '1' else 'edge' if attrs.get('edge') == '1' else 'other'
+    cells[prefix + cell_id] = (
+        _clean_label(label), prefix + attrs['parent'] if attrs.get('parent') else None, kind,
+        prefix + attrs['source'] if attrs.get('source') else None,
+        prefix + attrs['target'] if attrs.get('target') else None,
+        domain
+    )
+
+
+def read_drawio(stream) -> RawGraph:
+    cells, compressed = {}, []
+    _read_cells(ET.iterparse(stream, events=('start', 'end')), '', cells, compressed)
+    for i, text in enumerate(compressed):
+        # Each compressed page is one decoded mxGraphModel, parsed the same way
+        _read_cells(ET.iterparse(io.BytesIO(_inflate(text)), events=('start', 'end')), f'z{i}.', cells, [])
+
+    graph = RawGraph()
+    vertices = {cell_id for cell_id, cell in cells.items() if cell[2] == 'vertex'}
+    edge_labels = {}
+    for cell_id in vertices:
+        label, parent, _, _, _, domain = cells[cell_id]
+        if parent in cells and cells[parent][2] == 'edge':
+            # A label placed on an edge
+            edge_labels.setdefault(parent, label)
+            continue
+        # Layers and the root are not containers
+        graph.add_node(cell_id, label, parent if parent in vertices else None, domain)
+    for cell_id, (label, _, kind, source, target, _) in cells.items():
+        if kind == 'edge' and source in graph.nodes and target in graph.nodes:
+            graph.add_edge(source, target, label or edge_labels.get(cell_id))
+    return graph
+
+
+# --- JSON graphs ----------------------------------------------------------
+
+def _json_items(items) -> Iterator[Dict]:
+    # Lists of items, or JGF 2 style {id: item} maps; cytoscape nests fields in 'data'
+    if isinstance(items, Mapping):
+        items = [{'id': key, **(value or {})} for key, value in items.items()]
+    for item in items or ():
+        if isinstance(item, Mapping):
+            yield {**(item.get('metadata') or {}), **(item.get('data') or {}),
+                   **{k: v for k, v in item.items() if k not in ('metadata', 'data')}}
+
+
+def read_json_graph(stream) -> RawGraph:
+    # JSON Graph Format (graph/graphs), node-link (nodes + links/edges) and
+    # cytoscape (elements) documents
+    data = json.load(stream)
+    if 'graphs' in data:
+        graphs = data['graphs']
+    elif 'graph' in data:
+        graphs = [data['graph']]
+    elif 'elements' in data:
+        elements = data['elements']
+        if isinstance(elements, list):
+            elements = {
+                'nodes': [e for e in elements if e.get('group') == 'nodes' or 'source' not in e.get('data', {})],
+                'edges': [e for e in elements if e.get('group') == 'edges' or 'source' in e.get('data', {})],
+            }
+        graphs = [elements]
+    else:
+        graphs = [data]
+
+    graph = RawGraph()
+    for g in graphs:
+        for node in _json_items(g.get('nodes')):
+            node_id = str(node.get('id', node.get('key', '')))
+            if not node_id:
+                continue
+            parent = node.get('parent')
+            graph.add_node(node_id, _clean_label(node.get('label') or node.get('name') or node.get('title')),
+                           str(parent) if parent is not None else None,
+                           node.get('domain') or node.get('group'))
+        for edge in _json_items(g.get('edges', g.get('links'))):
+            source, target = edge.get('source', edge.get('from')), edge.get('target', edge.get('to'))
+            if source is None or target is None:
+                continue
+            graph.add_edge(str(source), str(target), _clean_label(
+                edge.get('label') or edge.get('relationship') or edge.get('relation')))
+    return graph
+
+
+READERS = {
+    '.dot': read_dot, '.gv': read_dot,
+    '.drawio': read_drawio, '.xml': read_drawio,
+    '.json': read_json_graph,
+}
+
+
+def read_graph(stream, filename: str) -> RawGraph:
+    # stream: a binary file object
+    extension = filename[filename.rfind('.'):].lower() if '.' in filename else ''
+    reader = READERS.get(extension)
+    if reader is None:
+        raise ValueError(f"Unsupported file type {extension or filename!r}; expected one of {', '.join(READERS)}")
+    try:
+        graph = reader(stream if reader is read_drawio else io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    except (ET.ParseError, zlib.error) as e:
+        raise ValueError(f"Could not read {filename}: {e}") from e
+    if not graph.nodes:
+        raise ValueError(f"No nodes found in {filename}")
+    return graph
+
+
+# --- Mapping onto the architecture model ----------------------------------
+
+class ImportResult(NamedTuple):
+    domains: Dict[str, Dict]           # merged domains
+    interactions: List[Dict]           # merged interactions
+    nodes: List[Tuple[str, str, Optional[str], Tuple[str, ...]]]  # (label, domain, component, subdomain path)
+    new_domains: List[str]
+    subdomains: List[Tuple[str, Tuple[str, ...]]]  # (domain, path) of each container below a domain
+    added_interactions: int
+    internal_edges: int                # edges inside a single domain, not interactions
+
+
+def map_graph(graph: RawGraph, domains: Mapping, interactions: Iterable[Mapping],
+              replace: bool = False) -> ImportResult:
+    # Places every node in a domain: its explicit domain, else its outermost
+    # container, else a domain or component its label names, else
+    # DEFAULT_DOMAIN. Containers below the domain level become subdomain paths.
+    canonical = {name.lower(): name for name in domains}
+    component_names = {}
+    for name, info in domains.items():
+        for component in info.get('components', ()):
+            component_names.setdefault(component.lower(), (name, component))
+    patterns = component_patterns(domains)
+    containers = {node['parent'] for node in graph.nodes.values() if node['parent']}
+
+    def label_of(node_id):
+        return graph.nodes[node_id]['label'] or node_id
+
+    paths = {}
+
+    def path_of(node_id):
+        # Container labels from the outermost down, excluding the node itself
+        if node_id not in paths:
+            chain, seen, parent = [], {node_id}, graph.nodes[node_id]['parent']
+            while parent and parent in graph.nodes and parent not in seen:
+                seen.add(parent)
+                chain.append(label_of(parent))
+                parent = graph.nodes[parent]['parent']
+            paths[node_id] = tuple(reversed(chain))
+        return paths[node_id]
+
+    placement = {}
+    for node_id, node in graph.nodes.items():
+        label, path = label_of(node_id), path_of(node_id)
+        component = None if node_id in containers else label
+        if node['domain']:
+            domain, subpath = node['domain'], path
+        elif path:
+            domain, subpath = path[0], path[1:]
+        elif node_id in containers or label.lower() in canonical:
+            domain, subpath, component = label, (), None
+        elif label.lower() in component_names:
+            domain, component = component_names[label.lower()]
+            subpath = ()
+        else:
+            matched = next((key for key, pattern in patterns.items() if pattern.search(label)), None)
+            domain, subpath = (matched[0], ()) if matched else (DEFAULT_DOMAIN, ())
+        domain = canonical.setdefault(domain.lower(), domain)
+        if component and component.lower() in component_names and component_names[component.lower()][0] == domain:
+            component = component_names[component.lower()][1]
+        if node_id in containers and (node['domain'] or path):
+            # A container below the domain level is itself a subdomain
+            subpath = subpath + (label,)
+        placement[node_id] = (label, domain, component, subpath)
+
+    merged = {} if replace else {name: dict(info) for name, info in domains.items()}
+    new_domains = []
+    for label, domain, component, _ in placement.values():
+        if domain not in merged:
+            if domain in domains:
+                merged[domain] = dict(domains[domain])
+            else:
+                merged[domain] = {'color': PALETTE[len(new_domains) % len(PALETTE)], 'position': None,
+                                  'components': []}
+                new_domains.append(domain)
+        if component and component not in merged[domain]['components']:
+            merged[domain]['components'] = [*merged[domain]['components'], component]
+    # New domains go on a ring around the existing layout
+    for i, domain in enumerate(new_domains):
+        angle = 2 * math.pi * i / max(len(new_domains), 1)
+        merged[domain]['position'] = {'x': round(0.5 + 0.65 * math.cos(angle), 3),
+                                      'y': round(0.5 + 0.65 * math.sin(angle), 3)}
+
+    result_interactions = [] if replace else [dict(x) for x in interactions]
+    seen = {(x['from'], x['to'], x['relationship']) for x in result_interactions}
+    added = internal = 0
+    for source, target, label in graph.edges:
+        from_domain, to_domain = placement[source][1], placement[target][1]
+        if from_domain == to_domain:
+            internal += 1
+            continue
+        key = (from_domain, to_domain, label or DEFAULT_RELATIONSHIP)
+        if key not in seen:
+            seen.add(key)
+            result_interactions.append({'from': key[0], 'to': key[1], 'relationship': key[2]})
+            added += 1
+
+    subdomains = sorted({(domain, subpath[:i]) for _, domain, _, subpath in placement.values()
+                         for i in range(1, len(subpath) + 1)})
+    nodes = [entry for node_id, entry in placement.items() if node_id not in containers]
+    return ImportResult(merged, result_interactions, nodes, new_domains, subdomains, added, internal)
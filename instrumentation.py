@@ -0,0 +1,254 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# Process-wide timing registry: per-function latency histograms, SQL statement
+# counters and per-rerun latency/query histograms, exportable as Prometheus
+# text or JSON. Set THREAT_MODEL_INSTRUMENTATION=0 to turn collection off.
+
+ENABLED = os.environ.get('THREAT_MODEL_INSTRUMENTATION', '1') != '0'
+
+# Seconds; covers sub-millisecond helpers up to very slow reruns
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+_TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.rerun_latency = Histogram(LATENCY_BUCKETS)
+        self.rerun_queries = Histogram(QUERY_BUCKETS)
+        self._last_rerun: Optional[Dict] = None
+        self._local = threading.local()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            hist = self.timings.get(name)
+            if hist is None:
+                hist = self.timings[name] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+
+    def increment(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def count_query(self, statement: str):
+        if statement.lstrip().upper().startswith(_TRANSACTION_STATEMENTS):
+            return
+        self.increment('queries_total')
+        stats = getattr(self._local, 'rerun', None)
+        if stats is not None:
+            stats['queries'] += 1
+
+    @contextmanager
+    def rerun(self):
+        # Wraps one script run; nested use only counts the outermost scope
+        if getattr(self._local, 'rerun', None) is not None:
+            yield self._local.rerun
+            return
+        stats = self._local.rerun = {'queries': 0, 'seconds': 0.0}
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] = time.perf_counter() - start
+            self._local.rerun = None
+            with self._lock:
+                self._last_rerun = stats
+                self.rerun_latency.observe(stats['seconds'])
+                self.rerun_queries.observe(stats['queries'])
+                self.counters['reruns_total'] = self.counters.get('reruns_total', 0) + 1
+                # Script-thread queries only, unlike queries_total which also
+                # counts background threads (change feed, maintenance)
+                self.counters['rerun_queries_total'] = self.counters.get('rerun_queries_total', 0) + stats['queries']
+
+    def last_rerun(self) -> Optional[Dict]:
+        # Most recently completed rerun in this process, from any session
+        return self._last_rerun
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+            self._last_rerun = None
+            self.rerun_latency = Histogram(LATENCY_BUCKETS)
+            self.rerun_queries = Histogram(QUERY_BUCKETS)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            def hist_dict(h):
+                return {
+                    'count': h.count, 'sum': h.sum, 'max': h.max,
+                    'p50': h.quantile(0.5), 'p95': h.quantile(0.95),
+                    'buckets': dict(zip([str(b) for b in h.buckets], h.counts))
+                }
+            return {
+                'timings': {name: hist_dict(h) for name, h in sorted(self.timings.items())},
+                'counters': dict(self.counters),
+                'rerun_latency_seconds': hist_dict(self.rerun_latency),
+                'rerun_queries': hist_dict(self.rerun_queries),
+            }
+
+
+REGISTRY = Registry()
+
+
+def timed(name: Optional[str] = None):
+    # Decorator recording the wrapped function's wall time in REGISTRY
+    def decorator(func):
+        if not ENABLED:
+            return func
+        metric = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY.observe(metric, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def timer(name: str):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter() - start)
+
+
+@contextmanager
+def rerun_scope():
+    if not ENABLED:
+        yield None
+        return
+    with REGISTRY.rerun() as stats:
+        yield stats
+
+
+def trace_connection(conn):
+    # Counts every SQL statement run on the connection
+    if ENABLED:
+        conn.set_trace_callback(REGISTRY.count_query)
+    return conn
+
+
+def _prom_histogram(lines, metric, hist, labels=''):
+    sep = ',' if labels else ''
+    cumulative = 0
+    for bound, n in zip(hist.buckets, hist.counts):
+        cumulative += n
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {hist.count}')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f'{metric}_sum{suffix} {hist.sum}')
+    lines.append(f'{metric}_count{suffix} {hist.count}')
+
+
+def to_prometheus(registry: Registry = REGISTRY) -> str:
+    lines = []
+    with registry._lock:
+        lines.append('# HELP threatmodel_function_seconds Wall time of instrumented functions.')
+        lines.append('# TYPE threatmodel_function_seconds histogram')
+        for name, hist in sorted(registry.timings.items()):
+            _prom_histogram(lines, 'threatmodel_function_seconds', hist, f'function="{name}"')
+
+        lines.append('# HELP threatmodel_rerun_seconds Wall time of Streamlit script reruns.')
+        lines.append('# TYPE threatmodel_rerun_seconds histogram')
+        _prom_histogram(lines, 'threatmodel_rerun_seconds', registry.rerun_latency)
+
+        lines.append('# HELP threatmodel_rerun_queries SQL statements executed per rerun.')
+        lines.append('# TYPE threatmodel_rerun_queries histogram')
+        _prom_histogram(lines, 'threatmodel_rerun_queries', registry.rerun_queries)
+
+        for name, value in sorted(registry.counters.items()):
+            lines.append(f'# TYPE threatmodel_{name} counter')
+            lines.append(f'threatmodel_{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def to_json(registry: Registry = REGISTRY) -> str:
+    return json.dumps(registry.snapshot(), indent=2)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body, content_type = to_json(), 'application/json'
+        elif self.path.startswith('/metrics'):
+            body, content_type = to_prometheus(), 'text/plain; version=0.0.4'
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1'):
+    # Serves /metrics (Prometheus) and /metrics.json once per process. Loopback
+    # only by default: the timings and labels are derived from the app's SQL.
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+        return _server
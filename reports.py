@@ -0,0 +1,188 @@
+import base64
+import hashlib
+import html
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from plotly.offline import get_plotlyjs
+
+from analysis import (
+    build_architecture_figure, threat_overview, mitigation_table, coverage_matrix,
+    severity_chart, threat_domain_chart, mitigation_status_chart, mitigation_domain_chart
+)
+
+# Self-contained HTML reports for an iteration, rendered off the request path.
+# Reports and chart fragments are cached on disk under content hashes, so an
+# unchanged iteration (or an unchanged chart) is never rendered twice. Each
+# database (workspace) has its own report directory next to it.
+
+# Bump when the report layout changes so stale cached reports are not served
+REPORT_VERSION = 1
+
+try:
+    import kaleido  # noqa: F401  (optional, enables static PNG charts)
+    STATIC_CHARTS = True
+except ImportError:
+    STATIC_CHARTS = False
+
+
+def iteration_hash(name: str, data: Dict) -> str:
+    payload = json.dumps({'version': REPORT_VERSION, 'name': name, 'data': data}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def report_dir_for(db_path: str) -> str:
+    # {db_dir}/reports/{db name}, e.g. data/reports/threat_model
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'reports', name)
+
+
+def report_path(report_dir: str, content_hash: str) -> str:
+    return os.path.join(report_dir, f'{content_hash}.html')
+
+
+def _chart_fragment(fig, chart_dir: str) -> str:
+    # Static PNG when kaleido is installed, otherwise an interactive div that
+    # relies on the plotly.js bundle inlined once in the report <head>.
+    spec = fig.to_json()
+    key = hashlib.sha256(spec.encode('utf-8')).hexdigest()
+    ext = 'png' if STATIC_CHARTS else 'html'
+    path = os.path.join(chart_dir, f'{key}.{ext}')
+
+    if not os.path.exists(path):
+        os.makedirs(chart_dir, exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        if STATIC_CHARTS:
+            with open(tmp_path, 'wb') as f:
+                f.write(fig.to_image(format='png', width=900, height=500))
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(fig.to_html(full_html=False, include_plotlyjs=False, div_id=f'chart-{key[:12]}'))
+        os.replace(tmp_path, path)
+
+    if STATIC_CHARTS:
+        with open(path, 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('ascii')
+        return f'<img class="chart" src="data:image/png;base64,{encoded}">'
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def _table(df) -> str:
+    if df.empty:
+        return '<p><em>None</em></p>'
+    return df.to_html(index=False, escape=True, border=0, classes='grid')
+
+
+def render_report_html(name: str, data: Dict, chart_dir: str) -> str:
+    selected_threats = data.get('selected_threats', {})
+    selected_mitigations = data.get('selected_mitigations', {})
+
+    threat_df = threat_overview(selected_threats, selected_mitigations)
+    mit_df = mitigation_table(selected_mitigations)
+    coverage_df = coverage_matrix(selected_threats, selected_mitigations)
+
+    charts = [_chart_fragment(build_architecture_figure(data.get('domains', {}), data.get('interactions', [])), chart_dir)]
+    if len(threat_df) > 0:
+        charts.append(_chart_fragment(severity_chart(threat_df), chart_dir))
+        charts.append(_chart_fragment(threat_domain_chart(threat_df), chart_dir))
+    if len(mit_df) > 0:
+        charts.append(_chart_fragment(mitigation_status_chart(mit_df), chart_dir))
+        charts.append(_chart_fragment(mitigation_domain_chart(mit_df), chart_dir))
+
+    script = '' if STATIC_CHARTS else f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    title = html.escape(name)
+    return f'''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Threat Model Report: {title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; color: #222; }}
+table.grid {{ border-collapse: collapse; margin: 1em 0; }}
+table.grid th, table.grid td {{ border: 1px solid #ddd; padding: 4px 8px; text-align: left; }}
+table.grid th {{ background: #f8f9fa; }}
+img.chart {{ max-width: 100%; }}
+@media print {{ .chart {{ page-break-inside: avoid; }} }}
+</style>
+{script}
+</head>
+<body>
+<h1>🛡️ Threat Model Report: {title}</h1>
+<p>Generated {datetime.now().isoformat(timespec="seconds")} ·
+{len(selected_threats)} threats · {len(selected_mitigations)} mitigations</p>
+<h2>🏗️ Architecture</h2>
+{charts[0]}
+<h2>🎯 Threat Overview</h2>
+{_table(threat_df)}
+<h2>📊 Charts</h2>
+{''.join(charts[1:])}
+<h2>🛡️ Mitigations</h2>
+{_table(mit_df)}
+<h2>🎯 Risk Coverage Matrix</h2>
+{_table(coverage_df)}
+</body>
+</html>
+'''
+
+
+def _render_to_file(name: str, data: Dict, report_dir: str, content_hash: str) -> str:
+    path = report_path(report_dir, content_hash)
+    if os.path.exists(path):
+        return path
+    os.makedirs(report_dir, exist_ok=True)
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_report_html(name, data, os.path.join(report_dir, 'charts')))
+    os.replace(tmp_path, path)
+    return path
+
+
+class ReportService:
+    def __init__(self, max_workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report')
+        self._lock = threading.RLock()
+        self._jobs: Dict[Tuple[str, str], Future] = {}
+
+    def submit(self, name: str, data: Dict, report_dir: str) -> Future:
+        # Returns a future resolving to the report path in report_dir. Cached
+        # reports come back already resolved; concurrent requests for one
+        # report share a job.
+        content_hash = iteration_hash(name, data)
+        path = report_path(report_dir, content_hash)
+        key = (report_dir, content_hash)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            if os.path.exists(path):
+                job = Future()
+                job.set_result(path)
+                return job
+            # Copy now so later edits in the session cannot change the job
+            snapshot = json.loads(json.dumps(data, default=str))
+            job = self._pool.submit(_render_to_file, name, snapshot, report_dir, content_hash)
+            self._jobs[key] = job
+            job.add_done_callback(lambda _: self._forget(key))
+            return job
+
+    def _forget(self, key: Tuple[str, str]):
+        with self._lock:
+            self._jobs.pop(key, None)
+
+
+_service: Optional[ReportService] = None
+_service_lock = threading.Lock()
+
+
+def get_report_service() -> ReportService:
+    # One worker pool per process, shared by every session
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ReportService()
+        return _service
@@ -0,0 +1,401 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from changelog import SESSION_IDLE_DAYS, drop_idle_sessions
+
+# Retention and storage maintenance for saved iterations.
+#
+# A RetentionPolicy keeps every iteration from the last `keep_all_days`, then
+# the newest one per ISO week for `weekly_weeks` weeks, then the newest one
+# per calendar month for `monthly_months` months; everything older is
+# archived. Pinned iterations (e.g. ones restored from an archive) are not
+# archived until they are unpinned. Archives are gzip'd JSON-lines files, oldest first, where each
+# iteration after the first is stored as a delta against the one before it,
+# since consecutive saves of a model mostly repeat each other.
+#
+# The database runs with auto_vacuum=INCREMENTAL, so pages freed by deletes
+# go to the freelist and are handed back to the filesystem in small
+# incremental_vacuum steps instead of one long exclusive VACUUM. Converting
+# an older file takes exactly that one full VACUUM, which rewrites the file
+# and locks out every writer meanwhile, so scheduled runs only convert files
+# up to CONVERT_MAX_BYTES; larger ones wait for an admin to ask. A
+# MaintenanceJob thread per database runs archive + vacuum + optimize every
+# `interval` seconds and logs each run in maintenance_log.
+
+MAINTENANCE_INTERVAL = 6 * 3600  # seconds between scheduled runs
+STARTUP_DELAY = 60  # seconds before an overdue run after process start
+VACUUM_STEP = 256  # pages freed per incremental_vacuum step
+CHUNK = 500  # ids per IN (...) list
+AUTO_VACUUM_INCREMENTAL = 2
+CONVERT_MAX_BYTES = 64 * 1024 * 1024  # largest file a scheduled run converts to incremental auto-vacuum
+
+
+class RetentionPolicy(NamedTuple):
+    keep_all_days: int = 30
+    weekly_weeks: int = 12
+    monthly_months: int = 12
+
+    @classmethod
+    def parse(cls, spec: str) -> 'RetentionPolicy':
+        # "30d,12w,12m": keep all for 30 days, then weekly for 12 weeks,
+        # then monthly for 12 months
+        units = {'d': 'keep_all_days', 'w': 'weekly_weeks', 'm': 'monthly_months'}
+        values = {}
+        for part in filter(None, (p.strip().lower() for p in spec.split(','))):
+            if part[-1] not in units or not part[:-1].isdigit():
+                raise ValueError(f"Invalid retention tier {part!r}; expected e.g. 30d,12w,12m")
+            values[units[part[-1]]] = int(part[:-1])
+        return cls(**values)
+
+    def describe(self) -> str:
+        return (f"all from the last {self.keep_all_days} days, then weekly for {self.weekly_weeks} weeks, "
+                f"then monthly for {self.monthly_months} months")
+
+
+def init_retention(c):
+    c.execute('CREATE INDEX IF NOT EXISTS idx_iterations_created_date ON iterations (created_date)')
+    # Keyed by name: iteration ids change when a save replaces the row
+    c.execute('CREATE TABLE IF NOT EXISTS pinned_iterations (name TEXT PRIMARY KEY) WITHOUT ROWID')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            run_date TEXT NOT NULL,
+            archived INTEGER NOT NULL,
+            archive TEXT,
+            freed_pages INTEGER NOT NULL,
+            seconds REAL NOT NULL
+        )
+    ''')
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None) if value else None
+    except ValueError:
+        return None
+
+
+def _months_before(moment: datetime, months: int) -> datetime:
+    index = moment.year * 12 + moment.month - 1 - months
+    return moment.replace(year=index // 12, month=index % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def plan_retention(rows: Iterable[Tuple[int, str, str]], policy: RetentionPolicy, now: datetime = None,
+                   pinned: Set[str] = frozenset()) -> List[int]:
+    # rows: (id, name, date last saved). Returns the ids to archive, oldest first.
+    # Iterations without a readable date are kept.
+    now = now or datetime.now()
+    keep_all_from = now - timedelta(days=policy.keep_all_days)
+    weekly_from = keep_all_from - timedelta(weeks=policy.weekly_weeks)
+    monthly_from = _months_before(weekly_from, policy.monthly_months)
+    newest: Dict[tuple, Tuple[datetime, int]] = {}
+    candidates = []
+    for iteration_id, name, created_date in rows:
+        created = _parse_date(created_date)
+        if created is None or created >= keep_all_from or name in pinned:
+            continue
+        if created >= weekly_from:
+            bucket = ('week', *created.isocalendar()[:2])
+        elif created >= monthly_from:
+            bucket = ('month', created.year, created.month)
+        else:
+            candidates.append((created, iteration_id))
+            continue
+        best = newest.get(bucket)
+        if best is None or (created, iteration_id) > best:
+            if best is not None:
+                candidates.append(best)
+            newest[bucket] = (created, iteration_id)
+        else:
+            candidates.append((created, iteration_id))
+    return [iteration_id for _, iteration_id in sorted(candidates)]
+
+
+_MISSING = object()
+
+
+def make_delta(base: Dict, data: Dict) -> Dict:
+    # Top-level keys that changed; dict values (domains, selected_threats,
+    # ...) are diffed entry by entry
+    delta = {'replace': {}, 'drop': [], 'patch': {}}
+    for key, new in data.items():
+        old = base.get(key, _MISSING)
+        if old == new:
+            continue
+        if isinstance(old, dict) and isinstance(new, dict):
+            delta['patch'][key] = {
+                'set': {k: v for k, v in new.items() if old.get(k, _MISSING) != v},
+                'unset': [k for k in old if k not in new],
+            }
+        else:
+            delta['replace'][key] = new
+    delta['drop'] = [key for key in base if key not in data]
+    return delta
+
+
+def apply_delta(base: Dict, delta: Dict) -> Dict:
+    data = {key: value for key, value in base.items() if key not in delta['drop']}
+    data.update(delta['replace'])
+    for key, patch in delta['patch'].items():
+        value = {k: v for k, v in data[key].items() if k not in patch['unset']}
+        value.update(patch['set'])
+        data[key] = value
+    return data
+
+
+def _digest(data: Optional[str]) -> str:
+    return hashlib.sha1((data or '').encode('utf-8')).hexdigest()
+
+
+def write_archive(conn, iteration_ids: List[int], archive_dir: str) -> Tuple[str, Dict[int, str]]:
+    # Streams the iterations (in the given order) into a new archive file.
+    # Returns its path and a digest of each archived row's data, so the
+    # caller only deletes rows that did not change in the meantime.
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"iterations-{datetime.now():%Y%m%dT%H%M%S%f}.jsonl.gz")
+    digests = {}
+    base = None
+    with gzip.open(f'{path}.tmp', 'wt', encoding='utf-8') as f:
+        for start in range(0, len(iteration_ids), CHUNK):
+            chunk = iteration_ids[start:start + CHUNK]
+            rows = {row[0]: row[1:] for row in conn.execute(f'''
+                SELECT id, name, description, created_date, data FROM iterations
+                WHERE id IN ({",".join("?" * len(chunk))})
+            ''', chunk)}
+            for iteration_id in chunk:
+                if iteration_id not in rows:
+                    continue
+                name, description, created_date, text = rows.pop(iteration_id)
+                digests[iteration_id] = _digest(text)
+                data = json.loads(text or '{}')
+                record = {'name': name, 'description': description, 'created_date': created_date}
+                if base is None:
+                    record['data'] = data
+                else:
+                    record['delta'] = make_delta(base, data)
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+                base = data
+    os.replace(f'{path}.tmp', path)
+    return path, digests
+
+
+def read_archive(path: str) -> Iterator[Dict]:
+    # {'name', 'description', 'created_date', 'data'} per archived iteration
+    data = None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            data = record.pop('data') if 'data' in record else apply_delta(data, record.pop('delta'))
+            yield {**record, 'data': data}
+
+
+def list_archives(archive_dir: str) -> List[Tuple[str, int]]:
+    # (path, size in bytes), newest first
+    if not os.path.isdir(archive_dir):
+        return []
+    names = sorted((n for n in os.listdir(archive_dir) if n.endswith('.jsonl.gz')), reverse=True)
+    return [(os.path.join(archive_dir, n), os.path.getsize(os.path.join(archive_dir, n))) for n in names]
+
+
+def restore_iterations(c, path: str, names: Iterable[str] = None) -> List[str]:
+    # Re-inserts archived iterations (all, or just `names`) under their
+    # original dates and pins them; names that exist again are skipped
+    wanted = set(names) if names is not None else None
+    restored = []
+    for record in read_archive(path):
+        if wanted is not None and record['name'] not in wanted:
+            continue
+        if c.execute('SELECT 1 FROM iterations WHERE name = ?', (record['name'],)).fetchone():
+            continue
+        c.execute('INSERT INTO iterations (name, description, created_date, data) VALUES (?, ?, ?, ?)',
+                  (record['name'], record['description'], record['created_date'], json.dumps(record['data'])))
+        restored.append(record['name'])
+    pin_iterations(c, restored)
+    return restored
+
+
+def pin_iterations(c, names: Iterable[str]):
+    # Pinned iterations are kept whatever their age
+    c.executemany('INSERT OR IGNORE INTO pinned_iterations (name) VALUES (?)', [(name,) for name in names])
+
+
+def unpin_iterations(c, names: Iterable[str]):
+    # Back under the policy: the next run archives them if they are due
+    c.executemany('DELETE FROM pinned_iterations WHERE name = ?', [(name,) for name in names])
+
+
+def storage_stats(conn) -> Dict:
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    return {
+        'size_bytes': page_size * page_count,
+        'free_pages': conn.execute('PRAGMA freelist_count').fetchone()[0],
+        'page_size': page_size,
+        'incremental_vacuum': conn.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL,
+    }
+
+
+def incremental_vacuum(conn, max_pages: int = None, pause: float = 0.01) -> int:
+    # Frees pages VACUUM_STEP at a time, pausing between steps so writers
+    # are never locked out for long; returns the number of pages freed
+    freed = 0
+    while max_pages is None or freed < max_pages:
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not free:
+            break
+        step = min(free, VACUUM_STEP, max_pages - freed if max_pages is not None else VACUUM_STEP)
+        # execute() steps this pragma only once, freeing a single page;
+        # executescript runs it to completion
+        conn.executescript(f'PRAGMA incremental_vacuum({step})')
+        after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if after >= free:
+            break
+        freed += free - after
+        time.sleep(pause)
+    return freed
+
+
+def run_maintenance(db_path: str, policy: RetentionPolicy, archive_dir: str, now: datetime = None,
+                    convert: bool = False) -> Dict:
+    # One maintenance pass: switch the file to incremental auto-vacuum if it
+    # is not yet (a one-off full VACUUM; above CONVERT_MAX_BYTES only when
+    # `convert` is set), archive and delete what the policy
+    # drops, drop idle session streams from the change log, return the freed
+    # pages to the filesystem and refresh planner stats
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    path = None
+    try:
+        converted = False
+        stats = storage_stats(conn)
+        if not stats['incremental_vacuum'] and (convert or stats['size_bytes'] <= CONVERT_MAX_BYTES):
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            converted = True
+
+        pinned = {row[0] for row in conn.execute('SELECT name FROM pinned_iterations')}
+        ids = plan_retention(
+            conn.execute('SELECT id, name, COALESCE(updated_at, created_date) FROM iterations').fetchall(),
+            policy, now, pinned
+        )
+        archived = []
+        if ids:
+            # The archive is written from a read snapshot, without holding the
+            # write lock; only rows still identical to what was archived are
+            # then deleted, anything saved over in between waits for next run
+            conn.execute('BEGIN')
+            try:
+                path, digests = write_archive(conn, ids, archive_dir)
+            finally:
+                conn.execute('COMMIT')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for start in range(0, len(ids), CHUNK):
+                    chunk = ids[start:start + CHUNK]
+                    unchanged = [
+                        iteration_id for iteration_id, data in conn.execute(
+                            f'SELECT id, data FROM iterations WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+                        if digests.get(iteration_id) == _digest(data)
+                    ]
+                    if unchanged:
+                        conn.execute(f'DELETE FROM iterations WHERE id IN ({",".join("?" * len(unchanged))})',
+                                     unchanged)
+                    archived.extend(unchanged)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                os.remove(path)
+                raise
+            if not archived:
+                os.remove(path)
+                path = None
+
+        idle_since = (now or datetime.now()) - timedelta(days=SESSION_IDLE_DAYS)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            sessions = drop_idle_sessions(conn, idle_since.isoformat())
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        freed = incremental_vacuum(conn)
+        conn.execute('PRAGMA optimize')
+        summary = {'archived': len(archived), 'archive': path, 'sessions': sessions, 'converted': converted,
+                   'freed_pages': freed, 'seconds': time.perf_counter() - started}
+        conn.execute('INSERT INTO maintenance_log (run_date, archived, archive, freed_pages, seconds) '
+                     'VALUES (?, ?, ?, ?, ?)', ((now or datetime.now()).isoformat(), len(archived), path, freed,
+                                                summary['seconds']))
+        return summary
+    finally:
+        conn.close()
+
+
+class MaintenanceJob:
+    def __init__(self, db_path: str, policy: RetentionPolicy, archive_dir: str,
+                 interval: float = MAINTENANCE_INTERVAL):
+        self.db_path = db_path
+        self.policy = policy
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.last_error: Optional[str] = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # interval 0: on-demand runs only
+        if interval:
+            self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+            self._thread.start()
+
+    def run_now(self, convert: bool = False) -> Dict:
+        # Scheduled and on-demand runs never overlap
+        with self._run_lock:
+            return run_maintenance(self.db_path, self.policy, self.archive_dir, convert=convert)
+
+    def _first_delay(self) -> float:
+        # Picks up the schedule where the last process left it
+        conn = sqlite3.connect(self.db_path)
+        try:
+            last = _parse_date(conn.execute('SELECT MAX(run_date) FROM maintenance_log').fetchone()[0])
+        except sqlite3.Error:
+            last = None
+        finally:
+            conn.close()
+        due = self.interval - (datetime.now() - last).total_seconds() if last else 0
+        return max(STARTUP_DELAY, due)
+
+    def _run(self):
+        delay = self._first_delay()
+        while not self._stop.wait(delay):
+            delay = self.interval
+            try:
+                self.run_now()
+                self.last_error = None
+            except (sqlite3.Error, OSError) as e:
+                # e.g. the database is locked by a long write; try again next time
+                self.last_error = str(e)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_jobs: Dict[str, MaintenanceJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def get_maintenance_job(db_path: str, policy: RetentionPolicy, interval: float = MAINTENANCE_INTERVAL
+                        ) -> MaintenanceJob:
+    # One job per database per process; archives go next to the database
+    with _jobs_lock:
+        job = _jobs.get(db_path)
+        if job is None:
+            job = _jobs[db_path] = MaintenanceJob(db_path, policy, f'{db_path}.archive', interval)
+        return job
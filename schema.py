@@ -0,0 +1,37 @@
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# Schema setup and migrations, once per database file per process.
+#
+# Streamlit re-executes the app script on every rerun, so anything the script
+# runs at the top (init_db) runs for every click. The CREATE TABLE IF NOT
+# EXISTS statements, index creation and column migrations only need to run
+# the first time a process opens a database. A file that is deleted or
+# replaced (new inode) gets them again.
+
+
+def _identity(path: str) -> Optional[Tuple[int, int]]:
+    # (device, inode) of the file, or None when it does not exist
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+_schemas: Dict[str, Tuple[int, int]] = {}
+_schemas_lock = threading.Lock()
+
+
+def ensure_schema(db_path: str, init: Callable[[], None]) -> bool:
+    # Runs init for db_path unless it already ran on this file in this
+    # process; returns whether it ran. Concurrent first runs wait for it.
+    key = os.path.abspath(db_path)
+    with _schemas_lock:
+        identity = _identity(key)
+        if identity is not None and _schemas.get(key) == identity:
+            return False
+        init()
+        _schemas[key] = _identity(key)
+        return True
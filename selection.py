@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, Set
+
+# Per-session selection of threats and mitigations, holding IDs only. Rows are
+# looked up from the catalog when needed, so a session costs a few small
+# dicts rather than copies of every selected row. Dicts double as ordered sets
+# to keep the order in which things were selected.
+
+
+class SelectionState:
+    __slots__ = ('threats', 'mitigations', '_by_threat')
+
+    def __init__(self):
+        self.threats: Dict[str, None] = {}
+        # mitigation id -> threat id it was selected for
+        self.mitigations: Dict[str, str] = {}
+        # threat id -> selected mitigation ids, so a deselect cascades in O(affected)
+        self._by_threat: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def from_saved(cls, selected_threats: Iterable, selected_mitigations: Dict):
+        # Accepts the saved-iteration shape: threat ids (or rows keyed by id)
+        # and {mitigation id: mitigation row}
+        state = cls()
+        for threat_id in selected_threats:
+            state.select_threat(threat_id)
+        for mit_id, row in selected_mitigations.items():
+            if row[1] in state.threats:
+                state.select_mitigation(mit_id, row[1])
+        return state
+
+    def __len__(self):
+        return len(self.threats)
+
+    def has_threat(self, threat_id: str) -> bool:
+        return threat_id in self.threats
+
+    def has_mitigation(self, mit_id: str) -> bool:
+        return mit_id in self.mitigations
+
+    def select_threat(self, threat_id: str):
+        self.threats.setdefault(threat_id, None)
+
+    def deselect_threat(self, threat_id: str):
+        if threat_id not in self.threats:
+            return
+        del self.threats[threat_id]
+        for mit_id in self._by_threat.pop(threat_id, ()):
+            del self.mitigations[mit_id]
+
+    def select_mitigation(self, mit_id: str, threat_id: str):
+        previous = self.mitigations.get(mit_id)
+        if previous == threat_id:
+            return
+        if previous is not None:
+            self._by_threat[previous].discard(mit_id)
+        self.mitigations[mit_id] = threat_id
+        self._by_threat.setdefault(threat_id, set()).add(mit_id)
+
+    def deselect_mitigation(self, mit_id: str):
+        threat_id = self.mitigations.pop(mit_id, None)
+        if threat_id is None:
+            return
+        siblings = self._by_threat.get(threat_id)
+        if siblings is not None:
+            siblings.discard(mit_id)
+            if not siblings:
+                del self._by_threat[threat_id]
+
+    def mitigations_for(self, threat_id: str) -> Set[str]:
+        return self._by_threat.get(threat_id, set())
+
+    def clear(self):
+        self.threats.clear()
+        self.mitigations.clear()
+        self._by_threat.clear()
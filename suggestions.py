@@ -0,0 +1,187 @@
+import bisect
+import heapq
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from changefeed import ChangeEvent, get_change_feed
+from coverage_optimizer import SEVERITY_WEIGHTS
+
+# Threat suggestions from inverted indexes over the catalog. Postings map each
+# (domain, component) and subdomain to the threats filed under it, and each
+# (domain, severity) group keeps its threat IDs sorted. Threats without a
+# focus match score the same within their group, so ranking touches the
+# focused postings plus at most `limit` IDs per group instead of scanning
+# the whole catalog.
+#
+# score = COMPONENT_WEIGHT per focused component the threat is mapped to
+#       + SUBDOMAIN_WEIGHT if it sits in a focused subdomain subtree
+#       + DOMAIN_WEIGHT scaled up to 2x by how connected its domain is
+#       + severity weight / 10 as a tie-breaker
+
+COMPONENT_WEIGHT = 3.0
+SUBDOMAIN_WEIGHT = 2.0
+DOMAIN_WEIGHT = 1.0
+
+Component = Tuple[str, str]  # (domain, component)
+
+
+def component_patterns(domains: Mapping) -> Dict[Component, re.Pattern]:
+    # Whole-word, case-insensitive, tolerant of a trailing plural "s"
+    patterns = {}
+    for domain, info in domains.items():
+        for component in info.get('components', ()):
+            stem = component[:-1] if component.endswith('s') else component
+            patterns[(domain, component)] = re.compile(rf'\b{re.escape(stem)}s?\b', re.IGNORECASE)
+    return patterns
+
+
+def infer_components(text: str, patterns: Dict[Component, re.Pattern]) -> List[Component]:
+    return [key for key, pattern in patterns.items() if pattern.search(text or '')]
+
+
+class SuggestionIndex:
+    def __init__(self, seq: int = 0):
+        # Events at or before seq are already part of the loaded snapshot
+        self.seq = seq
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str, Optional[str]]] = {}  # id -> (domain, severity, subdomain)
+        self._components: Dict[str, Tuple[Component, ...]] = {}
+        self.by_component: Dict[Component, Set[str]] = defaultdict(set)
+        self.by_subdomain: Dict[str, Set[str]] = defaultdict(set)
+        self.by_group: Dict[Tuple[str, str], List[str]] = defaultdict(list)  # (domain, severity) -> sorted ids
+
+    @classmethod
+    def build(cls, seq: int, threat_rows: Iterable[tuple], component_rows: Iterable[tuple]):
+        # threat_rows: (id, domain, severity, subdomain_id); component_rows: (threat_id, domain, component)
+        index = cls(seq)
+        # Sorted so every insort appends to the end of its group
+        for threat_id, domain, severity, subdomain_id in sorted(threat_rows):
+            index._set_threat(threat_id, domain, severity, subdomain_id)
+        grouped = defaultdict(list)
+        for threat_id, domain, component in component_rows:
+            grouped[threat_id].append((domain, component))
+        for threat_id, components in grouped.items():
+            index._set_components(threat_id, components)
+        return index
+
+    def __len__(self):
+        return len(self._meta)
+
+    def _set_threat(self, threat_id: str, domain: str, severity: str, subdomain_id: Optional[str]):
+        self._drop_threat(threat_id)
+        self._meta[threat_id] = (domain, severity, subdomain_id)
+        bisect.insort(self.by_group[(domain, severity)], threat_id)
+        if subdomain_id:
+            self.by_subdomain[subdomain_id].add(threat_id)
+
+    def _drop_threat(self, threat_id: str):
+        old = self._meta.pop(threat_id, None)
+        if old is None:
+            return
+        group = self.by_group[(old[0], old[1])]
+        del group[bisect.bisect_left(group, threat_id)]
+        if old[2]:
+            self.by_subdomain[old[2]].discard(threat_id)
+
+    def _set_components(self, threat_id: str, components: Iterable[Component]):
+        for key in self._components.pop(threat_id, ()):
+            self.by_component[key].discard(threat_id)
+        components = tuple(tuple(key) for key in components)
+        if components:
+            self._components[threat_id] = components
+            for key in components:
+                self.by_component[key].add(threat_id)
+
+    def apply(self, events: Iterable[ChangeEvent]):
+        with self._lock:
+            for event in events:
+                if event.seq <= self.seq:
+                    continue
+                if event.table == 'threats':
+                    if event.after is None:
+                        self._drop_threat(event.row_id)
+                    else:
+                        row = event.after
+                        self._set_threat(event.row_id, row['domain'], row['severity'], row['subdomain_id'])
+                elif event.table == 'threat_components':
+                    self._set_components(event.row_id, event.after['components'] if event.after else ())
+
+    def suggest(self, domains: Iterable[str], interactions: Iterable[Mapping],
+                focus_components: Iterable[Component] = (), focus_subdomains: Iterable[str] = (),
+                exclude: Iterable[str] = (), limit: int = 20) -> List[Tuple[str, float, List[str]]]:
+        # Top `limit` (threat_id, score, reasons). Without a focus every
+        # session domain is in scope; with one, only the focused domains are.
+        domains = set(domains)
+        focus_components = [tuple(key) for key in focus_components if key[0] in domains]
+        focus_subdomains = set(focus_subdomains)
+        degree = Counter()
+        for interaction in interactions:
+            for end in (interaction['from'], interaction['to']):
+                if end in domains:
+                    degree[end] += 1
+        max_degree = max(degree.values(), default=0) or 1
+        scope = {domain for domain, _ in focus_components} if focus_components or focus_subdomains else domains
+        exclude = set(exclude)
+
+        def base_score(domain, severity):
+            weight = DOMAIN_WEIGHT * (1 + degree[domain] / max_degree) if domain in scope else 0.0
+            return weight + SEVERITY_WEIGHTS.get(severity, 0) / 10
+
+        with self._lock:
+            bonus: Dict[str, float] = defaultdict(float)
+            for key in focus_components:
+                for threat_id in self.by_component.get(key, ()):
+                    bonus[threat_id] += COMPONENT_WEIGHT
+            for subdomain_id in focus_subdomains:
+                for threat_id in self.by_subdomain.get(subdomain_id, ()):
+                    bonus[threat_id] += SUBDOMAIN_WEIGHT
+            candidates = [
+                (extra + base_score(*self._meta[threat_id][:2]), threat_id)
+                for threat_id, extra in bonus.items()
+                if threat_id not in exclude and threat_id in self._meta
+            ]
+            # Everything else in scope scores its group's base score; the
+            # lowest IDs of each group are the only ones that can make the cut
+            for (domain, severity), ids in self.by_group.items():
+                if domain not in scope:
+                    continue
+                score, taken = base_score(domain, severity), 0
+                for threat_id in ids:
+                    if taken == limit:
+                        break
+                    if threat_id in bonus or threat_id in exclude:
+                        continue
+                    candidates.append((score, threat_id))
+                    taken += 1
+            top = heapq.nsmallest(limit, candidates, key=lambda c: (-c[0], c[1]))
+
+            results = []
+            focus_set = set(focus_components)
+            for score, threat_id in top:
+                meta = self._meta[threat_id]
+                reasons = [f"{d} / {c}" for d, c in self._components.get(threat_id, ()) if (d, c) in focus_set]
+                if meta[2] in focus_subdomains:
+                    reasons.append(f"subdomain {meta[2]}")
+                if meta[0] in scope:
+                    reasons.append(f"{meta[0]} ({degree[meta[0]]} interactions)")
+                results.append((threat_id, round(score, 3), reasons))
+            return results
+
+
+_indexes: Dict[str, tuple] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_suggestion_index(db_path: str, loader: Callable[[], SuggestionIndex]) -> SuggestionIndex:
+    # One index per database per process, built once and then kept current
+    # from the change feed
+    with _indexes_lock:
+        entry = _indexes.get(db_path)
+        if entry is None:
+            subscription = get_change_feed(db_path).subscribe()
+            entry = _indexes[db_path] = (loader(), subscription)
+    index, subscription = entry
+    index.apply(subscription.drain())
+    return index
@@ -0,0 +1,58 @@
+import random
+
+from architecture import ArchitectureModel, thaw
+
+DOMAINS = {'People': {'color': '#fff', 'position': None, 'components': ['staff']},
+           'Technology': {'color': '#eee', 'position': None, 'components': ['api']}}
+BASE = [{'from': 'People', 'to': 'Technology', 'relationship': f'base {i}'} for i in range(5)]
+
+
+def _added(i):
+    return {'from': 'Technology', 'to': 'People', 'relationship': f'added {i}'}
+
+
+def _names(model):
+    return [x['relationship'] for x in model.interactions]
+
+
+def test_with_data_keeps_saved_interleaving():
+    base = ArchitectureModel.base(DOMAINS, BASE)
+    saved = [_added(0), BASE[0], _added(1), BASE[2], BASE[3], _added(2), _added(3), BASE[4]]
+
+    model = base.with_data(DOMAINS, saved)
+    assert thaw(model.interactions) == saved
+    assert model.to_data() == {'domains': DOMAINS, 'interactions': saved}
+    # Everything that can still be shared with the base is
+    assert model._removed == {1}
+    assert len(model._added) == 4
+
+
+def test_with_data_keeps_reordered_base_interactions():
+    base = ArchitectureModel.base(DOMAINS, BASE)
+    saved = [BASE[3], BASE[0], BASE[1], BASE[3], BASE[4]]
+    assert thaw(base.with_data(DOMAINS, saved).interactions) == saved
+    assert base.with_data(DOMAINS, BASE).is_pristine
+
+
+def test_remove_and_reinsert_round_trip_anywhere():
+    rng = random.Random(0)
+    base = ArchitectureModel.base(DOMAINS, BASE)
+    model = base.with_data(DOMAINS, [_added(0), BASE[0], _added(1), BASE[2], BASE[3], _added(2), BASE[4]])
+    for step in range(200):
+        expected = list(model.interactions)
+        if expected and rng.random() < 0.5:
+            index = rng.randrange(len(expected))
+            removed = expected.pop(index)
+            smaller = model.without_interaction(index)
+            assert list(smaller.interactions) == expected
+            # Undo puts it back where it was
+            assert model.interactions == smaller.with_interaction_at(index, thaw(removed)).interactions
+            model = smaller
+        else:
+            index = rng.randrange(len(expected) + 1)
+            new = _added(f'{step}')
+            model = model.with_interaction_at(index, new)
+            assert list(model.interactions) == expected[:index] + [model.interactions[index]] + expected[index:]
+            assert thaw(model.interactions[index]) == new
+        # Whatever the edits, loading the result back gives the same order
+        assert base.with_data(DOMAINS, thaw(model.interactions)).interactions == model.interactions
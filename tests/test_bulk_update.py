@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+import Threatmodeling as tm
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(tm, 'DB_PATH', str(tmp_path / 'bulk.db'))
+    tm.init_db()
+    return tm.DB_PATH
+
+
+def _components(db_path, threat_id):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT domain, component FROM threat_components WHERE threat_id = ? ORDER BY domain, component',
+                        (threat_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def _latest_seq(db_path):
+    conn = sqlite3.connect(db_path)
+    seq = conn.execute('SELECT MAX(seq) FROM change_log').fetchone()[0]
+    conn.close()
+    return seq
+
+
+def test_bulk_domain_change_rederives_components(db):
+    physical, people = 'Physical Domain', 'People'
+    old_component = tm.STATIC_DOMAINS[physical]['components'][0]
+    new_component = tm.STATIC_DOMAINS[people]['components'][0]
+    tm.save_threat('T1', f'{new_component} tailgating', '', 'High', physical,
+                   components=[(physical, old_component)])
+    tm.save_threat('T2', 'Unrelated', '', 'Low', people, components=[(people, new_component)])
+
+    assert tm.bulk_update('threats', ['T1', 'T2'], {'domain': people}) == 2
+
+    # The old domain's mapping goes, the new domain's component is inferred
+    # from the name; a threat already in the domain keeps its mappings
+    assert _components(db, 'T1') == [(people, new_component)]
+    assert _components(db, 'T2') == [(people, new_component)]
+
+    tm.undo_catalog_change(_latest_seq(db))
+    assert _components(db, 'T1') == [(physical, old_component)]
+
+
+def test_bulk_severity_change_leaves_components(db):
+    domain = next(iter(tm.STATIC_DOMAINS))
+    component = tm.STATIC_DOMAINS[domain]['components'][0]
+    tm.save_threat('T1', 'Anything', '', 'Low', domain, components=[(domain, component)])
+
+    tm.bulk_update('threats', ['T1'], {'severity': 'Critical'})
+
+    assert _components(db, 'T1') == [(domain, component)]
@@ -0,0 +1,103 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import Threatmodeling as tm
+from changelog import (
+    CATALOG_STREAM, apply_delta, apply_session_event, drop_idle_sessions, init_changelog, invert_delta,
+    invert_session_event, prune_session_stream, record, session_snapshot, session_state_as_of, snapshot_delta,
+    write_checkpoint
+)
+from selection import SelectionState
+
+
+@pytest.fixture
+def c():
+    conn = sqlite3.connect(':memory:')
+    c = conn.cursor()
+    init_changelog(c)
+    yield c
+    conn.close()
+
+
+def _snapshot(threats, mitigations, interactions=None, domains=None):
+    base = tm.BASE_ARCHITECTURE.to_data()
+    return {
+        'domains': domains if domains is not None else base['domains'],
+        'interactions': interactions if interactions is not None else base['interactions'],
+        'threats': threats,
+        'mitigations': mitigations,
+    }
+
+
+def test_load_delta_round_trips():
+    previous = _snapshot(['T1', 'T2', 'T3'], {'M1': 'T1', 'M2': 'T2'})
+    extra = {'from': 'People', 'to': 'Logical Domain', 'relationship': 'uses'}
+    domains = dict(previous['domains'], People=dict(previous['domains']['People'], color='#000000'))
+    state = _snapshot(['T1', 'T4', 'T3'], {'M1': 'T1', 'M4': 'T4'}, previous['interactions'] + [extra], domains)
+
+    delta = snapshot_delta(previous, state)
+    assert delta['threats'] == [1, ['T2'], ['T4']]
+    assert delta['mitigations'] == {'M2': ['T2', None], 'M4': [None, 'T4']}
+    assert list(delta['domains']) == ['People']
+    assert apply_delta(previous, delta) == state
+    assert apply_delta(state, invert_delta(delta)) == previous
+    # A load that changes nothing logs an empty delta
+    assert snapshot_delta(state, state) == {}
+
+
+def test_load_event_is_undone_by_its_inverse():
+    base = tm.BASE_ARCHITECTURE
+    selection = SelectionState()
+    selection.select_threat('T1')
+    selection.select_mitigation('M1', 'T1')
+    previous = session_snapshot(base, selection)
+    loaded = _snapshot(['T2'], {'M2': 'T2'}, previous['interactions'][:1])
+
+    kind, payload = 'load', {'delta': snapshot_delta(previous, loaded)}
+    architecture = apply_session_event(base, base, selection, kind, payload)
+    assert session_snapshot(architecture, selection) == loaded
+    architecture = apply_session_event(base, architecture, selection, *invert_session_event(kind, payload))
+    assert session_snapshot(architecture, selection) == previous
+
+
+def test_checkpoint_prunes_older_session_events(c):
+    stream = 'session:a'
+    selection = SelectionState()
+    checkpoints = []
+    for i in range(6):
+        seq = record(c, stream, 'select_threat', {'threat_id': f'T{i}'})
+        selection.select_threat(f'T{i}')
+        if i % 2:
+            write_checkpoint(c, stream, seq, session_snapshot(tm.BASE_ARCHITECTURE, selection))
+            checkpoints.append(seq)
+    record(c, CATALOG_STREAM, 'save_threat', {'changes': []})
+
+    prune_session_stream(c, stream, keep=2)
+
+    seqs = [row[0] for row in c.execute('SELECT seq FROM change_log WHERE stream = ? ORDER BY seq', (stream,))]
+    assert seqs[0] == checkpoints[-2] and len(seqs) == 3
+    kept = [row[0] for row in c.execute('SELECT seq FROM change_checkpoints ORDER BY seq')]
+    assert kept == checkpoints[-2:]
+    assert c.execute('SELECT COUNT(*) FROM change_log WHERE stream = ?', (CATALOG_STREAM,)).fetchone()[0] == 1
+    # Every retained event can still be restored
+    _, restored = session_state_as_of(c, tm.BASE_ARCHITECTURE, stream, seqs[1])
+    assert list(restored.threats) == ['T0', 'T1', 'T2', 'T3', 'T4']
+
+
+def test_idle_session_streams_are_dropped(c):
+    now = datetime(2026, 3, 1)
+    old = (now - timedelta(days=30)).isoformat()
+    for stream in ('session:idle', 'session:active', CATALOG_STREAM):
+        c.execute('INSERT INTO change_log (stream, kind, payload, created_date) VALUES (?, ?, ?, ?)',
+                     (stream, 'select_threat', '{}', old))
+    c.execute('INSERT INTO change_log (stream, kind, payload, created_date) VALUES (?, ?, ?, ?)',
+                 ('session:active', 'select_threat', '{}', now.isoformat()))
+    write_checkpoint(c, 'session:idle', 1, {})
+
+    assert drop_idle_sessions(c, (now - timedelta(days=7)).isoformat()) == 1
+
+    streams = {row[0] for row in c.execute('SELECT stream FROM change_log')}
+    assert streams == {'session:active', CATALOG_STREAM}
+    assert c.execute('SELECT COUNT(*) FROM change_checkpoints').fetchone()[0] == 0
@@ -0,0 +1,80 @@
+import itertools
+import random
+
+import pytest
+
+from coverage_optimizer import Candidate, _value, exact_cover, greedy_cover, recommend_mitigations
+
+
+def _within(chosen, budget, max_effort=None):
+    return (sum(c.cost for c in chosen) <= budget + 1e-9
+            and (max_effort is None or sum(c.effort for c in chosen) <= max_effort + 1e-9))
+
+
+def test_single_expensive_item_beats_ratio_greedy():
+    weights = {'a': 1, 'b': 10}
+    cheap = Candidate('M-cheap', ['a'], cost=0.5)
+    expensive = Candidate('M-expensive', ['b'], cost=10)
+
+    # By gain per cost the cheap one goes first, after which the expensive
+    # one no longer fits; the fix-up takes the expensive one alone instead
+    chosen = greedy_cover(weights, [cheap, expensive], budget=10)
+    assert [c.mit_id for c in chosen] == ['M-expensive']
+
+
+def test_effort_budget_excludes_best_ratio_item():
+    weights = {'a': 4, 'b': 2}
+    best_ratio = Candidate('M-a', ['a'], cost=1, effort=10)
+    other = Candidate('M-b', ['b'], cost=1, effort=1)
+
+    assert [c.mit_id for c in greedy_cover(weights, [best_ratio, other], budget=10)] == ['M-a', 'M-b']
+    assert [c.mit_id for c in greedy_cover(weights, [best_ratio, other], budget=10, max_effort=5)] == ['M-b']
+    chosen, proven = exact_cover(weights, [best_ratio, other], budget=10, max_effort=5)
+    assert [c.mit_id for c in chosen] == ['M-b'] and proven
+
+
+def _random_instance(rng, num_threats=6, num_candidates=8):
+    threats = [f'T{i}' for i in range(num_threats)]
+    weights = {t: rng.choice([1, 2, 4, 8]) for t in threats}
+    candidates = [
+        Candidate(f'M{i}', rng.sample(threats, rng.randint(1, 3)), cost=rng.randint(1, 6), effort=rng.randint(0, 4))
+        for i in range(num_candidates)
+    ]
+    return weights, candidates
+
+
+def test_time_limit_expiry_is_not_reported_as_proven():
+    weights, candidates = _random_instance(random.Random(0), num_threats=40, num_candidates=60)
+
+    chosen, proven = exact_cover(weights, candidates, budget=30, time_limit=1e-9)
+    assert not proven
+    # Still a usable answer: within budget and no worse than greedy
+    assert _within(chosen, 30)
+    assert _value(weights, chosen, set()) >= _value(weights, greedy_cover(weights, candidates, 30), set())
+
+    threats = {t: (t, t, '', 'High', 'People') for t in weights}
+    mitigations = [(c.mit_id, t, 'Proposed', c.cost, c.effort) for c in candidates[:5] for t in c.threats]
+    assert recommend_mitigations(threats, mitigations, 30, mode='exact', time_limit=None)['optimal']
+    assert not recommend_mitigations(threats, mitigations, 30, mode='greedy')['optimal']
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_exact_cover_matches_brute_force(seed):
+    rng = random.Random(seed)
+    weights, candidates = _random_instance(rng)
+    budget = rng.randint(3, 12)
+    max_effort = rng.choice([None, rng.randint(1, 8)])
+    covered = set(rng.sample(sorted(weights), rng.randint(0, 2)))
+
+    best = max(
+        _value(weights, list(subset), covered)
+        for size in range(len(candidates) + 1)
+        for subset in itertools.combinations(candidates, size)
+        if _within(subset, budget, max_effort)
+    )
+    chosen, proven = exact_cover(weights, candidates, budget, max_effort, covered)
+    assert proven
+    assert _within(chosen, budget, max_effort)
+    assert _value(weights, chosen, covered) == best
+    greedy = greedy_cover(weights, candidates, budget, max_effort, covered)
+    assert _within(greedy, budget, max_effort) and _value(weights, greedy, covered) <= best
@@ -0,0 +1,33 @@
+from dedup import find_clusters
+
+TEXTS = {
+    'T1': 'SQL injection in the login form lets an attacker read the user table',
+    'T2': 'SQL injection in the  Login form lets an attacker read the users table',
+    'T3': 'Cross-site scripting in the comment field runs script in other browsers',
+    'T4': 'Weak TLS configuration allows downgrade of the payment API connection',
+    'T5': 'sql injection in the login form lets an attacker read the user table.',
+}
+
+
+def test_near_duplicates_cluster_and_distinct_texts_do_not():
+    clusters = find_clusters(list(TEXTS), list(TEXTS.values()), threshold=0.7)
+
+    assert len(clusters) == 1
+    assert [entry_id for entry_id, _ in clusters[0]] == ['T1', 'T2', 'T5']
+    assert clusters[0][0] == ('T1', 1.0)
+    assert all(similarity >= 0.7 for _, similarity in clusters[0])
+    assert dict(clusters[0])['T2'] < 1.0
+    # Deterministic: the same input gives the same clusters
+    assert find_clusters(list(TEXTS), list(TEXTS.values()), threshold=0.7) == clusters
+
+
+def test_groups_keep_clusters_apart():
+    ids, texts = ['M1', 'M2', 'M3'], [TEXTS['T1'], TEXTS['T1'], TEXTS['T1']]
+    assert find_clusters(ids, texts, groups=['T-a', 'T-b', 'T-a']) == [[('M1', 1.0), ('M3', 1.0)]]
+
+
+def test_empty_and_short_texts_are_excluded():
+    ids = ['E1', 'E2', 'E3', 'S1', 'S2', 'S3']
+    texts = ['', None, '   ', 'SQL', 'sql', 'abcd']
+    assert find_clusters(ids, texts) == []
+    assert find_clusters(ids + ['L1', 'L2'], texts + [TEXTS['T1'], TEXTS['T1']]) == [[('L1', 1.0), ('L2', 1.0)]]
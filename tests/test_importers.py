@@ -0,0 +1,84 @@
+import base64
+import io
+import zlib
+from urllib.parse import quote
+
+import pytest
+
+import importers
+from importers import map_graph, read_dot, read_graph
+
+DOT = '''digraph "Shop" {
+  // the storefront
+  subgraph cluster_Cloud {
+    label = "Cloud Platform";
+    subgraph cluster_vpc { label = "Private \\"VPC\\""; app [label="Order Service"]; db; }
+    cdn [label="Edge <b>CDN</b>"];
+  }
+  user -> cdn [label="browses over https"];
+  user -> app [label="browses over https"];
+  app -> db -> "very long quoted identifier" [label=queries];
+}
+'''
+
+
+def _graph_summary(graph):
+    return graph.nodes, list(graph.edges)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 11])
+def test_dot_tokens_split_across_chunks(monkeypatch, chunk_size):
+    expected = _graph_summary(read_dot(io.StringIO(DOT)))
+    monkeypatch.setattr(importers, 'CHUNK_SIZE', chunk_size)
+    assert _graph_summary(read_dot(io.StringIO(DOT))) == expected
+    assert expected[0]['app']['label'] == 'Order Service'
+    assert expected[0]['cluster:cluster_vpc']['label'] == 'Private "VPC"'
+    assert ('db', 'very long quoted identifier', 'queries') in expected[1]
+
+
+def test_compressed_drawio_page():
+    model = ('<mxGraphModel><root><mxCell id="0"/><mxCell id="1" parent="0"/>'
+             '<mxCell id="web" value="Web &lt;br&gt;Server" vertex="1" parent="1"/>'
+             '<object id="api" label="API" domain="Backend"><mxCell vertex="1" parent="1"/></object>'
+             '<mxCell id="e1" edge="1" source="web" target="api" parent="1"/>'
+             '<mxCell id="l1" value="calls" vertex="1" parent="e1"/>'
+             '</root></mxGraphModel>')
+    deflate = zlib.compressobj(wbits=-15)
+    packed = base64.b64encode(deflate.compress(quote(model).encode()) + deflate.flush()).decode()
+    document = f'<mxfile><diagram id="p1" name="Page-1">{packed}</diagram></mxfile>'
+
+    graph = read_graph(io.BytesIO(document.encode()), 'model.drawio')
+    labels = {node['label']: node for node in graph.nodes.values()}
+    assert set(labels) == {'Web Server', 'API'}
+    assert labels['API']['domain'] == 'Backend'
+    assert list(graph.edges) == [('z0.0/web', 'z0.0/api', 'calls')]
+
+
+def test_nested_containers_become_subdomain_paths():
+    result = map_graph(read_dot(io.StringIO(DOT)), {}, [])
+
+    placement = {label: (domain, component, path) for label, domain, component, path in result.nodes}
+    assert placement['Order Service'] == ('Cloud Platform', 'Order Service', ('Private "VPC"',))
+    assert placement['Edge CDN'] == ('Cloud Platform', 'Edge CDN', ())
+    assert result.subdomains == [('Cloud Platform', ('Private "VPC"',))]
+    assert 'Cloud Platform' in result.new_domains
+
+
+def test_map_graph_collapses_edges_into_unique_interactions():
+    domains = {'Users': {'color': '#fff', 'position': {'x': 0, 'y': 0}, 'components': ['user']}}
+    existing = [{'from': 'Users', 'to': 'Cloud Platform', 'relationship': 'manages'}]
+    result = map_graph(read_dot(io.StringIO(DOT)), domains, existing)
+
+    # user -> cdn and user -> app land on the same domain pair and label
+    assert result.interactions == [
+        {'from': 'Users', 'to': 'Cloud Platform', 'relationship': 'manages'},
+        {'from': 'Users', 'to': 'Cloud Platform', 'relationship': 'browses over https'},
+        {'from': 'Cloud Platform', 'to': 'Imported', 'relationship': 'queries'},
+    ]
+    assert result.added_interactions == 2
+    # app -> db stays inside Cloud Platform
+    assert result.internal_edges == 1
+    assert result.domains['Users']['components'] == ['user']
+
+    again = map_graph(read_dot(io.StringIO(DOT)), result.domains, result.interactions)
+    assert again.added_interactions == 0 and again.interactions == result.interactions
@@ -0,0 +1,46 @@
+import pytest
+
+import Threatmodeling as tm
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(tm, 'DB_PATH', str(tmp_path / 'merge.db'))
+    tm.init_db()
+    for threat_id in ('T1', 'T2', 'T3'):
+        tm.save_threat(threat_id, f'Threat {threat_id}', '', 'High', 'People', components=[])
+    return tm.DB_PATH
+
+
+def _threat_row(threat_id):
+    return next(list(row) for row in tm.get_all_threats() if row[0] == threat_id)
+
+
+def test_merge_repoints_iterations_saved_as_id_lists(db):
+    tm.save_iteration('ids', '', {'selected_threats': ['T2', 'T3'], 'selected_mitigations': {}})
+    tm.save_iteration('both', '', {'selected_threats': ['T1', 'T2'], 'selected_mitigations': {}})
+
+    tm.merge_threats('T1', ['T2'])
+
+    assert tm.load_iteration('ids')['selected_threats'] == ['T1', 'T3']
+    # A list that already holds the survivor keeps it once
+    assert tm.load_iteration('both')['selected_threats'] == ['T1']
+
+
+def test_merge_repoints_iterations_saved_as_rows(db):
+    tm.save_mitigation('M2', 'T2', 'Badge audit', '', 'Proposed', 'People')
+    mitigation = [row for row in tm.get_all_mitigations() if row[0] == 'M2'][0]
+    t2, t3 = _threat_row('T2'), _threat_row('T3')
+    tm.save_iteration('rows', '', {
+        'selected_threats': {'T2': t2, 'T3': t3},
+        'selected_mitigations': {'M2': list(mitigation[:7])},
+    })
+
+    tm.merge_threats('T1', ['T2'])
+
+    data = tm.load_iteration('rows')
+    assert list(data['selected_threats']) == ['T1', 'T3']
+    assert data['selected_threats']['T1'][:2] == ['T1', 'Threat T1']
+    assert data['selected_threats']['T3'] == t3
+    # The mitigation moved to the survivor, and so does its saved row
+    assert data['selected_mitigations']['M2'][1] == 'T1'
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+import Threatmodeling as tm
+import retention
+from retention import RetentionPolicy, run_maintenance
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(tm, 'DB_PATH', str(tmp_path / 'retention.db'))
+    tm.init_db()
+    return tm.DB_PATH
+
+
+def _save_old_iteration(db_path, name):
+    tm.save_iteration(name, '', {'selected_threats': {}})
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE iterations SET created_date = '2020-01-01T00:00:00', updated_at = NULL WHERE name = ?",
+                 (name,))
+    conn.commit()
+    conn.close()
+
+
+def _iteration_names(db_path):
+    conn = sqlite3.connect(db_path)
+    names = [row[0] for row in conn.execute('SELECT name FROM iterations ORDER BY name')]
+    conn.close()
+    return names
+
+
+def test_pinned_iteration_is_kept_until_unpinned(db, tmp_path):
+    _save_old_iteration(db, 'old')
+    archive_dir = str(tmp_path / 'archive')
+
+    tm.set_iterations_pinned(['old'], True)
+    assert tm.get_retention_status()[3] == ['old']
+    assert run_maintenance(db, RetentionPolicy(), archive_dir)['archived'] == 0
+    assert _iteration_names(db) == ['old']
+
+    tm.set_iterations_pinned(['old'], False)
+    assert tm.get_retention_status()[3] == []
+    assert run_maintenance(db, RetentionPolicy(), archive_dir)['archived'] == 1
+    assert _iteration_names(db) == []
+
+
+def test_restored_iteration_is_pinned_and_can_be_unpinned(db, tmp_path):
+    _save_old_iteration(db, 'old')
+    archive_dir = str(tmp_path / 'archive')
+    path = run_maintenance(db, RetentionPolicy(), archive_dir)['archive']
+
+    assert tm.restore_archived_iterations(path, ['old']) == ['old']
+    assert tm.get_retention_status()[3] == ['old']
+
+    tm.set_iterations_pinned(['old'], False)
+    _save_old_iteration(db, 'old')
+    assert run_maintenance(db, RetentionPolicy(), archive_dir)['archived'] == 1
+
+
+def _legacy_db(tmp_path, monkeypatch):
+    # A file created before auto_vacuum=INCREMENTAL; the pragma only takes
+    # effect on an empty database
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE filler (data TEXT)')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(tm, 'DB_PATH', db_path)
+    tm.init_db()
+    assert _auto_vacuum(db_path) == 0
+    return db_path
+
+
+def _auto_vacuum(db_path):
+    conn = sqlite3.connect(db_path)
+    mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    conn.close()
+    return mode
+
+
+def test_large_file_is_only_converted_on_request(tmp_path, monkeypatch):
+    db_path = _legacy_db(tmp_path, monkeypatch)
+    archive_dir = str(tmp_path / 'archive')
+
+    monkeypatch.setattr(retention, 'CONVERT_MAX_BYTES', 0)
+    assert run_maintenance(db_path, RetentionPolicy(), archive_dir)['converted'] is False
+    assert _auto_vacuum(db_path) == 0
+    assert run_maintenance(db_path, RetentionPolicy(), archive_dir, convert=True)['converted'] is True
+    assert _auto_vacuum(db_path) == retention.AUTO_VACUUM_INCREMENTAL
+
+
+def test_small_file_is_converted_by_a_scheduled_run(tmp_path, monkeypatch):
+    db_path = _legacy_db(tmp_path, monkeypatch)
+
+    assert run_maintenance(db_path, RetentionPolicy(), str(tmp_path / 'archive'))['converted'] is True
+    assert _auto_vacuum(db_path) == retention.AUTO_VACUUM_INCREMENTAL
@@ -0,0 +1,67 @@
+import json
+
+from selection import SelectionState
+
+THREATS = {
+    'T1': ('T1', 'Tailgating', '', 'High', 'People', '2024-01-01'),
+    'T2': ('T2', 'Phishing', '', 'Medium', 'People', '2024-01-01'),
+}
+MITIGATIONS = {
+    'M1': ('M1', 'T1', 'Badge doors', '', 'Proposed', 'People', '2024-01-01'),
+    'M2': ('M2', 'T1', 'Guard desk', '', 'Proposed', 'People', '2024-01-01'),
+    'M3': ('M3', 'T2', 'Awareness training', '', 'Proposed', 'People', '2024-01-01'),
+}
+
+
+def _selected():
+    state = SelectionState()
+    for threat_id in ('T2', 'T1'):
+        state.select_threat(threat_id)
+    for mit_id in ('M3', 'M1', 'M2'):
+        state.select_mitigation(mit_id, MITIGATIONS[mit_id][1])
+    return state
+
+
+def test_deselecting_a_threat_drops_its_mitigations():
+    state = _selected()
+    state.deselect_threat('T1')
+
+    assert list(state.threats) == ['T2']
+    assert list(state.mitigations) == ['M3']
+    assert state.mitigations_for('T1') == set()
+
+    # Mitigations deselected one by one leave no empty entry behind
+    state.deselect_mitigation('M3')
+    assert state.mitigations_for('T2') == set() and not state.mitigations
+    state.select_threat('T1')
+    assert not state.mitigations_for('T1')
+
+
+def test_from_saved_round_trips_dict_format():
+    state = _selected()
+    # Saved the way get_selected_rows builds it, through the JSON column
+    saved = json.loads(json.dumps({
+        'selected_threats': {tid: THREATS[tid] for tid in state.threats},
+        'selected_mitigations': {mid: MITIGATIONS[mid] for mid in state.mitigations},
+    }))
+    loaded = SelectionState.from_saved(saved['selected_threats'], saved['selected_mitigations'])
+
+    assert list(loaded.threats) == ['T2', 'T1']
+    assert loaded.mitigations == state.mitigations
+    assert loaded.mitigations_for('T1') == {'M1', 'M2'}
+
+
+def test_from_saved_round_trips_list_format():
+    state = _selected()
+    saved = json.loads(json.dumps({
+        'selected_threats': list(state.threats),
+        'selected_mitigations': {mid: MITIGATIONS[mid] for mid in state.mitigations},
+    }))
+    loaded = SelectionState.from_saved(saved['selected_threats'], saved['selected_mitigations'])
+
+    assert list(loaded.threats) == ['T2', 'T1']
+    assert loaded.mitigations == state.mitigations
+
+    # Mitigations whose threat was not saved are not selected
+    partial = SelectionState.from_saved(['T2'], saved['selected_mitigations'])
+    assert list(partial.mitigations) == ['M3']
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+import Threatmodeling as tm
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(tm, 'DB_PATH', str(tmp_path / 'subdomains.db'))
+    tm.init_db()
+    # people: A > B > C; technology: D
+    tm.save_subdomain('A', 'People', 'Staff', '')
+    tm.save_subdomain('B', 'People', 'Contractors', '', parent_id='A')
+    tm.save_subdomain('C', 'People', 'Cleaners', '', parent_id='B')
+    tm.save_subdomain('D', 'Technology', 'Data Centre', '')
+    tm.save_threat('T1', 'Tailgating', '', 'High', 'People', subdomain_id='C', components=[])
+    return tm.DB_PATH
+
+
+def _ids(rows):
+    return [(row[0], row[-1]) for row in rows]
+
+
+def _closure(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = set(conn.execute('SELECT ancestor, descendant, depth FROM subdomain_closure'))
+    conn.close()
+    return rows
+
+
+def test_ancestors_and_descendants(db):
+    assert _ids(tm.get_subdomain_ancestors('C')) == [('A', 2), ('B', 1)]
+    assert _ids(tm.get_subdomain_descendants('A')) == [('B', 1), ('C', 2)]
+    assert _ids(tm.get_subdomain_descendants('A', max_depth=1)) == [('B', 1)]
+    assert tm.get_subdomain_ancestors('A') == [] and tm.get_subdomain_descendants('D') == []
+    assert [row[0] for row in tm.get_threats_in_subtree('A')] == ['T1']
+
+
+def test_reparenting_moves_the_whole_subtree(db):
+    tm.save_subdomain('B', 'People', 'Contractors', '', parent_id='D')
+
+    assert _ids(tm.get_subdomain_ancestors('C')) == [('D', 2), ('B', 1)]
+    assert _ids(tm.get_subdomain_descendants('D')) == [('B', 1), ('C', 2)]
+    assert tm.get_subdomain_descendants('A') == []
+    assert tm.get_threats_in_subtree('A') == []
+    # The subtree follows its new root's logical domain, threats included
+    assert {row[0]: row[1] for row in tm.get_subdomains()} == {
+        'A': 'People', 'B': 'Technology', 'C': 'Technology', 'D': 'Technology'}
+    assert tm.get_threats_in_subtree('D')[0][4] == 'Technology'
+    assert _closure(db) == {
+        ('A', 'A', 0), ('B', 'B', 0), ('C', 'C', 0), ('D', 'D', 0),
+        ('B', 'C', 1), ('D', 'B', 1), ('D', 'C', 2),
+    }
+
+    # Back to the top level of a domain
+    tm.save_subdomain('B', 'People', 'Contractors', '')
+    assert tm.get_subdomain_ancestors('B') == []
+    assert _ids(tm.get_subdomain_ancestors('C')) == [('B', 1)]
+    assert tm.get_subdomain_descendants('D') == []
+
+
+def test_cycles_are_rejected(db):
+    before = _closure(db)
+    with pytest.raises(ValueError, match='cannot be its own ancestor'):
+        tm.save_subdomain('A', 'People', 'Staff', '', parent_id='C')
+    with pytest.raises(ValueError, match='cannot be its own ancestor'):
+        tm.save_subdomain('B', 'People', 'Contractors', '', parent_id='B')
+    with pytest.raises(ValueError, match='does not exist'):
+        tm.save_subdomain('B', 'People', 'Contractors', '', parent_id='missing')
+    assert _closure(db) == before
+    assert _ids(tm.get_subdomain_ancestors('C')) == [('A', 2), ('B', 1)]
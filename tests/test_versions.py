@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import Threatmodeling as tm
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(tm, 'DB_PATH', str(tmp_path / 'versions.db'))
+    tm.init_db()
+    return tm.DB_PATH
+
+
+def _query(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return rows
+
+
+def _version(db_path, table, row_id):
+    return _query(db_path, f'SELECT version FROM {table} WHERE id = ?', (row_id,))[0][0]
+
+
+def test_stale_version_is_rejected(db):
+    tm.save_threat('T1', 'Tailgating', '', 'High', 'People', components=[], expected_version=0)
+    loaded = _version(db, 'threats', 'T1')
+
+    tm.save_threat('T1', 'Tailgating at the loading dock', '', 'High', 'People', expected_version=loaded)
+    current = _version(db, 'threats', 'T1')
+    assert current > loaded
+
+    with pytest.raises(ValueError, match='changed after you loaded it'):
+        tm.save_threat('T1', 'Piggybacking', '', 'Low', 'People', expected_version=loaded)
+    with pytest.raises(ValueError, match='already exists'):
+        tm.save_threat('T1', 'Piggybacking', '', 'Low', 'People', expected_version=0)
+    assert _query(db, "SELECT name, version FROM threats WHERE id = 'T1'") == [
+        ('Tailgating at the loading dock', current)]
+
+    tm.delete_threat('T1')
+    with pytest.raises(ValueError, match='deleted after you loaded it'):
+        tm.save_threat('T1', 'Piggybacking', '', 'Low', 'People', expected_version=current)
+    assert _query(db, "SELECT COUNT(*) FROM threats") == [(0,)]
+
+
+def test_concurrent_iteration_save_is_rejected(db):
+    tm.save_iteration('shared', '', {'selected_threats': []})
+    _, first_version = tm.load_iteration_for_edit('shared')
+    _, second_version = tm.load_iteration_for_edit('shared')
+
+    saved = tm.save_iteration('shared', '', {'selected_threats': ['T1']}, expected_version=first_version)
+    assert saved > first_version
+    # The second editor still holds the version both of them loaded
+    assert tm.save_iteration('shared', '', {'selected_threats': ['T2']}, expected_version=second_version) is False
+    assert tm.load_iteration_for_edit('shared') == ({'selected_threats': ['T1']}, saved)
+
+
+def test_versions_and_change_log_seqs_form_one_clock(db):
+    tm.save_threat('T1', 'Tailgating', '', 'High', 'People', components=[])
+    tm.save_iteration('first', '', {'selected_threats': ['T1']})
+    tm.save_mitigation('M1', 'T1', 'Badge readers', '', 'Proposed', 'People')
+    cache_seq = _query(db, 'SELECT MAX(seq) FROM change_log')[0][0]
+    iteration_version = _query(db, "SELECT version FROM iterations WHERE name = 'first'")[0][0]
+
+    tm.save_threat('T2', 'Shoulder surfing', '', 'Low', 'People', components=[])
+    tm.save_threat('T1', 'Tailgating', 'updated', 'High', 'People')
+    tm.save_iteration('second', '', {'selected_threats': ['T2']})
+
+    # Each catalog write is stamped with the seq of the event that logged it
+    for table, row_id in (('threats', 'T1'), ('threats', 'T2'), ('mitigations', 'M1')):
+        events = _query(db, "SELECT seq, payload FROM change_log WHERE stream = 'catalog' AND instr(payload, ?) > 0",
+                        (f'"{row_id}"',))
+        assert _version(db, table, row_id) == events[-1][0]
+    # Rows written since a cache was loaded at cache_seq are exactly those above it
+    newer = _query(db, 'SELECT id FROM threats WHERE version > ? UNION ALL '
+                       'SELECT id FROM mitigations WHERE version > ?', (cache_seq, cache_seq))
+    assert sorted(row[0] for row in newer) == ['T1', 'T2']
+    # Iterations are not logged, but stay above every seq and earlier version
+    second = _query(db, "SELECT version FROM iterations WHERE name = 'second'")[0][0]
+    assert second > max(iteration_version, _query(db, 'SELECT MAX(seq) FROM change_log')[0][0])
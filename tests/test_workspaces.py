@@ -0,0 +1,56 @@
+import sqlite3
+import threading
+
+import pytest
+
+import Threatmodeling as tm
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    default, other = str(tmp_path / 'default.db'), str(tmp_path / 'other.db')
+    monkeypatch.setattr(tm, 'DB_PATH', default)
+    tm.init_db()
+    # A session on the other workspace, running in this (the script) thread
+    main = threading.current_thread()
+    monkeypatch.setattr(tm, 'get_script_run_ctx',
+                        lambda suppress_warning=False: object() if threading.current_thread() is main else None)
+    monkeypatch.setattr(tm.st, 'session_state', {'db_path': other})
+    return default, other
+
+
+def _threat_ids(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = [row[0] for row in conn.execute('SELECT id FROM threats ORDER BY id')]
+    conn.close()
+    return rows
+
+
+def test_session_runs_use_their_workspace(paths):
+    default, other = paths
+    assert tm.current_db_path() == other
+    tm.init_db()
+    tm.save_threat('T1', 'Tailgating', '', 'High', 'People', components=[])
+
+    assert _threat_ids(other) == ['T1']
+    assert _threat_ids(default) == []
+    assert tm.DB_PATH == default
+
+
+def test_threads_without_a_session_need_the_path_passed(paths):
+    default, other = paths
+    tm.init_db()
+    tm.save_threat('T1', 'Tailgating', '', 'High', 'People', components=[])
+
+    seen = {}
+
+    def worker():
+        seen['ambient'] = tm.current_db_path()
+        conn = tm.get_db_connection(other)
+        seen['explicit'] = [row[0] for row in conn.execute('SELECT id FROM threats')]
+        conn.close()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen == {'ambient': default, 'explicit': ['T1']}
@@ -0,0 +1,183 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+from urllib.parse import quote
+
+# Workspaces: one SQLite file per team or product, so each one's data volume
+# and write locks stay its own.
+#
+# Connections are pooled per database file. sqlite3.connect() plus the
+# schema parse on a connection's first statement cost more than most of the
+# queries this app runs, and a pooled connection also keeps its prepared
+# statement cache. close() on a pooled connection hands it back instead of
+# closing it, so callers keep the usual connect/close pattern. Pools are
+# opened lazily and kept in an LRU: past `max_open` databases the least
+# recently used pool's idle connections are closed.
+#
+# Cross-workspace reports ATTACH the workspace files read-only to a scratch
+# connection and run one UNION ALL query per batch of files (SQLite attaches
+# at most ten databases at a time by default).
+
+DEFAULT_WORKSPACE = 'default'
+MAX_OPEN = 8  # databases with pooled connections
+MAX_IDLE = 4  # idle connections kept per database
+ATTACH_BATCH = 10
+
+WORKSPACE_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+
+def workspace_path(workspace_dir: str, name: str) -> str:
+    if not WORKSPACE_NAME.match(name):
+        raise ValueError(f"Invalid workspace name {name!r}: use letters, digits, '-' and '_' (at most 64)")
+    return os.path.join(workspace_dir, f'{name}.db')
+
+
+def list_workspaces(workspace_dir: str, default_path: str) -> Dict[str, str]:
+    # {name: path}, the default workspace first, then every database file
+    # in workspace_dir by name
+    workspaces = {DEFAULT_WORKSPACE: default_path}
+    for path in sorted(glob.glob(os.path.join(workspace_dir, '*.db'))):
+        name = os.path.basename(path)[:-3]
+        if WORKSPACE_NAME.match(name) and name != DEFAULT_WORKSPACE:
+            workspaces[name] = path
+    return workspaces
+
+
+class PooledConnection(sqlite3.Connection):
+    # close() returns the connection to its pool; the pool really closes it
+    _pool = None
+    _released = False
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif not self._released:
+            self._released = True
+            self._pool.release(self)
+
+    def discard(self):
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str, max_idle: int = MAX_IDLE):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.closed = False
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+        # (device, inode) the idle connections were opened on; a file that
+        # was deleted or replaced since must not be served from them
+        self._identity = None
+
+    def acquire(self) -> PooledConnection:
+        try:
+            stat = os.stat(self.db_path)
+            identity = (stat.st_dev, stat.st_ino)
+        except FileNotFoundError:
+            identity = None
+        with self._lock:
+            if identity != self._identity:
+                stale, self._idle = self._idle, []
+                self._identity = identity
+            else:
+                stale = []
+            conn = self._idle.pop() if self._idle else None
+        for old in stale:
+            old.discard()
+        if conn is None:
+            conn = self._connect()
+        conn._released = False
+        return conn
+
+    def _connect(self) -> PooledConnection:
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=PooledConnection)
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn._pool = self
+        with self._lock:
+            if self._identity is None:
+                stat = os.stat(self.db_path)
+                self._identity = (stat.st_dev, stat.st_ino)
+        return conn
+
+    def release(self, conn: PooledConnection):
+        # Back to a plain connection: callers may have set a row factory or,
+        # via instrumentation.trace_connection, a trace callback
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        conn.set_trace_callback(None)
+        with self._lock:
+            if not self.closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.discard()
+
+    def close(self):
+        # Connections still in use are closed when they come back
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+
+
+_pools: 'OrderedDict[str, ConnectionPool]' = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def get_connection(db_path: str, max_open: int = MAX_OPEN) -> PooledConnection:
+    # A pooled connection to db_path with foreign keys on; close() hands it back
+    key = os.path.abspath(db_path)
+    evicted = []
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        _pools.move_to_end(key)
+        while len(_pools) > max_open:
+            evicted.append(_pools.popitem(last=False)[1])
+    for old in evicted:
+        old.close()
+    return pool.acquire()
+
+
+def close_pool(db_path: str):
+    with _pools_lock:
+        pool = _pools.pop(os.path.abspath(db_path), None)
+    if pool is not None:
+        pool.close()
+
+
+def federated_query(workspaces: Dict[str, str], sql: str, params: Sequence = ()) -> List[Tuple]:
+    # Runs `sql` against every workspace and returns its rows prefixed with
+    # the workspace name. `sql` names tables as {db}.table; each workspace's
+    # file is attached read-only and its alias replaces every literal "{db}"
+    # (plain substitution, so other braces in the SQL are left alone). Files
+    # that do not exist are skipped.
+    existing = [(name, path) for name, path in workspaces.items() if os.path.exists(path)]
+    rows = []
+    conn = sqlite3.connect(':memory:', uri=True)
+    try:
+        for start in range(0, len(existing), ATTACH_BATCH):
+            batch = existing[start:start + ATTACH_BATCH]
+            aliases = [f'ws{i}' for i in range(len(batch))]
+            for alias, (_, path) in zip(aliases, batch):
+                conn.execute(f'ATTACH DATABASE ? AS {alias}',
+                             (f'file:{quote(os.path.abspath(path))}?mode=ro',))
+            try:
+                union = ' UNION ALL '.join(f'SELECT ? AS workspace, * FROM ({sql.replace("{db}", alias)})'
+                                           for alias in aliases)
+                rows.extend(conn.execute(union, [value for name, _ in batch for value in (name, *params)]))
+            finally:
+                for alias in aliases:
+                    conn.execute(f'DETACH DATABASE {alias}')
+    finally:
+        conn.close()
+    return rows